@@ -0,0 +1,118 @@
+"""Measures CSV export and import throughput of the flattening plan against the previous implementation.
+
+Usage::
+
+    python benchmarks/bench_csv.py --rows 1000000
+"""
+
+import argparse
+import csv
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from m3u_parser.csv_plan import CsvLoader, CsvPlan
+
+from generator import generate_streams
+
+
+def make_streams(rows: int) -> list:
+    streams_info = list(generate_streams(rows))
+    for index, stream_info in enumerate(streams_info):
+        stream_info.status = "GOOD" if index % 3 else "BAD"
+        stream_info.live = bool(index % 3)
+    return streams_info
+
+
+# Previous implementation, kept here for comparison
+def legacy_is_dict(item, ans=None):
+    if ans is None:
+        ans = []
+    tree = []
+    for k, v in item.items():
+        if isinstance(v, dict):
+            ans.append(str(k))
+            tree.extend(legacy_is_dict(v, ans))
+            ans = []
+        else:
+            if ans:
+                ans.append(str(k))
+                key = "_".join(ans)
+                tree.extend([(key, str(v) if v else "")])
+                ans.remove(str(k))
+            else:
+                tree.extend([(str(k), str(v) if v else "")])
+    return tree
+
+
+def legacy_write(streams_info, fp):
+    tree = [legacy_is_dict(stream_info, ans=[]) for stream_info in streams_info]
+    dict_writer = csv.DictWriter(fp, fieldnames=[i[0] for i in tree[0]])
+    dict_writer.writeheader()
+    dict_writer.writerows([dict(i) for i in tree])
+
+
+def legacy_load(content):
+    reader = csv.DictReader(content.splitlines(), delimiter=",")
+    get_value = lambda row, key: row.get(key) or None
+    return [
+        {
+            "name": get_value(row, "name"),
+            "logo": get_value(row, "logo"),
+            "url": get_value(row, "url"),
+            "category": get_value(row, "category"),
+            "tvg": {
+                "id": get_value(row, "tvg_id"),
+                "name": get_value(row, "tvg_name"),
+                "url": get_value(row, "tvg_url"),
+                "chno": get_value(row, "tvg_chno"),
+            },
+            "country": {"code": get_value(row, "country_code"), "name": get_value(row, "country_name")},
+            "language": {"code": get_value(row, "language_code"), "name": get_value(row, "language_name")},
+            "status": get_value(row, "status") or "BAD",
+            "live": get_value(row, "status") == "GOOD",
+        }
+        for row in reader
+        if get_value(row, "url")
+    ]
+
+
+def timed(label: str, rows: int, function):
+    started = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<22} {elapsed:7.2f} s {rows / elapsed:12,.0f} rows/s")
+    return result, elapsed
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argument_parser.add_argument("--rows", type=int, default=1000000)
+    args = argument_parser.parse_args()
+
+    streams_info = make_streams(args.rows)
+    dicts = [stream_info.to_dict() for stream_info in streams_info]
+
+    legacy_output = io.StringIO()
+    _, legacy_export = timed("export (legacy)", args.rows, lambda: legacy_write(dicts, legacy_output))
+    output = io.StringIO()
+    _, plan_export = timed(
+        "export (plan)", args.rows, lambda: CsvPlan.from_stream(streams_info[0]).write(streams_info, output)
+    )
+
+    content = output.getvalue()
+    _, legacy_import = timed("import (legacy)", args.rows, lambda: legacy_load(content))
+
+    def load():
+        reader = csv.reader(io.StringIO(content, newline=""))
+        return list(CsvLoader(next(reader)).load(reader))
+
+    _, plan_import = timed("import (loader)", args.rows, load)
+    print(f"export speedup: {legacy_export / plan_export:.2f}x, import speedup: {legacy_import / plan_import:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Compares the memory used by parsed streams stored as nested dicts, compact records and columns.
+
+Both representations share the same string objects, so the numbers are the per-entry object overhead.
+
+Usage::
+
+    python benchmarks/bench_memory.py --entries 200000
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from m3u_parser import M3uParser
+from m3u_parser.columnar import ColumnarView
+from m3u_parser.records import to_record
+
+from generator import write_playlist
+
+
+def _columnar(records):
+    view = ColumnarView()
+    view.extend(records)
+    return view.store, view.rows
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argument_parser.add_argument("--entries", type=int, default=100000)
+    args = argument_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "playlist.m3u")
+        write_playlist(path, args.entries)
+        parser = M3uParser()
+        parser.parse_m3u(path, check_live=False)
+
+    dicts, dicts_size = measure(parser.get_list)
+    del parser
+    records, records_size = measure(lambda: [to_record(stream_info) for stream_info in dicts])
+    _, columnar_size = measure(lambda: _columnar(records))
+
+    print(f"entries:        {len(records)}")
+    print(f"nested dicts:   {dicts_size / 2**20:8.1f} MiB ({dicts_size / len(records):6.0f} B/entry)")
+    print(f"records:        {records_size / 2**20:8.1f} MiB ({records_size / len(records):6.0f} B/entry)")
+    print(f"columnar:       {columnar_size / 2**20:8.1f} MiB ({columnar_size / len(records):6.0f} B/entry)")
+    print(f"ratio:          {dicts_size / records_size:8.2f}x records, {dicts_size / columnar_size:8.2f}x columnar")
+
+
+if __name__ == "__main__":
+    main()
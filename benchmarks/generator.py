@@ -0,0 +1,147 @@
+"""Generates deterministic synthetic playlists (m3u/json/csv) for the benchmarks.
+
+Attributes follow skewed distributions like real IPTV catalogues: a few categories, countries and hosts
+hold most of the streams, some attributes are missing and a share of the entries are duplicates.
+
+Usage::
+
+    python benchmarks/generator.py --entries 1000000 --format m3u playlist.m3u
+"""
+
+import argparse
+import itertools
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from m3u_parser.records import Stream, Tvg, country, language
+from m3u_parser.writers import write_streams
+
+CATEGORIES = [
+    "News",
+    "Sports",
+    "Movies",
+    "Music",
+    "Entertainment",
+    "Kids",
+    "Documentary",
+    "Religious",
+    "Lifestyle",
+    "Shop",
+    "Weather",
+    "Undefined",
+]
+COUNTRIES = [
+    ("US", "United States", "eng", "English"),
+    ("IN", "India", "hin", "Hindi"),
+    ("FR", "France", "fra", "French"),
+    ("DE", "Germany", "deu", "German"),
+    ("ES", "Spain", "spa", "Spanish"),
+    ("BR", "Brazil", "por", "Portuguese"),
+    ("NP", "Nepal", "nep", "Nepali"),
+    ("CN", "China", "zho", "Chinese"),
+    ("RU", "Russian Federation", "rus", "Russian"),
+    ("TR", "Türkiye", "tur", "Turkish"),
+]
+EXTENSIONS = ["m3u8"] * 8 + ["ts", "mp4"]
+
+
+def _zipf_weights(count: int, exponent: float = 1.1) -> list:
+    return [1 / (rank**exponent) for rank in range(1, count + 1)]
+
+
+def generate_streams(
+    entries: int,
+    seed: int = 0,
+    base_url: str = None,
+    duplicates: float = 0.02,
+    hosts: int = 500,
+    dead_url: str = None,
+    dead_rate: float = 0.0,
+):
+    """
+    Yields `entries` stream records, the same ones for the same arguments.
+
+    Args:
+        - `entries` (int): Number of streams.
+        - `seed` (int, optional): Seed of the generator. Defaults to 0.
+        - `base_url` (str, optional): Base URL of the stream links, e.g. the URL of a `benchmarks/server.py` server.
+            Defaults to links on `hosts` example hosts.
+        - `duplicates` (float, optional): Share of the streams repeating a previous stream. Defaults to 0.02.
+        - `hosts` (int, optional): Number of distinct hosts of the links. Defaults to 500.
+        - `dead_url` (str, optional): Base URL of dead hosts, e.g. the `dead_url` of a `benchmarks/server.py` server.
+        - `dead_rate` (float, optional): Share of the links on `dead_url`. Defaults to 0.
+    """
+    rng = random.Random(seed)
+    category_weights = list(itertools.accumulate(_zipf_weights(len(CATEGORIES))))
+    country_weights = list(itertools.accumulate(_zipf_weights(len(COUNTRIES))))
+    host_weights = list(itertools.accumulate(_zipf_weights(hosts)))
+    recent = []
+    for index in range(entries):
+        if recent and rng.random() < duplicates:
+            yield rng.choice(recent)
+            continue
+        code, country_name, language_code, language_name = rng.choices(COUNTRIES, cum_weights=country_weights)[0]
+        host = rng.choices(range(hosts), cum_weights=host_weights)[0]
+        extension = rng.choice(EXTENSIONS)
+        if dead_url is not None and rng.random() < dead_rate:
+            url = f"{dead_url}/live/{index}.{extension}"
+        elif base_url is None:
+            url = f"http://cdn{host}.example.com/live/{index}.{extension}"
+        else:
+            url = f"{base_url}/live/{index}.{extension}"
+        name = f"{country_name} {rng.choice(CATEGORIES)} {index}"
+        stream = Stream(
+            name,
+            f"https://logos.example.com/{code.lower()}/{index % 1000}.png" if rng.random() < 0.85 else None,
+            url,
+            rng.choices(CATEGORIES, cum_weights=category_weights)[0],
+            Tvg(
+                f"channel{index}.{code.lower()}" if rng.random() < 0.9 else None,
+                name if rng.random() < 0.3 else None,
+                None,
+                str(index) if rng.random() < 0.5 else None,
+            ),
+            country(code, country_name),
+            language(language_code, language_name) if rng.random() < 0.8 else language(None, None),
+        )
+        recent.append(stream)
+        if len(recent) > 1000:
+            recent.pop(rng.randrange(len(recent)))
+        yield stream
+
+
+def write_playlist(path: str, entries: int, format: str = "m3u", seed: int = 0, **options) -> str:
+    """
+    Writes a synthetic playlist, streaming the streams so that millions of entries fit in memory.
+
+    Args:
+        - `path` (str): Path of the playlist, compressed if it ends with .gz/.bz2/.xz/.zst.
+        - `entries` (int): Number of streams.
+        - `format` (str, optional): Format of the playlist (m3u/json/csv). Defaults to `"m3u"`.
+        - `seed` (int, optional): Seed of the generator. Defaults to 0.
+        - `options`: Other arguments of `generate_streams`.
+
+    Returns:
+        - `str`: The path of the playlist.
+    """
+    write_streams(generate_streams(entries, seed, **options), path, format)
+    return path
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argument_parser.add_argument("path")
+    argument_parser.add_argument("--entries", type=int, default=100000)
+    argument_parser.add_argument("--format", choices=["m3u", "json", "csv"], default="m3u")
+    argument_parser.add_argument("--seed", type=int, default=0)
+    argument_parser.add_argument("--base-url", default=None)
+    args = argument_parser.parse_args()
+    write_playlist(args.path, args.entries, args.format, args.seed, base_url=args.base_url)
+    print(f"wrote {args.entries} entries to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""Runs the benchmark scenarios on synthetic playlists and compares them to a recorded baseline.
+
+Scenarios cover parsing (m3u/json/csv, records and columnar), filtering, sorting, deduplication, exports,
+memory and liveness checks against a local `server.StreamServer` with latency, errors, slow bodies and dead hosts.
+Every timing is the best of `--repeat` runs. With `--compare`, the run fails (exit status 1) if a scenario
+is slower, or uses more memory, than the baseline by more than `--threshold`.
+
+Usage::
+
+    python benchmarks/run.py --sizes 1000,100000 --save-baseline benchmarks/baseline.json
+    python benchmarks/run.py --sizes 1000,100000 --compare benchmarks/baseline.json --threshold 0.2
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from m3u_parser import M3uParser
+
+from bench_memory import measure
+from generator import write_playlist
+from server import StreamServer
+
+scenarios = {}
+
+
+def scenario(name: str):
+    """Registers a scenario, a function of the benchmark context returning the number of entries it processed."""
+
+    def register(function):
+        scenarios[name] = function
+        return function
+
+    return register
+
+
+@scenario("parse_m3u")
+def parse_m3u(context):
+    return len(M3uParser().parse_m3u(context["m3u"], check_live=False)._streams_info)
+
+
+@scenario("parse_m3u_columnar")
+def parse_m3u_columnar(context):
+    return len(M3uParser(columnar=True).parse_m3u(context["m3u"], check_live=False)._streams_info)
+
+
+@scenario("parse_json")
+def parse_json(context):
+    return len(M3uParser().parse_json(context["json"], check_live=False)._streams_info)
+
+
+@scenario("parse_csv")
+def parse_csv(context):
+    return len(M3uParser().parse_csv(context["csv"], check_live=False)._streams_info)
+
+
+@scenario("filter")
+def filter_streams(context):
+    parser = context["parser"].reset_operations()
+    parser.filter_by("category", ["News", "Sports"]).filter_by("country-code", "US", nested_key=True)
+    return context["entries"]
+
+
+@scenario("sort")
+def sort_streams(context):
+    context["parser"].reset_operations().sort_by("name")
+    return context["entries"]
+
+
+@scenario("dedupe")
+def remove_duplicates(context):
+    context["parser"].reset_operations().remove_duplicates()
+    return context["entries"]
+
+
+def export(format: str):
+    def run(context):
+        context["parser"].reset_operations().to_file(os.path.join(context["directory"], f"export.{format}"), format)
+        return context["entries"]
+
+    return run
+
+
+for format in ("m3u", "json", "csv"):
+    scenario(f"export_{format}")(export(format))
+
+
+async def check_live(context):
+    entries = min(context["entries"], context["live_entries"])
+    server = StreamServer(latency=0.01, error_rate=0.1, slow_rate=0.02, slow_seconds=0.5)
+    async with server:
+        path = os.path.join(context["directory"], "live.m3u")
+        write_playlist(path, entries, base_url=server.url, dead_url=server.dead_url, dead_rate=0.05)
+        server.playlists["m3u"] = path
+        parser = M3uParser(timeout=2)
+        started = time.perf_counter()
+        await parser.aparse_m3u(f"{server.url}/playlist.m3u")
+        return time.perf_counter() - started, len(parser._streams_info)
+
+
+def timed(function, context, repeat: int):
+    best, entries = None, 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        entries = function(context)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, entries
+
+
+def run(size: int, names: list, repeat: int, live_entries: int) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        context = {"entries": size, "directory": directory, "live_entries": live_entries}
+        for format in ("m3u", "json", "csv"):
+            context[format] = write_playlist(os.path.join(directory, f"playlist.{format}"), size, format)
+        context["parser"] = M3uParser().parse_m3u(context["m3u"], check_live=False)
+        for name in names:
+            if name == "liveness":
+                elapsed, entries = asyncio.run(check_live(context))
+            elif name == "memory":
+                for columnar in (False, True):
+                    parser, size_bytes = measure(
+                        lambda: M3uParser(columnar=columnar).parse_m3u(context["m3u"], check_live=False)
+                    )
+                    label = "memory_columnar" if columnar else "memory"
+                    results[label] = {"bytes_per_entry": size_bytes / max(1, len(parser._streams_info))}
+                    print(f"{size:>9} {label:<20} {results[label]['bytes_per_entry']:10.0f} B/entry")
+                    del parser
+                continue
+            else:
+                elapsed, entries = timed(scenarios[name], context, repeat)
+            results[name] = {"seconds": elapsed, "entries_per_second": entries / elapsed if elapsed else 0.0}
+            print(f"{size:>9} {name:<20} {elapsed:10.4f} s {results[name]['entries_per_second']:14,.0f} entries/s")
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Returns the scenarios slower, or using more memory, than the baseline by more than the threshold."""
+    regressions = []
+    for size, size_results in results.items():
+        for name, result in size_results.items():
+            previous = baseline.get("results", {}).get(size, {}).get(name)
+            if previous is None:
+                continue
+            metric = "seconds" if "seconds" in result else "bytes_per_entry"
+            if previous[metric] and result[metric] > previous[metric] * (1 + threshold):
+                change = result[metric] / previous[metric] - 1
+                regressions.append(
+                    f"{name} at {size} entries: {metric} {previous[metric]:.4g} -> {result[metric]:.4g} (+{change:.0%})"
+                )
+    return regressions
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argument_parser.add_argument("--sizes", default="1000,10000", help="Comma separated numbers of entries")
+    argument_parser.add_argument("--scenarios", default=",".join(list(scenarios) + ["memory", "liveness"]))
+    argument_parser.add_argument("--repeat", type=int, default=3)
+    argument_parser.add_argument("--live-entries", type=int, default=2000, help="Maximum streams checked for liveness")
+    argument_parser.add_argument("--save-baseline", metavar="PATH")
+    argument_parser.add_argument("--compare", metavar="PATH")
+    argument_parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown, 0.2 for 20%%")
+    args = argument_parser.parse_args()
+
+    names = args.scenarios.split(",")
+    unknown = set(names) - set(scenarios) - {"memory", "liveness"}
+    if unknown:
+        argument_parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    results = {}
+    for size in (int(size) for size in args.sizes.split(",")):
+        results[str(size)] = run(size, names, args.repeat, args.live_entries)
+
+    if args.save_baseline:
+        meta = {"python": platform.python_version(), "platform": platform.platform(), "saved_at": time.time()}
+        with open(args.save_baseline, "w") as fp:
+            json.dump({"meta": meta, "results": results}, fp, indent=4)
+        print(f"saved baseline to {args.save_baseline}")
+    if args.compare:
+        with open(args.compare) as fp:
+            regressions = compare(results, json.load(fp), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regression beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Local stand-in stream server for the liveness benchmarks.
+
+Serves `/live/<id>.<ext>` links with a configurable latency, share of errors and share of slow bodies,
+and `/playlist.<ext>` files. Links on `dead_url` point to a closed port, like dead hosts.
+Outcomes are derived from the stream id, so a run is reproducible.
+
+Usage::
+
+    python benchmarks/server.py --latency 0.05 --error-rate 0.1 --port 8080
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import zlib
+
+from aiohttp import web
+
+
+def _closed_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class StreamServer:
+    """
+    aiohttp server simulating stream hosts.
+
+    Args:
+        - `latency` (float, optional): Seconds before answering. Defaults to 0.
+        - `error_rate` (float, optional): Share of the streams answering with a 5xx status. Defaults to 0.
+        - `slow_rate` (float, optional): Share of the streams sending their body slowly. Defaults to 0.
+        - `slow_seconds` (float, optional): Seconds taken to send a slow body. Defaults to 1.
+        - `playlists` (dict, optional): Paths of the playlists served on `/playlist.<ext>`, by extension.
+        - `port` (int, optional): Port to listen on. Defaults to a free port.
+
+    Example::
+
+        async with StreamServer(latency=0.02, error_rate=0.1) as server:
+            print(server.url, server.dead_url)
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_seconds: float = 1.0,
+        playlists: dict = None,
+        port: int = 0,
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_seconds = slow_seconds
+        self.playlists = playlists or {}
+        self.port = port
+        self.requests = 0
+        self.dead_url = f"http://127.0.0.1:{_closed_port()}"
+        self._runner = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def _outcome(self, stream_id: str) -> float:
+        """Returns a number in [0, 1) fixed for a stream, telling whether it fails or is slow."""
+        return zlib.crc32(stream_id.encode()) / 2**32
+
+    async def _stream(self, request: web.Request):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        outcome = self._outcome(request.match_info["name"])
+        if outcome < self.error_rate:
+            return web.Response(status=503)
+        if outcome < self.error_rate + self.slow_rate:
+            response = web.StreamResponse()
+            await response.prepare(request)
+            try:
+                for _ in range(10):
+                    await asyncio.sleep(self.slow_seconds / 10)
+                    await response.write(b"#EXTM3U\n")
+                await response.write_eof()
+            except ConnectionResetError:
+                # liveness checks only wait for the status, closing before the end of the body
+                pass
+            return response
+        return web.Response(text="#EXTM3U\n#EXT-X-VERSION:3\n")
+
+    async def _playlist(self, request: web.Request):
+        path = self.playlists.get(request.match_info["extension"])
+        if path is None:
+            raise web.HTTPNotFound()
+        return web.FileResponse(path)
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/live/{name}", self._stream)
+        app.router.add_get("/playlist.{extension}", self._playlist)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+
+async def serve(args):
+    playlists = {os.path.basename(path).split(".", 1)[-1]: path for path in args.playlist}
+    server = StreamServer(args.latency, args.error_rate, args.slow_rate, args.slow_seconds, playlists, args.port)
+    async with server:
+        print(f"serving on {server.url}, dead hosts on {server.dead_url}")
+        await asyncio.Event().wait()
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argument_parser.add_argument("--latency", type=float, default=0.0)
+    argument_parser.add_argument("--error-rate", type=float, default=0.0)
+    argument_parser.add_argument("--slow-rate", type=float, default=0.0)
+    argument_parser.add_argument("--slow-seconds", type=float, default=1.0)
+    argument_parser.add_argument("--playlist", action="append", default=[], help="Playlist to serve, by extension")
+    argument_parser.add_argument("--port", type=int, default=8080)
+    args = argument_parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
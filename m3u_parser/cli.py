@@ -0,0 +1,380 @@
+"""Command-line pipeline reading, filtering, checking and writing playlists as streams.
+
+Playlists are read from a path, URL or the standard input, parsed batch by batch on all the CPUs, filtered,
+deduplicated, sorted, checked for liveness and written to a path or the standard output, so that it fits
+in Unix pipes and multi-GB playlists are processed with bounded memory (except for sorting and deduplication,
+which keep every stream, respectively the lowered name and url of every stream).
+
+Usage::
+
+    m3u-parser playlist.m3u.gz --filter category='News|Sports' --exclude url=mp4 --dedupe -o news.json
+    curl -s https://iptv-org.github.io/iptv/index.m3u | m3u-parser --check --filter status=GOOD --stats > alive.m3u
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import re
+import sys
+import time
+from collections import deque
+from itertools import chain, islice
+
+from .csv_plan import CsvLoader, schema_paths
+from .exceptions import KeyNotFoundException, UnrecognizedFormatException, UrlReadException
+from .helper import default_useragent
+from .m3u_parser import M3uParser, _source_format
+from .readers import JsonLoader, iter_json_array
+from .stats import Stats, null_stats
+from .writers import write_streams
+
+logger = logging.getLogger("m3u_parser")
+
+# keys set by the liveness checks, filters on them run once the streams are checked
+status_keys = ("status", "live", "check_tier", "check_error")
+
+# parser of the current (worker) process, set up by `_init_worker`
+_worker = None
+
+
+def _init_worker(schemes: list, enforce_schema: bool, keep_raw: bool, stats: bool):
+    global _worker
+    _worker = M3uParser(stats=stats)
+    _worker._schemes = set(schemes)
+    _worker._enforce_schema = enforce_schema
+    _worker._keep_raw = keep_raw
+
+
+def _parse_batch(lines: list):
+    """Parses a batch of M3U lines starting with an #EXTINF line, returns the streams and the records of the stats."""
+    _worker._lines = lines
+    _worker._build_streams()
+    streams_info, _worker._streams_info, _worker._lines = _worker._streams_info, [], []
+    records = _worker._stats.to_dict()
+    _worker._stats.reset()
+    return streams_info, records
+
+
+def _key(key: str):
+    """Returns the (key, nested key) of a key of the stream information, nested keys being `<key>-<nested_key>`."""
+    key_0, _, key_1 = key.partition("-")
+    # keys set by the checks, like the tier reached, are not part of the schema
+    if (key_0, key_1 or None) not in schema_paths and not (key_0 in status_keys and not key_1):
+        raise argparse.ArgumentTypeError(f"unknown key {key!r}")
+    return key_0, key_1
+
+
+def _expression(value: str):
+    """Parses a `KEY=REGEX` filter expression into its key and compiled regular expression."""
+    key, separator, pattern = value.partition("=")
+    if not separator:
+        raise argparse.ArgumentTypeError(f"expected KEY=REGEX, got {value!r}")
+    try:
+        return key, _key(key), re.compile(pattern, flags=re.IGNORECASE)
+    except re.error as error:
+        raise argparse.ArgumentTypeError(f"invalid regular expression {pattern!r}: {error}")
+
+
+def _sort_key(value: str):
+    """Parses a `KEY[:asc|desc]` sort key into its key and whether it is ascending."""
+    key, _, order = value.partition(":")
+    if order not in ("", "asc", "desc"):
+        raise argparse.ArgumentTypeError(f"expected KEY[:asc|desc], got {value!r}")
+    _key(key)
+    return key, order != "desc"
+
+
+def _matcher(expressions: list, retrieve: bool):
+    """Returns a function telling whether a stream passes the filters, matching the values as `filter_by` does."""
+    getters = []
+    for _, (key_0, key_1), regex in expressions:
+        if key_1:
+            getter = lambda stream_info, key_0=key_0, key_1=key_1: (stream_info.get(key_0) or {}).get(key_1)
+        else:
+            getter = lambda stream_info, key_0=key_0: stream_info.get(key_0)
+        getters.append((getter, regex))
+
+    def matches(stream_info) -> bool:
+        for getter, regex in getters:
+            value = getter(stream_info)
+            if (value is not None and regex.search(str(value)) is not None) != retrieve:
+                return False
+        return True
+
+    return matches
+
+
+def _batches(iterable, size: int):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _parse_m3u(parser: M3uParser, args, stats):
+    """Yields the streams of an M3U source in batches, parsed by `args.jobs` worker processes in order."""
+    options = (args.schemes, args.enforce_schema, args.keep_raw, stats.enabled)
+    batches = parser._iter_line_batches(args.source, args.batch_size)
+    if args.jobs <= 1:
+        _init_worker(*options)
+        for lines in batches:
+            streams_info, records = _parse_batch(lines)
+            stats.merge(records)
+            yield streams_info
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    executor = ProcessPoolExecutor(args.jobs, initializer=_init_worker, initargs=options)
+    pending = deque()
+    try:
+        for lines in batches:
+            pending.append(executor.submit(_parse_batch, lines))
+            # a few batches per worker are in flight, bounding the memory used by the parsed streams
+            if len(pending) >= 2 * args.jobs:
+                streams_info, records = pending.popleft().result()
+                stats.merge(records)
+                yield streams_info
+        while pending:
+            streams_info, records = pending.popleft().result()
+            stats.merge(records)
+            yield streams_info
+    finally:
+        batches.close()
+        for future in pending:
+            future.cancel()
+        executor.shutdown()
+
+
+def _load(parser: M3uParser, args, stats):
+    """Yields the streams of a JSON or CSV source in batches."""
+    if args.format == "json":
+        streams = JsonLoader().load(iter_json_array(parser._iter_chunks(args.source, "json")))
+    else:
+
+        def load_csv():
+            with parser._open_text(args.source, "csv", newline="", action="streaming") as fp:
+                reader = csv.reader(fp, delimiter=",")
+                yield from CsvLoader(next(reader, [])).load(reader)
+
+        streams = load_csv()
+    batches = _batches(streams, args.batch_size)
+    while True:
+        started = time.perf_counter()
+        streams_info = next(batches, None)
+        if streams_info is None:
+            return
+        stats.time("fetch", time.perf_counter() - started)
+        stats.count("entries", len(streams_info))
+        yield streams_info
+
+
+def _pipeline(args, stats):
+    """Yields the streams to write in batches, applying every stage of the pipeline to the parsed batches."""
+    parser = M3uParser(args.useragent, args.timeout, stats=stats)
+    batches = _parse_m3u(parser, args, stats) if args.format == "m3u" else _load(parser, args, stats)
+
+    pre_filters = [expression for expression in args.filter if expression[1][0] not in status_keys]
+    post_filters = [expression for expression in args.filter if expression[1][0] in status_keys]
+    pre_excludes = [expression for expression in args.exclude if expression[1][0] not in status_keys]
+    post_excludes = [expression for expression in args.exclude if expression[1][0] in status_keys]
+    if not args.check:
+        # without checks the status is the one of the source, filtered with the other keys
+        pre_filters, pre_excludes, post_filters, post_excludes = args.filter, args.exclude, [], []
+
+    if pre_filters or pre_excludes:
+        batches = _filtered(batches, _matcher(pre_filters, True), _matcher(pre_excludes, False), stats)
+    if args.dedupe:
+        batches = _deduplicated(batches, stats)
+    if args.sort:
+        # the first streams can only be selected while sorting if the checks don't filter them afterwards
+        top = None if post_filters or post_excludes else args.limit
+        batches = _sorted(batches, args, top, stats)
+    if args.check:
+        batches = _checked(batches, args, stats)
+    if post_filters or post_excludes:
+        batches = _filtered(batches, _matcher(post_filters, True), _matcher(post_excludes, False), stats)
+    return batches
+
+
+def _filtered(batches, retrieve, exclude, stats):
+    for streams_info in batches:
+        with stats.phase("filter"):
+            streams_info = [
+                stream_info for stream_info in streams_info if retrieve(stream_info) and exclude(stream_info)
+            ]
+        if streams_info:
+            yield streams_info
+
+
+def _deduplicated(batches, stats):
+    """Drops the streams with the same name and url as a previous one, as `remove_duplicates` does."""
+    seen_entries = set()
+    for streams_info in batches:
+        with stats.phase("dedupe"):
+            unique = []
+            for stream_info in streams_info:
+                unique_key = ((stream_info.get("name") or "").lower(), (stream_info.get("url") or "").lower())
+                if unique_key not in seen_entries:
+                    seen_entries.add(unique_key)
+                    unique.append(stream_info)
+        if unique:
+            yield unique
+
+
+def _sorted(batches, args, top: int, stats):
+    """Sorts every stream with `sort_by`, or keeps the first `top` streams with `top_k`."""
+    sorter = M3uParser(stats=stats)
+    sorter._streams_info = list(chain.from_iterable(batches))
+    with stats.phase("sort"):
+        keys = [key for key, _ in args.sort]
+        ascending = [asc for _, asc in args.sort]
+        nested = ["-" in key for key in keys]
+        if top is not None:
+            sorter.top_k(top, keys, asc=ascending, nested_key=nested)
+        else:
+            sorter.sort_by(keys, asc=ascending, nested_key=nested)
+    streams_info, sorter._streams_info = sorter._streams_info, []
+    yield from _batches(streams_info, args.batch_size)
+
+
+def _checked(batches, args, stats):
+    """Checks the liveness of every batch, at most `--concurrency` streams at a time."""
+    checker = M3uParser(
+        args.useragent, args.timeout, check_batch_size=args.concurrency, stats=stats, check_tiers=args.check_tiers
+    )
+    for streams_info in batches:
+        checker._streams_info = streams_info
+        checker.check_streams()
+        yield streams_info
+    checker._streams_info = []
+
+
+def _limited(batches, limit: int):
+    for streams_info in batches:
+        if limit <= len(streams_info):
+            yield streams_info[:limit]
+            return
+        limit -= len(streams_info)
+        yield streams_info
+
+
+def _print_stats(stats: Stats, format: str):
+    if format == "prometheus":
+        sys.stderr.write(stats.to_prometheus())
+        return
+    records = stats.to_dict()
+    if format == "json":
+        sys.stderr.write(json.dumps(records, indent=4) + "\n")
+        return
+    lines = [f"{'phase':<12} {'runs':>8} {'seconds':>10}"]
+    lines += [
+        f"{name:<12} {timing['count']:>8} {timing['seconds']:>10.3f}" for name, timing in records["phases"].items()
+    ]
+    lines += ["", f"{'counter':<21} {'value':>10}"]
+    lines += [f"{name:<21} {value:>10}" for name, value in records["counters"].items()]
+    counters, elapsed = records["counters"], records["phases"]["total"]["seconds"]
+    entries = counters.get("entries", 0)
+    lines += [
+        "",
+        f"{entries} entries read, {counters.get('entries_written', 0)} written in {elapsed:.3f} s "
+        f"({entries / elapsed if elapsed else 0.0:,.0f} entries/s)",
+    ]
+    sys.stderr.write("\n".join(lines) + "\n")
+
+
+def _argument_parser() -> argparse.ArgumentParser:
+    argument_parser = argparse.ArgumentParser(
+        prog="m3u-parser",
+        description=__doc__.splitlines()[0],
+        epilog="Keys are the keys of the stream information, nested keys joined by '-' like country-code or tvg-id. "
+        "Filters on status and live run after --check.",
+    )
+    argument_parser.add_argument("source", nargs="?", default="-", help="Path or URL of the playlist, - for stdin")
+    argument_parser.add_argument("-f", "--from", dest="format", choices=["m3u", "json", "csv"], help="Input format")
+    argument_parser.add_argument("-o", "--output", default="-", help="Path of the output, - for stdout")
+    argument_parser.add_argument("-t", "--to", choices=["m3u", "json", "csv"], help="Output format")
+    argument_parser.add_argument("--schemes", default="http,https", help="Comma separated allowed URL schemes")
+    argument_parser.add_argument("--no-enforce-schema", dest="enforce_schema", action="store_false")
+    argument_parser.add_argument("--keep-raw", action="store_true", help="Write unmodified M3U entries verbatim")
+    argument_parser.add_argument(
+        "--filter", metavar="KEY=REGEX", type=_expression, action="append", default=[], help="Keep matching streams"
+    )
+    argument_parser.add_argument(
+        "--exclude", metavar="KEY=REGEX", type=_expression, action="append", default=[], help="Drop matching streams"
+    )
+    argument_parser.add_argument("--dedupe", action="store_true", help="Drop streams with a seen name and url")
+    argument_parser.add_argument(
+        "--sort", metavar="KEY[:desc]", type=_sort_key, action="append", default=[], help="Sort by the keys"
+    )
+    argument_parser.add_argument("--limit", type=int, help="Write at most this number of streams")
+    argument_parser.add_argument("--check", action="store_true", help="Check the liveness of the streams")
+    argument_parser.add_argument("--concurrency", type=int, default=1000, help="Streams checked at the same time")
+    argument_parser.add_argument("--timeout", type=float, default=5, help="Timeout of the checks in seconds")
+    argument_parser.add_argument("--check-tiers", type=int, choices=[0, 1, 2], help="Check the liveness in tiers")
+    argument_parser.add_argument("--useragent", default=default_useragent)
+    argument_parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="Parsing processes")
+    argument_parser.add_argument("--batch-size", type=int, default=5000, help="Streams handed to a stage at a time")
+    argument_parser.add_argument(
+        "--stats", nargs="?", const="text", choices=["text", "json", "prometheus"], help="Print timings to stderr"
+    )
+    argument_parser.add_argument("-q", "--quiet", action="store_true", help="Only log warnings and errors")
+    return argument_parser
+
+
+def main(argv: list = None) -> int:
+    """
+    Runs the `m3u-parser` command.
+
+    Args:
+        - `argv` (list, optional): The arguments of the command. Defaults to the arguments of the process.
+
+    Returns:
+        - `int`: The exit status.
+    """
+    argument_parser = _argument_parser()
+    args = argument_parser.parse_args(argv)
+    args.format = args.format or ("m3u" if args.source == "-" else _source_format(args.source))
+    args.to = args.to or ("m3u" if args.output == "-" else _source_format(args.output))
+    args.schemes = [scheme.strip() for scheme in args.schemes.split(",") if scheme.strip()]
+    args.batch_size = max(1, args.batch_size)
+    level = logger.level
+    if args.quiet:
+        logger.setLevel(logging.WARNING)
+    stats = Stats() if args.stats else null_stats
+
+    started = time.perf_counter()
+    batches = _pipeline(args, stats)
+    if args.limit is not None:
+        batches = _limited(batches, args.limit)
+    newline = "" if args.to == "csv" else None
+    try:
+        if args.output == "-":
+            with open(sys.stdout.fileno(), "w", encoding="utf-8", newline=newline, closefd=False) as fp:
+                written = write_streams(chain.from_iterable(batches), fp, args.to)
+        else:
+            written = write_streams(chain.from_iterable(batches), args.output, args.to)
+    except BrokenPipeError:
+        # the reader of the output went away, e.g. `m3u-parser ... | head`
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    except (UrlReadException, FileNotFoundError, KeyNotFoundException, UnrecognizedFormatException) as error:
+        argument_parser.exit(1, f"{argument_parser.prog}: error: {error}\n")
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        batches.close()
+        logger.setLevel(level)
+    stats.count("entries_written", written)
+    stats.time("total", time.perf_counter() - started)
+    if args.stats:
+        _print_stats(stats, args.stats)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+from array import array
+from collections.abc import Sequence
+
+from .records import _UNSET, Stream
+
+# code reserved in dictionary encoded columns for fields which are not set (schema not enforced)
+MISSING = 0
+
+
+class DictionaryColumn:
+    """Column of low cardinality values stored as integer codes into a list of distinct values."""
+
+    __slots__ = ("values", "codes", "_index")
+
+    def __init__(self, values: list = None, codes=None):
+        self.values = [_UNSET] if values is None else values
+        # codes may be a read-only buffer, e.g. memory mapped from a snapshot, copied on the first write
+        self.codes = array("I") if codes is None else codes
+        self._index = {} if values is None else None
+
+    def __len__(self):
+        return len(self.codes)
+
+    def _writable(self):
+        if self.codes.__class__ is not array:
+            self.codes = array("I", self.codes)
+        if self._index is None:
+            self._index = {}
+            for code, value in enumerate(self.values):
+                try:
+                    self._index.setdefault(value, code)
+                except TypeError:
+                    pass
+            self._index.pop(_UNSET, None)
+
+    def encode(self, value) -> int:
+        if value is _UNSET:
+            return MISSING
+        self._writable()
+        try:
+            code = self._index.get(value)
+        except TypeError:
+            # unhashable values are stored without being shared
+            self.values.append(value)
+            return len(self.values) - 1
+        if code is None:
+            code = self._index[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def append(self, value):
+        code = self.encode(value)
+        self._writable()
+        self.codes.append(code)
+
+    def get(self, row: int):
+        return self.values[self.codes[row]]
+
+    def set(self, row: int, value):
+        code = self.encode(value)
+        self._writable()
+        self.codes[row] = code
+
+
+class PlainColumn:
+    """Column of mostly distinct values, like names and URLs."""
+
+    __slots__ = ("values",)
+
+    def __init__(self, values=None):
+        # values may be a lazily decoded sequence, e.g. memory mapped from a snapshot, copied on the first write
+        self.values = [] if values is None else values
+
+    def __len__(self):
+        return len(self.values)
+
+    def append(self, value):
+        if self.values.__class__ is not list:
+            self.values = list(self.values)
+        self.values.append(value)
+
+    def get(self, row: int):
+        return self.values[row]
+
+    def set(self, row: int, value):
+        if self.values.__class__ is not list:
+            self.values = list(self.values)
+        self.values[row] = value
+
+
+class ColumnarStore:
+    """Stores streams information column by column.
+
+    Repeated values like categories, logos, countries, languages and statuses are dictionary encoded,
+    so that filters and aggregations can work on the integer codes instead of the values.
+    Rows are only materialized into `Stream` records when they are read.
+    """
+
+    dictionary_fields = ("logo", "category", "country", "language", "status", "live")
+
+    def __init__(self):
+        self.columns = {
+            field: DictionaryColumn() if field in self.dictionary_fields else PlainColumn()
+            for field in Stream._fields + Stream._hidden
+        }
+        self._column_items = tuple(self.columns.items())
+
+    def __len__(self):
+        return len(self.columns["url"])
+
+    @staticmethod
+    def _field_value(stream_info, field: str):
+        if field in Stream._hidden:
+            return getattr(stream_info, field, None)
+        return stream_info.get(field, _UNSET)
+
+    def append(self, stream_info) -> int:
+        """Appends a stream information and returns its row number."""
+        row = len(self)
+        for field, column in self._column_items:
+            column.append(self._field_value(stream_info, field))
+        return row
+
+    def set_row(self, row: int, stream_info):
+        for field, column in self._column_items:
+            column.set(row, self._field_value(stream_info, field))
+
+    def row(self, row: int) -> Stream:
+        stream = Stream()
+        for field, column in self._column_items:
+            value = column.get(row)
+            if value is not _UNSET and (value is not None or field not in Stream._hidden):
+                object.__setattr__(stream, field, value)
+        return stream
+
+
+class ColumnarView(Sequence):
+    """Ordered selection of the rows of a `ColumnarStore`, used by the parser in place of a list of records.
+
+    Filtering, sorting and deduplication produce new views sharing the store, so they only copy row numbers.
+    """
+
+    __slots__ = ("store", "rows")
+
+    def __init__(self, store: ColumnarStore = None, rows: array = None):
+        self.store = ColumnarStore() if store is None else store
+        self.rows = array("I") if rows is None else rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ColumnarView(self.store, self.rows[index])
+        return self.store.row(self.rows[index])
+
+    def __setitem__(self, index: int, stream_info):
+        self.store.set_row(self.rows[index], stream_info)
+
+    def __iter__(self):
+        row = self.store.row
+        return (row(position) for position in self.rows)
+
+    def append(self, stream_info):
+        if self.rows.__class__ is not array:
+            self.rows = array("I", self.rows)
+        self.rows.append(self.store.append(stream_info))
+
+    def extend(self, streams_info):
+        for stream_info in streams_info:
+            self.append(stream_info)
+
+    def clear(self):
+        self.store = ColumnarStore()
+        self.rows = array("I")
+
+    def copy(self):
+        return ColumnarView(self.store, array("I", self.rows))
+
+    def take(self, indices):
+        """Returns a view of the rows at the given positions of this view."""
+        rows = self.rows
+        return ColumnarView(self.store, array("I", [rows[index] for index in indices]))
+
+    def encoded(self, key_0: str, key_1: str = ""):
+        """Returns the values of a (nested) key for the rows of the view along with a decoder.
+
+        For dictionary encoded columns the values are integer codes and the decoder is a list mapping every code
+        to the decoded value, otherwise the values are returned as they are and the decoder is None.
+        """
+        column = self.store.columns.get(key_0)
+        if column is None or key_0 in Stream._hidden:
+            extras = self.store.columns["_extra"].values
+            return [(extras[row] or {}).get(key_0) for row in self.rows], None
+        if isinstance(column, DictionaryColumn):
+            codes = column.codes
+            if key_1:
+                decoder = [None if value is _UNSET or value is None else value.get(key_1) for value in column.values]
+            else:
+                decoder = [None if value is _UNSET else value for value in column.values]
+            return [codes[row] for row in self.rows], decoder
+        values = column.values
+        if key_1:
+            nested = (values[row] for row in self.rows)
+            return [None if value is _UNSET or value is None else value.get(key_1) for value in nested], None
+        return [None if values[row] is _UNSET else values[row] for row in self.rows], None
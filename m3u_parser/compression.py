@@ -0,0 +1,104 @@
+import bz2
+import gzip
+import io
+import lzma
+import os
+
+# leading bytes of the supported compressed formats
+magic_numbers = {
+    "gzip": b"\x1f\x8b",
+    "bz2": b"BZh",
+    "xz": b"\xfd7zXZ\x00",
+    "zstd": b"\x28\xb5\x2f\xfd",
+}
+
+extensions = {
+    ".gz": "gzip",
+    ".bz2": "bz2",
+    ".xz": "xz",
+    ".zst": "zstd",
+}
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(
+            "zstd compression needs the zstandard package, install it with `pip install m3u_parser[zstd]`."
+        ) from None
+    return zstandard
+
+
+def compression_of(path) -> str:
+    """Returns the compression of a path from its extension, or None if it isn't compressed."""
+    return extensions.get(os.path.splitext(os.fspath(path))[1].lower())
+
+
+def strip_compression(path: str) -> str:
+    """Returns the path without its compression extension."""
+    return os.path.splitext(path)[0] if compression_of(path) else path
+
+
+def detect_compression(fp: io.BufferedIOBase) -> str:
+    """Returns the compression of a binary stream from its magic number, without consuming it."""
+    head = fp.peek(8)[:8]
+    for compression, magic in magic_numbers.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def open_decompressed(fp: io.BufferedIOBase):
+    """
+    Wraps a binary stream so that compressed content is decompressed while it is read.
+
+    The compression is detected from the magic number, so plain content is returned as it is.
+
+    Args:
+        - `fp` (io.BufferedIOBase): Binary stream supporting `peek`, like a file opened with `open(path, "rb")`.
+
+    Raises:
+        - `ImportError`: Raised if the content is zstd compressed and the zstandard package is not installed.
+
+    Returns:
+        - The binary stream of the decompressed content.
+    """
+    compression = detect_compression(fp)
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=fp, mode="rb")
+    if compression == "bz2":
+        return bz2.BZ2File(fp, mode="rb")
+    if compression == "xz":
+        return lzma.LZMAFile(fp, mode="rb")
+    if compression == "zstd":
+        return _zstandard().ZstdDecompressor().stream_reader(fp, read_across_frames=True, closefd=True)
+    return fp
+
+
+def open_compressed(path, compression: str, level: int = None, threads: int = -1):
+    """
+    Opens a file for writing binary content compressed as a stream.
+
+    Args:
+        - `path` (str): Path of the file.
+        - `compression` (str): One of gzip/bz2/xz/zstd.
+        - `level` (int, optional): Compression level, defaults to the default level of the format.
+        - `threads` (int, optional): Number of zstd compression threads, -1 for as many as CPUs. Defaults to -1.
+
+    Raises:
+        - `ImportError`: Raised if the compression is zstd and the zstandard package is not installed.
+
+    Returns:
+        - The binary stream compressing what is written to it.
+    """
+    if compression == "gzip":
+        return gzip.open(path, "wb", compresslevel=9 if level is None else level)
+    if compression == "bz2":
+        return bz2.open(path, "wb", compresslevel=9 if level is None else level)
+    if compression == "xz":
+        return lzma.open(path, "wb", preset=level)
+    if compression == "zstd":
+        compressor = _zstandard().ZstdCompressor(level=3 if level is None else level, threads=threads)
+        return compressor.stream_writer(open(path, "wb"), closefd=True)
+    raise ValueError(f"Unsupported compression {compression}.")
@@ -0,0 +1,150 @@
+import csv
+from collections.abc import Mapping
+from itertools import islice
+from typing import Iterable
+
+from .records import _UNSET, Record, Stream, Tvg, country, intern, language
+
+# (key, nested key) of the columns of the stream schema, in output order
+schema_paths = (
+    ("name", None),
+    ("logo", None),
+    ("url", None),
+    ("category", None),
+    ("tvg", "id"),
+    ("tvg", "name"),
+    ("tvg", "url"),
+    ("tvg", "chno"),
+    ("country", "code"),
+    ("country", "name"),
+    ("language", "code"),
+    ("language", "name"),
+    ("status", None),
+    ("live", None),
+)
+
+
+def column_name(key_0: str, key_1) -> str:
+    return key_0 if key_1 is None else f"{key_0}_{key_1}"
+
+
+def stream_paths(stream_info: Mapping):
+    """Yields the (key, nested key) paths of the values of a stream information, nested keys of mappings included."""
+    for key, value in stream_info.items():
+        if isinstance(value, Mapping):
+            for nested_key in value:
+                yield key, nested_key
+        else:
+            yield key, None
+
+
+class CsvPlan:
+    """Flattening plan mapping nested stream information to CSV columns.
+
+    The plan is derived once from the shape of the streams information, nested keys becoming `<key>_<nested_key>`
+    columns, and then applied to every stream without inspecting its structure again.
+    Values are written with `str()`, only None is written as an empty cell.
+
+    Example::
+
+        plan = CsvPlan.from_streams(streams_info)
+        plan.write(streams_info, fp)
+    """
+
+    __slots__ = ("paths", "header", "_plan")
+
+    def __init__(self, paths):
+        self.paths = tuple(paths)
+        self.header = [column_name(key_0, key_1) for key_0, key_1 in self.paths]
+        # schema fields of records are read straight from their slots
+        self._plan = tuple((key_0, key_1, key_0 in Stream._fields) for key_0, key_1 in self.paths)
+
+    @classmethod
+    def from_stream(cls, stream_info: Mapping) -> "CsvPlan":
+        return cls(stream_paths(stream_info))
+
+    @classmethod
+    def from_streams(cls, streams_info: Iterable) -> "CsvPlan":
+        """Returns the plan of the schema columns followed by the other keys carried by any of the streams.
+
+        Keys which no stream carries get no column, e.g. the status of streams which were not checked,
+        so that reading the CSV back doesn't make up values the streams never had.
+        """
+        paths = dict.fromkeys(path for path in schema_paths if path[0] not in ("status", "live"))
+        for stream_info in streams_info:
+            paths.update(dict.fromkeys(stream_paths(stream_info)))
+        return cls(paths)
+
+    def flatten(self, stream_info: Mapping) -> list:
+        row = []
+        append = row.append
+        is_record = stream_info.__class__ is Stream
+        for key_0, key_1, in_slot in self._plan:
+            value = getattr(stream_info, key_0, None) if is_record and in_slot else stream_info.get(key_0)
+            if key_1 is not None and value is not None:
+                value = getattr(value, key_1, None) if isinstance(value, Record) else value.get(key_1)
+            append("" if value is None else value if value.__class__ is str else str(value))
+        return row
+
+    def write(self, streams_info: Iterable, fp, header: bool = True, batch_size: int = 1000) -> int:
+        """Writes the streams information as CSV rows, optionally preceded by the header. Returns the number of rows."""
+        writer = csv.writer(fp)
+        if header:
+            writer.writerow(self.header)
+        flatten = self.flatten
+        iterator = iter(streams_info)
+        count = 0
+        while True:
+            batch = list(islice(iterator, batch_size))
+            if not batch:
+                return count
+            writer.writerows(map(flatten, batch))
+            count += len(batch)
+
+
+class CsvLoader:
+    """Inverse of `CsvPlan`, building stream records from CSV rows.
+
+    Column positions are looked up once from the header; missing columns and empty cells are read as None.
+    Streams of a CSV without status column are left without status, as if they were not checked.
+    """
+
+    __slots__ = ("_positions",)
+
+    def __init__(self, header: list):
+        positions = {name: position for position, name in enumerate(header)}
+        self._positions = [positions.get(column_name(key_0, key_1)) for key_0, key_1 in schema_paths]
+
+    def __call__(self, row: list):
+        """Returns the stream record of a row, or None if the row has no url."""
+        return next(self.load([row]), None)
+
+    def load(self, rows: Iterable):
+        """Yields the stream records of the rows which have a url."""
+        positions = self._positions
+        complete = None not in positions
+        size = max((position for position in positions if position is not None), default=-1) + 1
+        has_status = positions[12] is not None
+        for row in rows:
+            if complete and len(row) >= size:
+                values = [row[position] or None for position in positions]
+            else:
+                values = [
+                    row[position] or None if position is not None and position < len(row) else None
+                    for position in positions
+                ]
+            name, logo, url, category, tvg_id, tvg_name, tvg_url, tvg_chno = values[:8]
+            country_code, country_name, language_code, language_name, status = values[8:13]
+            if not url:
+                continue
+            yield Stream(
+                name,
+                intern(logo),
+                url,
+                intern(category),
+                Tvg(tvg_id, tvg_name, tvg_url, tvg_chno),
+                country(country_code, country_name),
+                language(language_code, language_name),
+                (status or "BAD") if has_status else _UNSET,
+                (status == "GOOD") if has_status else _UNSET,
+            )
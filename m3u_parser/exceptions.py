@@ -42,3 +42,9 @@ class NoStreamsException(Exception):
 
 class ParamNotPassedException(Exception):
     """Raised when a parameter is not passed."""
+
+
+class SnapshotException(Exception):
+    """Raised when a snapshot cannot be saved, or read because it is corrupted or written by a newer version."""
+
+    pass
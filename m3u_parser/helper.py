@@ -1,9 +1,14 @@
-import asyncio
-import csv
+import heapq
 import ipaddress
+import itertools
+import locale
 import logging
+import math
+import random
 import re
-from typing import Union
+from array import array
+from functools import lru_cache
+from typing import Callable, Union
 from urllib.parse import urlsplit, urlunsplit
 
 # URLValidator
@@ -27,15 +32,20 @@ tld_re = (
 )
 host_re = '(' + hostname_re + domain_re + tld_re + '|localhost)'
 
-regex = re.compile(
-    r'^(?:[a-z0-9.+-]*)://'  # scheme is validated separately
-    r'(?:[^\s:@/]+(?::[^\s:@/]*)?@)?'  # user:pass authentication
-    r'(?:' + ipv4_re + '|' + ipv6_re + '|' + host_re + ')'
-    r'(?::\d{1,5})?'  # port
-    r'(?:[/?#][^\s]*)?'  # resource path
-    r'\Z',
-    re.IGNORECASE,
-)
+
+@lru_cache(maxsize=None)
+def url_regex() -> re.Pattern:
+    """Returns the URL validation regex, compiled on first use as it is large."""
+    return re.compile(
+        r'^(?:[a-z0-9.+-]*)://'  # scheme is validated separately
+        r'(?:[^\s:@/]+(?::[^\s:@/]*)?@)?'  # user:pass authentication
+        r'(?:' + ipv4_re + '|' + ipv6_re + '|' + host_re + ')'
+        r'(?::\d{1,5})?'  # port
+        r'(?:[/?#][^\s]*)?'  # resource path
+        r'\Z',
+        re.IGNORECASE,
+    )
+
 
 unsafe_chars = frozenset('\t\r\n')
 
@@ -56,46 +66,6 @@ def get_by_regex(regex, content: str) -> Union[str, None]:
     return match.group(1).strip() if match else None
 
 
-def is_dict(item: dict, ans: Union[None, list] = None) -> list:
-    if ans is None:
-        ans = []
-    tree = []
-    for k, v in item.items():
-        if isinstance(v, dict):
-            ans.append(str(k))
-            tree.extend(is_dict(v, ans))
-            ans = []
-        else:
-            if ans:
-                ans.append(str(k))
-                key = "_".join(ans)
-                tree.extend([(key, str(v) if v else "")])
-                ans.remove(str(k))
-            else:
-                tree.extend([(str(k), str(v) if v else "")])
-    return tree
-
-
-def get_tree(item: Union[list, dict]) -> list:
-    tree = []
-    if isinstance(item, dict):
-        tree.extend(is_dict(item, ans=[]))
-    elif isinstance(item, list):
-        for i in item:
-            tree.append(get_tree(i))
-    return tree
-
-
-def render_csv(header: list, data: list, out_path: str = "output.csv") -> None:
-    input = []
-    with open(out_path, "w") as f:
-        dict_writer = csv.DictWriter(f, fieldnames=header)
-        dict_writer.writeheader()
-        for i in data:
-            input.append(dict(i))
-        dict_writer.writerows(input)
-
-
 def ndict_to_csv(obj: list, output_path: str) -> None:
     """Convert nested dictionary to csv.
 
@@ -104,24 +74,131 @@ def ndict_to_csv(obj: list, output_path: str) -> None:
     :param output_path: Path to save the csv file.
     :return: None
     """
-    tree = get_tree(obj)
-    header = [i[0] for i in tree[0]]
-    render_csv(header, tree, output_path)
+    from .csv_plan import CsvPlan
 
+    if not obj:
+        return
+    with open(output_path, "w", encoding="utf-8", newline="") as f:
+        CsvPlan.from_streams(obj).write(obj, f)
 
-def run_until_completed(coros):
-    futures = [asyncio.ensure_future(c) for c in coros]
 
-    async def first_to_finish():
-        while True:
-            await asyncio.sleep(0)
-            for f in futures:
-                if f.done():
-                    futures.remove(f)
-                    return f.result()
+_digits_re = re.compile(r"(\d+)")
+
+
+def natural_key(value) -> tuple:
+    """Returns a key ordering embedded numbers by their numeric value, e.g. "2" before "10".
+
+    :param value: The value to build the key for
+    :rtype: tuple
+    """
+    return tuple(
+        (0, int(part), "") if part.isdigit() else (1, 0, part.casefold())
+        for part in _digits_re.split(str(value))
+        if part
+    )
+
+
+def locale_key(value) -> str:
+    """Returns a key ordering strings according to the current locale (LC_COLLATE).
+
+    :param value: The value to build the key for
+    :rtype: str
+    """
+    return locale.strxfrm(str(value))
+
+
+collations = {
+    None: None,
+    "natural": natural_key,
+    "locale": locale_key,
+}
+
 
-    while len(futures) > 0:
-        yield first_to_finish()
+class Descending:
+    """Wraps a sort key so that it compares in reverse order inside a composite key."""
+
+    __slots__ = ("key",)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+
+class AliasTable:
+    """Walker/Vose alias table drawing weighted random indices in O(1) after an O(n) build."""
+
+    __slots__ = ("_prob", "_alias")
+
+    def __init__(self, weights: list):
+        count = len(weights)
+        total = math.fsum(weights)
+        if count == 0 or total <= 0 or any(weight < 0 for weight in weights):
+            raise ValueError("Weights must be non-negative with a positive total.")
+        scaled = [weight * count / total for weight in weights]
+        small = [index for index, prob in enumerate(scaled) if prob < 1.0]
+        large = [index for index, prob in enumerate(scaled) if prob >= 1.0]
+        self._prob = array("d", [1.0]) * count
+        self._alias = array("q", range(count))
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self._prob[less] = scaled[less]
+            self._alias[less] = more
+            scaled[more] = (scaled[more] + scaled[less]) - 1.0
+            (small if scaled[more] < 1.0 else large).append(more)
+
+    def __len__(self):
+        return len(self._prob)
+
+    def draw(self, rng=random) -> int:
+        index = rng.randrange(len(self._prob))
+        return index if rng.random() < self._prob[index] else self._alias[index]
+
+
+def reservoir_sample(iterable, k: int, weight: Union[None, Callable] = None, rng=random) -> list:
+    """Samples `k` items without replacement from an iterable of unknown length in a single pass.
+
+    Unweighted sampling uses Li's Algorithm L, weighted sampling the Efraimidis-Spirakis A-ES algorithm.
+
+    :param iterable: Items to sample from, consumed once
+    :param k: Number of items to sample
+    :param weight: Optional callable returning the non-negative weight of an item
+    :param rng: Random number generator to use
+    :rtype: list
+    """
+    if k <= 0:
+        return []
+    iterator = iter(iterable)
+    if weight is None:
+        reservoir = list(itertools.islice(iterator, k))
+        rng.shuffle(reservoir)
+        if len(reservoir) < k:
+            return reservoir
+        w = min(math.exp(math.log(rng.random() or 5e-324) / k), 1.0 - 2**-53)
+        while True:
+            skip = int(math.log(rng.random() or 5e-324) / math.log1p(-w))
+            item = next(itertools.islice(iterator, skip, skip + 1), reservoir)
+            if item is reservoir:
+                return reservoir
+            reservoir[rng.randrange(k)] = item
+            w = min(w * math.exp(math.log(rng.random() or 5e-324) / k), 1.0 - 2**-53)
+    heap = []
+    for position, item in enumerate(iterator):
+        item_weight = weight(item)
+        if item_weight < 0:
+            raise ValueError("Weights must be non-negative.")
+        if item_weight == 0:
+            continue
+        key = (rng.random() or 5e-324) ** (1.0 / item_weight)
+        if len(heap) < k:
+            heapq.heappush(heap, (key, position, item))
+        elif key > heap[0][0]:
+            heapq.heapreplace(heap, (key, position, item))
+    return [item for _, _, item in sorted(heap, reverse=True)]
 
 
 # Django URLValidator
@@ -170,7 +247,7 @@ def is_valid_url(value, schemes=['http', 'https']):
             return False
 
         try:
-            regex_search(regex, value)
+            regex_search(url_regex(), value)
         except ValidationError:
             if value:
                 scheme, netloc, path, query, fragment = splitted_url
@@ -179,7 +256,7 @@ def is_valid_url(value, schemes=['http', 'https']):
                 except UnicodeError:
                     return False
                 url = urlunsplit((scheme, netloc, path, query, fragment))
-                regex_search(regex, url)
+                regex_search(url_regex(), url)
             else:
                 return False
         else:
@@ -197,6 +274,24 @@ def is_valid_url(value, schemes=['http', 'https']):
     return True
 
 
+@lru_cache(maxsize=4096)
+def country_name(code: str) -> Union[str, None]:
+    """Returns the name of a country from its alpha-2 code, or None if unknown. pycountry is imported on first use."""
+    import pycountry
+
+    country_obj = pycountry.countries.get(alpha_2=code)
+    return country_obj.name if country_obj else None
+
+
+@lru_cache(maxsize=4096)
+def language_code(name: str) -> Union[str, None]:
+    """Returns the alpha-3 code of a language from its name, or None if unknown. pycountry is imported on first use."""
+    import pycountry
+
+    language_obj = pycountry.languages.get(name=name)
+    return language_obj.alpha_3 if language_obj else None
+
+
 def setup_logger():
     logger = logging.getLogger("m3u_parser")
     handler = logging.StreamHandler()
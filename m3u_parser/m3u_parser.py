@@ -1,19 +1,32 @@
 #!/usr/bin/env python3
 
 import asyncio
+import codecs
+import copy
 import csv
+import heapq
+import io
 import json
+import logging
+import math
 import random
 import re
-import ssl
 import time
 import string
-from typing import Union
-
-import aiohttp
-import pycountry
-import urllib.request
-
+import sys
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from functools import partial
+from itertools import islice, repeat
+from typing import Callable, Iterable, Union
+
+import urllib.parse
+
+from .columnar import ColumnarStore, ColumnarView
+from .compression import open_decompressed, strip_compression
+from .csv_plan import CsvLoader
 from .exceptions import (
     KeyNotFoundException,
     NestedKeyException,
@@ -23,17 +36,29 @@ from .exceptions import (
     UnrecognizedFormatException,
     UrlReadException,
     ParamNotPassedException,
+    SnapshotException,
 )
 from .helper import (
+    AliasTable,
+    Descending,
+    collations,
+    country_name,
     default_useragent,
     get_by_regex,
     is_valid_url,
-    ndict_to_csv,
-    run_until_completed,
+    language_code,
+    reservoir_sample,
     setup_logger,
 )
-
-ssl.match_hostname = lambda cert, hostname: hostname == cert["subjectAltName"][0][1]
+from .probes import connect, endpoint, max_playlist_depth, media_head_size, playlist_size_limit, probes
+from .readers import HashingReader, JsonLoader, iter_json_array
+from .records import Stream, Tvg, country, intern, language, to_dict
+from .search import SearchIndex, default_search_fields
+from .snapshot import read_snapshot, to_array, write_snapshot
+from .spill import SpilledStreams
+from .sqlite_store import SqliteStore
+from .stats import Stats, null_stats
+from .writers import m3u_key, raw_entry, write_m3u, write_streams
 
 logger = setup_logger()
 
@@ -46,7 +71,23 @@ class M3uParser:
     Args:
         - `useragent` (str, optional): User agent string for HTTP requests. Defaults to default_useragent.
         - `timeout` (int, optional): Timeout duration for HTTP requests in seconds. Defaults to 5.
-
+        - `columnar` (bool, optional): Store the streams information column by column with dictionary encoded repeated values,
+            which uses less memory and speeds up filters and aggregations. Rows are only built when read. Defaults to False.
+        - `check_batch_size` (int, optional): Maximum number of streams checked for liveness at the same time,
+            bounding the memory and connections used by the checks. Defaults to 1000.
+        - `stats` (Union[bool, Stats], optional): Record phase timings, counters and probe latencies, see `get_stats`.
+            Pass a `m3u_parser.stats.Stats` to share it between parsers or to register hooks. Defaults to False.
+        - `memory_limit` (int, optional): Bytes of stream records held in memory, for playlists larger than the memory.
+            Past the limit, records are spilled to temporary files (in `TMPDIR`) which filters, sorts, deduplication,
+            checks and exports stream over, see `m3u_parser.spill.SpilledStreams`. M3U playlists are then read
+            line by line instead of at once. Takes precedence over `columnar`. Defaults to None, keeping every record in memory.
+        - `check_tiers` (int, optional): Check the liveness in tiers up to this one, so that unreachable hosts cost
+            one connection instead of a request per stream. Tier 0 connects (with TLS for https) once to every
+            distinct host and port of the http(s), rtsp and rtmp streams, tier 1 probes the streams of the reachable
+            ones, and tier 2 reads the start of http(s) streams, following HLS playlists to their first segment.
+            Streams record the `check_tier` they reached and their `check_error` (e.g. `refused`, `dns`, `timeout`,
+            `status 404`, `empty`), None when live. Streams of custom status checkers, udp streams and local files
+            start at tier 1. Defaults to None, probing every stream once without tiers.
 
     Example::
 
@@ -63,17 +104,42 @@ class M3uParser:
         # INFO: Saving to file...
     """
 
-    def __init__(self, useragent: str = default_useragent, timeout: int = 5):
-        self._streams_info = []
-        self._streams_info_backup = []
+    def __init__(
+        self,
+        useragent: str = default_useragent,
+        timeout: int = 5,
+        columnar: bool = False,
+        check_batch_size: int = 1000,
+        stats: Union[bool, Stats] = False,
+        memory_limit: int = None,
+        check_tiers: int = None,
+    ):
+        self._columnar = columnar
+        self._memory_limit = memory_limit
+        self._check_tiers = check_tiers
+        self._stats = Stats() if stats is True else stats or null_stats
+        self._check_batch_size = max(1, check_batch_size)
+        self._streams_info = self._new_streams()
+        self._streams_info_backup = self._new_streams()
         self._lines = []
         self._status_checker = {}
         self._schemes = set()
-        self._timeout = aiohttp.ClientTimeout(total=timeout)
-        self._loop = None
+        self._timeout = timeout
+        self._session = None
+        self._endpoint_errors = None
+        self._probe_errors = {}
         self._enforce_schema = True
         self._headers = {"User-Agent": useragent if useragent else default_useragent}
         self._check_live = False
+        self._keep_raw = False
+        self._alias_table = None
+        self._search_index = None
+        self._search_alive = None
+        self._probe_latency = {}
+        self._source = None
+        self._source_fingerprint = None
+        self._saved_at = None
+        self._source_errors = {}
         self._file_regex = re.compile(
             r"^(?:file://)?[a-zA-Z]:\\((?:.*?\\)*).*\.[\d\w]{3,5}$|^(?:file://)?(/[^/]+)+/?.[\d\w]{3,5}$"
         )
@@ -87,170 +153,587 @@ class M3uParser:
         self._language_regex = re.compile(r"tvg-language=\"(.*?)\"", flags=re.IGNORECASE)
         self._tvg_url_regex = re.compile(r"tvg-url=\"(.*?)\"", flags=re.IGNORECASE)
 
-    def _read_content(self, path: str, type="m3u"):
-        content = ""
-        if is_valid_url(path):
-            logger.info(f"Started parsing {type} link...")
+    @property
+    def _streams_info(self):
+        return self._streams
+
+    @_streams_info.setter
+    def _streams_info(self, streams_info):
+        # the alias table of weighted samples holds positions of the previous streams
+        self._streams, self._alias_table = streams_info, None
+
+    @contextmanager
+    def _open_text(self, path: str, type="m3u", newline=None, action="parsing"):
+        """Opens a local file, URL or "-" (standard input) as a text stream, fingerprinting the content once it is read."""
+        is_url = is_valid_url(path)
+        if is_url:
+            import urllib.request
+
+            logger.info(f"Started {action} {type} link...")
             try:
-                with urllib.request.urlopen(path) as response:
-                    content_type = response.getheader('Content-Type')
-                    content = response.read()
-                    try:
-                        encoding = (
-                            content_type.split('charset=')[-1].split(";")[0].strip(string.whitespace + "'\" ")
-                            if (content_type and 'charset=' in content_type)
-                            else "utf-8"
-                        )
-                        content = content.decode(encoding)
-                    except:
-                        content = content.decode("utf-8")
+                response = urllib.request.urlopen(path)
             except:
                 raise UrlReadException("Cannot read anything from the url.")
+            content_type = response.getheader('Content-Type')
+            encoding = (
+                content_type.split('charset=')[-1].split(";")[0].strip(string.whitespace + "'\" ")
+                if (content_type and 'charset=' in content_type)
+                else "utf-8"
+            )
+            try:
+                codecs.lookup(encoding)
+            except LookupError:
+                encoding = "utf-8"
+            errors = "strict"
+            raw = io.BufferedReader(response)
+        elif path == "-":
+            logger.info(f"Started {action} {type} from standard input...")
+            # the standard input stays open once the content is read
+            raw = open(sys.stdin.fileno(), mode="rb", closefd=False)
+            encoding, errors = "utf-8", "ignore"
         else:
-            logger.info(f"Started parsing {type} file...")
+            logger.info(f"Started {action} {type} file...")
             try:
-                with open(path, encoding="utf-8", errors="ignore") as fp:
-                    content = fp.read()
+                raw = open(path, mode="rb")
             except FileNotFoundError:
                 raise FileNotFoundError("File doesn't exist.")
-        return content
+            encoding, errors = "utf-8", "ignore"
+        with raw:
+            try:
+                # compressed content is detected from its magic number and decompressed while it is read
+                reader = HashingReader(open_decompressed(raw))
+            except (OSError, EOFError):
+                if is_url:
+                    raise UrlReadException("Cannot read anything from the url.")
+                raise
+            with io.TextIOWrapper(io.BufferedReader(reader), encoding=encoding, errors=errors, newline=newline) as fp:
+                try:
+                    yield fp
+                except (OSError, EOFError, UnicodeDecodeError):
+                    if is_url:
+                        raise UrlReadException("Cannot read anything from the url.")
+                    raise
+        self._stats.count("bytes_read", reader.size)
+        if reader.eof:
+            self._source = path
+            self._source_fingerprint = reader.hash.hexdigest()
 
-    @staticmethod
-    async def _run_until_completed(tasks):
-        for res in run_until_completed(tasks):
-            _ = await res
+    def _read_content(self, path: str, type="m3u"):
+        with self._open_text(path, type) as fp:
+            return fp.read()
 
-    def _set_event_loop(self):
+    def _iter_chunks(self, path: str, type="m3u", chunk_size: int = 1 << 16):
+        """Yields the decoded content of a local file or URL in chunks."""
+        with self._open_text(path, type) as fp:
+            yield from iter(lambda: fp.read(chunk_size), "")
+
+    @staticmethod
+    def _run(coro):
+        """Runs a coroutine from synchronous code, in a separate thread if an event loop already runs in this one."""
         try:
-            self._loop = asyncio.get_running_loop()
+            asyncio.get_running_loop()
         except RuntimeError:
-            self._loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(self._loop)
-
-    def _close_loop(self):
-        while self._loop.is_running():
-            time.sleep(0.3)
-            if not self._loop.is_running():
-                self._loop.close()
+            return asyncio.run(coro)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, coro).result()
+
+    @staticmethod
+    async def _in_thread(function: Callable, *args):
+        """Runs blocking work, like reading files and URLs, in the default executor of the running loop."""
+        return await asyncio.get_running_loop().run_in_executor(None, partial(function, *args))
+
+    @asynccontextmanager
+    async def _client_session(self):
+        """Shares one HTTP client session, and its connection pool, between the liveness checks of a phase.
+
+        The tier 0 results of the endpoints, see `check_tiers`, are shared the same way.
+        """
+        if not self._check_live or self._session is not None:
+            yield
+            return
+        import aiohttp
+
+        async with aiohttp.ClientSession() as session:
+            self._session, self._endpoint_errors = session, {}
+            try:
+                yield
+            finally:
+                self._session, self._endpoint_errors = None, None
+
+    def _new_streams(self, streams_info=()):
+        if self._memory_limit is not None:
+            spilled = SpilledStreams(self._memory_limit)
+            spilled.extend(streams_info)
+            return spilled
+        if self._columnar:
+            view = ColumnarView()
+            view.extend(streams_info)
+            return view
+        return list(streams_info)
+
+    def _parser_options(self) -> dict:
+        """Returns the arguments this parser was created with, for parsers storing and checking streams alike."""
+        return {
+            "useragent": self._headers["User-Agent"],
+            "timeout": self._timeout,
+            "columnar": self._columnar,
+            "check_batch_size": self._check_batch_size,
+            "stats": self._stats,
+            "memory_limit": self._memory_limit,
+            "check_tiers": self._check_tiers,
+        }
+
+    def _take(self, indices):
+        """Returns the streams at the given positions of the streams information list."""
+        if isinstance(self._streams_info, (ColumnarView, SpilledStreams)):
+            return self._streams_info.take(indices)
+        return [self._streams_info[index] for index in indices]
+
+    def _take_copies(self, indices) -> list:
+        """Returns copies of the streams at the given positions, which are modified without modifying the streams."""
+        copies = []
+        for stream_info in self._take(indices):
+            stream_copy = copy.copy(stream_info)
+            # the extra keys would be shared with the stream otherwise
+            extra = getattr(stream_info, "_extra", None)
+            if extra is not None:
+                object.__setattr__(stream_copy, "_extra", dict(extra))
+            copies.append(stream_copy)
+        return copies
+
+    def _write_back(self, indices, streams_info):
+        """Writes the (checked) streams to the given positions at once, readers seeing all of them or none."""
+        if isinstance(self._streams_info, SpilledStreams):
+            streams_info = dict(zip(indices, streams_info))
+            updated = self._streams_info._derive()
+            for index, (row, stream_info) in enumerate(self._streams_info._items()):
+                updated._add(row, streams_info.get(index, stream_info))
+            self._streams_info = updated
+        elif isinstance(self._streams_info, ColumnarView):
+            for index, stream_info in zip(indices, streams_info):
+                self._streams_info[index] = stream_info
+        else:
+            # the records are updated in place, as they are shared with the backup restored by `reset_operations`
+            for index, stream_info in zip(indices, streams_info):
+                record = self._streams_info[index]
+                for key, value in stream_info.items():
+                    record[key] = value
+                record._checked_at = getattr(stream_info, "_checked_at", None)
+        # the statuses changed, so weights read from the streams may have too
+        self._alias_table = None
+
+    def _encoded_values(self, key_0: str, key_1: str = ""):
+        """Returns the values of a (nested) key for every stream, dictionary encoded with a decoder if stored so."""
+        if isinstance(self._streams_info, ColumnarView):
+            return self._streams_info.encoded(key_0, key_1)
+        if key_1:
+            return [(stream_info.get(key_0) or {}).get(key_1) for stream_info in self._streams_info], None
+        return [stream_info.get(key_0) for stream_info in self._streams_info], None
+
+    def _values(self, key_0: str, key_1: str = ""):
+        values, decoder = self._encoded_values(key_0, key_1)
+        return values if decoder is None else [decoder[code] for code in values]
+
+    @staticmethod
+    def _row_ids(streams_info):
+        """Returns identifiers of the rows which stay the same across filtering and sorting."""
+        if isinstance(streams_info, (ColumnarView, SpilledStreams)):
+            return streams_info.rows
+        return [id(stream_info) for stream_info in streams_info]
+
+    async def _run_batched(self, coro_fn: Callable, arguments):
+        """Runs a coroutine function for every argument, at most `check_batch_size` at a time."""
+        arguments = iter(arguments)
+        while True:
+            batch = [coro_fn(argument) for argument in islice(arguments, self._check_batch_size)]
+            if not batch:
                 break
+            await asyncio.gather(*batch)
+            # lets other tasks of the loop run between batches, even if the batch didn't wait for anything
+            await asyncio.sleep(0)
+
+    def _build_streams(self, streams_info=None):
+        """Parses the lines into the given or new streams information, returns the positions of the streams to check."""
+        self._streams_info = self._new_streams() if streams_info is None else streams_info
+        unchecked = []
+        for line_num, line in enumerate(self._lines):
+            if "#EXTINF" in line:
+                self._parse_line(line_num, unchecked)
+        self._stats.count("entries", len(self._streams_info))
+        return unchecked
+
+    async def _parse_lines(self):
+        # parsing runs in the default executor so that it doesn't block the loop, the links are checked afterwards
+        unchecked = await self._in_thread(self._build_streams)
+        if unchecked:
+            await self._check_urls(unchecked)
+        self._streams_info_backup = self._streams_info.copy()
+        logger.info("Parsing completed.")
 
-    def _parse_lines(self):
-        num_lines = len(self._lines)
-        self._streams_info.clear()
-        self._set_event_loop()
-        coros = (self._parse_line(line_num) for line_num in range(num_lines) if "#EXTINF" in self._lines[line_num])
-        self._loop.run_until_complete(self._run_until_completed(coros))
-        self._loop.run_until_complete(asyncio.sleep(0))
+    def _iter_line_batches(self, path: str, size: int):
+        """Yields the lines of a local M3U file or URL in batches of `size` entries, cut before #EXTINF lines."""
+        lines = self._iter_lines(path, "m3u")
+        try:
+            batch, entries, started = [], 0, time.perf_counter()
+            for line in lines:
+                if "#EXTINF" in line:
+                    if entries >= size:
+                        self._stats.time("fetch", time.perf_counter() - started)
+                        self._stats.count("lines", len(batch))
+                        yield batch
+                        batch, entries, started = [], 0, time.perf_counter()
+                    entries += 1
+                batch.append(line)
+            if batch:
+                self._stats.time("fetch", time.perf_counter() - started)
+                self._stats.count("lines", len(batch))
+                yield batch
+        finally:
+            lines.close()
+
+    async def _parse_spilled(self, data_source: str):
+        """Parses and checks an M3U source batch by batch into spilled streams, never holding its whole content."""
+        streams_info = self._new_streams()
+        batches = self._iter_line_batches(data_source, self._check_batch_size)
+        try:
+            # the batches share the HTTP session and the reached endpoints
+            async with self._client_session():
+                while True:
+                    self._lines = await self._in_thread(next, batches, None)
+                    if self._lines is None:
+                        break
+                    # the entries of a batch are parsed into a list, checked, then added to the spilled streams
+                    unchecked = await self._in_thread(self._build_streams, [])
+                    if unchecked:
+                        await self._check_urls(unchecked)
+                    streams_info.extend(self._streams_info)
+        finally:
+            batches.close()
+            self._lines = []
+        if not len(streams_info):
+            raise NoContentToParseException("No content to parse.")
+        self._streams_info = streams_info
         self._streams_info_backup = self._streams_info.copy()
-        self._close_loop()
         logger.info("Parsing completed.")
 
+    async def _request_status(self, session, stream_link) -> bool:
+        import aiohttp
+
+        async with session.request(
+            "get",
+            stream_link,
+            headers=self._headers,
+            timeout=aiohttp.ClientTimeout(total=self._timeout),
+        ) as response:
+            if response.status != 200:
+                self._probe_failed(stream_link, f"status {response.status}")
+            return response.status == 200
+
     async def _get_status(self, stream_link):
+        import aiohttp
+
         try:
+            if self._session is not None:
+                return await self._request_status(self._session, stream_link)
             async with aiohttp.ClientSession() as session:
-                async with session.request(
-                    "get",
-                    stream_link,
-                    headers=self._headers,
-                    timeout=self._timeout,
-                ) as response:
-                    if response.status == 200:
-                        return True
+                return await self._request_status(session, stream_link)
+        except asyncio.TimeoutError:
+            self._stats.count("probe_timeouts")
+            self._probe_failed(stream_link, "timeout")
         except:
-            pass
+            self._probe_failed(stream_link, "error")
+        return False
+
+    async def _request_media(self, session, stream_link: str, origin: str, depth: int = 0) -> bool:
+        """Reads the start of a stream, following HLS playlists to their first variant or segment."""
+        import aiohttp
+
+        async with session.request(
+            "get",
+            stream_link,
+            headers=self._headers,
+            timeout=aiohttp.ClientTimeout(total=self._timeout),
+        ) as response:
+            if response.status != 200:
+                self._probe_failed(origin, f"status {response.status}")
+                return False
+            head = await response.content.read(media_head_size)
+            if not head:
+                self._probe_failed(origin, "empty")
+                return False
+            if not head.lstrip(b"\xef\xbb\xbf \t\r\n").startswith(b"#EXTM3U"):
+                return True
+            while len(head) < playlist_size_limit and not response.content.at_eof():
+                head += await response.content.read(playlist_size_limit - len(head))
+            playlist = head.decode("utf-8", "replace").splitlines()
+            uri = next((line.strip() for line in playlist if line.strip() and not line.startswith("#")), None)
+            if uri is None or depth >= max_playlist_depth:
+                self._probe_failed(origin, "empty playlist" if uri is None else "nested playlists")
+                return False
+            uri = urllib.parse.urljoin(str(response.url), uri)
+        return await self._request_media(session, uri, origin, depth + 1)
+
+    async def _get_media_status(self, stream_link: str) -> bool:
+        """Deep probe of a HTTP stream, live if it serves media rather than only a 200 status."""
+        import aiohttp
+
+        try:
+            if self._session is not None:
+                return await self._request_media(self._session, stream_link, stream_link)
+            async with aiohttp.ClientSession() as session:
+                return await self._request_media(session, stream_link, stream_link)
+        except asyncio.TimeoutError:
+            self._stats.count("probe_timeouts")
+            self._probe_failed(stream_link, "timeout")
+        except Exception:
+            self._probe_failed(stream_link, "error")
+        return False
+
+    async def _get_probe_status(self, probe: Callable, stream_link: str) -> bool:
+        """Runs a built-in probe of `m3u_parser.probes` within the timeout."""
+        try:
+            if await asyncio.wait_for(probe(stream_link, self._headers), self._timeout):
+                return True
+            self._probe_failed(stream_link, "probe")
+        except asyncio.TimeoutError:
+            self._stats.count("probe_timeouts")
+            self._probe_failed(stream_link, "timeout")
+        except Exception:
+            self._probe_failed(stream_link, "error")
         return False
 
-    async def _check_status(self, index):
-        stream_info = self._streams_info[index]
-        stream_url = stream_info.get("url")
-        scheme = stream_url.split('://')[0].lower()
+    def _probe_failed(self, stream_link: str, reason: str):
+        """Keeps why the probe of a link failed, recorded on the streams when checking in tiers."""
+        if self._check_tiers is not None:
+            self._probe_errors[stream_link] = reason
+
+    async def _connect_endpoint(self, endpoint_errors: dict, endpoint: tuple):
+        """Tier 0: connects to an endpoint once for all its streams."""
+        try:
+            endpoint_errors[endpoint] = await asyncio.wait_for(connect(*endpoint), self._timeout)
+        except asyncio.TimeoutError:
+            self._stats.count("probe_timeouts")
+            endpoint_errors[endpoint] = "timeout"
+        self._stats.count("connects")
+
+    async def _check_tiered(self, stream_link: str, endpoint_errors: dict):
+        """Returns whether a stream is live, the tier it reached and why it failed, see `check_tiers`."""
+        scheme = stream_link.split('://')[0].lower() if '://' in stream_link else "file"
+        # streams of custom status checkers, or not served over TCP, start at tier 1
+        stream_endpoint = None if callable(self._status_checker.get(scheme)) else endpoint(stream_link)
+        if stream_endpoint is not None:
+            error = endpoint_errors[stream_endpoint]
+            if error is not None or self._check_tiers == 0:
+                return error is None, 0, error
+        if not await self._probe(stream_link):
+            return False, 1, self._probe_errors.pop(stream_link, "probe")
+        if self._check_tiers < 2 or scheme not in ("http", "https") or stream_endpoint is None:
+            return True, 1, None
+        if not await self._get_media_status(stream_link):
+            return False, 2, self._probe_errors.pop(stream_link, "probe")
+        return True, 2, None
+
+    async def _probe(self, stream_link: str) -> bool:
+        # links without a scheme are local paths
+        scheme = stream_link.split('://')[0].lower() if '://' in stream_link else "file"
         status_fn = self._status_checker.get(scheme)
         if status_fn is None or not callable(status_fn):
-            status_fn = self._get_status
-        stream_info["status"] = "GOOD" if await status_fn(stream_url) == True else "BAD"
-        stream_info["live"] = stream_info["status"] == "GOOD"
-        self._streams_info[index] = stream_info
-
-    def _check_streams_status(self):
+            probe = probes.get(scheme)
+            status_fn = self._get_status if probe is None else partial(self._get_probe_status, probe)
+        started = time.perf_counter()
+        is_live = await status_fn(stream_link) == True
+        self._probe_latency[stream_link] = latency = time.perf_counter() - started
+        self._stats.count("probes")
+        self._stats.observe("probe_latency_seconds", latency)
+        return is_live
+
+    async def _check_urls(self, indices: Iterable[int] = None):
+        """Checks the status of the streams at the given positions, or of all streams, probing every distinct URL once."""
+        if isinstance(self._streams_info, SpilledStreams):
+            await self._check_spilled(indices)
+            return
+        positions = {}
+        stream_urls = self._values("url")
+        indices = range(len(stream_urls)) if indices is None else indices
+        for index in indices:
+            positions.setdefault(stream_urls[index], []).append(index)
+        self._stats.count("probe_cache_hits", len(indices) - len(positions))
+
+        tiered = self._check_tiers is not None
+
+        async def check_status(stream_url):
+            if tiered:
+                is_live, tier, error = await self._check_tiered(stream_url, endpoint_errors)
+            else:
+                is_live = await self._probe(stream_url)
+            status = "GOOD" if is_live else "BAD"
+            checked_at = time.time()
+            for index in positions[stream_url]:
+                stream_info = self._streams_info[index]
+                stream_info["status"] = status
+                stream_info["live"] = status == "GOOD"
+                if tiered:
+                    stream_info["check_tier"] = tier
+                    stream_info["check_error"] = error
+                stream_info._checked_at = checked_at
+                self._streams_info[index] = stream_info
+
+        with self._stats.phase("liveness"):
+            async with self._client_session():
+                endpoint_errors = {} if self._endpoint_errors is None else self._endpoint_errors
+                if tiered:
+                    # every endpoint is connected to once, before probing the streams of the reachable ones
+                    endpoints = dict.fromkeys(endpoint(stream_url) for stream_url in positions)
+                    endpoints = [key for key in endpoints if key is not None and key not in endpoint_errors]
+                    await self._run_batched(partial(self._connect_endpoint, endpoint_errors), endpoints)
+                await self._run_batched(check_status, positions)
+        # the statuses changed, so weights read from the streams may have too
+        self._alias_table = None
+
+    async def _check_spilled(self, indices: Iterable[int] = None):
+        """Checks spilled streams one batch at a time, writing the checked streams to new spilled streams."""
+        wanted = None if indices is None else set(indices)
+        spilled, checked, offset = self._streams_info, self._streams_info._derive(), 0
+        try:
+            # the batches share the HTTP session and the reached endpoints
+            async with self._client_session():
+                for rows, batch in spilled.batches():
+                    positions = [
+                        position for position in range(len(batch)) if wanted is None or offset + position in wanted
+                    ]
+                    offset += len(batch)
+                    if positions:
+                        self._streams_info = list(batch)
+                        await self._check_urls(positions)
+                    for row, stream_info in zip(rows, batch):
+                        checked._add(row, stream_info)
+        finally:
+            self._streams_info = spilled
+        self._streams_info = checked
+
+    async def _check_streams_status(self):
+        # latencies are those of the streams last parsed, so that they don't pile up in long-running processes
+        self._probe_latency = {}
         if self._check_live and len(self._streams_info) > 0:
-            self._set_event_loop()
-            coros = (self._check_status(index) for index in range(len(self._streams_info)))
-            self._loop.run_until_complete(self._run_until_completed(coros))
-            self._loop.run_until_complete(asyncio.sleep(0))
-            self._streams_info_backup = self._streams_info.copy()
-            self._close_loop()
+            await self._check_urls()
+        self._streams_info_backup = self._streams_info.copy()
         logger.info("Parsing completed.")
 
-    async def _parse_line(self, line_num: int):
-        line_info = self._lines[line_num]
-        stream_link = ""
-        streams_link = []
-        status = "BAD"
-        try:
-            for i in [1, 2]:
-                if self._lines[line_num + i] and (is_valid_url(self._lines[line_num + i], self._schemes)):
-                    streams_link.append(self._lines[line_num + i])
-                    break
-                elif self._lines[line_num + i] and re.search(self._file_regex, self._lines[line_num + i]):
-                    status = "GOOD"
-                    streams_link.append(self._lines[line_num + i])
-                    break
-            stream_link = streams_link[0]
-        except IndexError:
-            pass
-        if line_info and stream_link:
-            info = {}
+    def _find_stream_link(self, candidates: list, schemes: set):
+        """Returns the stream link among the lines following an #EXTINF line and whether it is a local file."""
+        for candidate in candidates:
+            if candidate and is_valid_url(candidate, schemes):
+                return candidate, False
+            elif candidate and re.search(self._file_regex, candidate):
+                return candidate, True
+        return "", False
+
+    def _build_stream_info(self, line_info: str, stream_link: str, enforce_schema: bool) -> Stream:
+        with self._stats.phase("extract"):
+            info = Stream()
             # Title
             title = get_by_regex(self._title_regex, line_info)
-            if title != None or self._enforce_schema:
-                info["name"] = title
+            if title != None or enforce_schema:
+                info.name = title
             # Logo
             logo = get_by_regex(self._logo_regex, line_info)
-            if logo != None or self._enforce_schema:
-                info["logo"] = logo
-            info["url"] = stream_link
+            if logo != None or enforce_schema:
+                info.logo = intern(logo)
+            info.url = stream_link
             # Category
             category = get_by_regex(self._category_regex, line_info)
-            if category != None or self._enforce_schema:
-                info["category"] = category
+            if category != None or enforce_schema:
+                info.category = intern(category)
             # TVG information
             tvg_id = get_by_regex(self._tvg_id_regex, line_info)
             tvg_name = get_by_regex(self._tvg_name_regex, line_info)
             tvg_url = get_by_regex(self._tvg_url_regex, line_info)
             tvg_chno = get_by_regex(self._chno_regex, line_info)
-            if tvg_id != None or tvg_name != None or tvg_url != None or tvg_chno != None or self._enforce_schema:
-                info["tvg"] = {}
+            if tvg_id != None or tvg_name != None or tvg_url != None or tvg_chno != None or enforce_schema:
+                info.tvg = Tvg()
                 for key, val in zip(["id", "name", "url", "chno"], [tvg_id, tvg_name, tvg_url, tvg_chno]):
-                    if val != None or self._enforce_schema:
-                        info["tvg"][key] = val
+                    if val != None or enforce_schema:
+                        info.tvg[key] = val
+            country_code = get_by_regex(self._country_regex, line_info)
+            language_name = get_by_regex(self._language_regex, line_info)
+        with self._stats.phase("enrich"):
             # Country
-            country = get_by_regex(self._country_regex, line_info)
-            if country != None or self._enforce_schema:
-                country_obj = pycountry.countries.get(alpha_2=country if country else "")
-                info["country"] = {
-                    "code": country,
-                    "name": country_obj.name if country_obj else None,
-                }
+            if country_code != None or enforce_schema:
+                info.country = country(country_code, country_name(country_code if country_code else ""))
             # Language
-            language = get_by_regex(self._language_regex, line_info)
-            if language != None or self._enforce_schema:
-                language_obj = pycountry.languages.get(name=language if language else "")
-                info["language"] = {
-                    "code": language_obj.alpha_3 if language_obj else None,
-                    "name": language,
-                }
-
-            if self._check_live and status == "BAD":
-                scheme = stream_link.split('://')[0].lower()
-                status_fn = self._status_checker.get(scheme)
-                if status_fn is None or not callable(status_fn):
-                    status_fn = self._get_status
-                status = "GOOD" if await status_fn(stream_link) == True else "BAD"
+            if language_name != None or enforce_schema:
+                info.language = language(language_code(language_name if language_name else ""), language_name)
+        return info
+
+    def _parse_line(self, line_num: int, unchecked: list):
+        line_info = self._lines[line_num]
+        with self._stats.phase("validate"):
+            stream_link, _ = self._find_stream_link(self._lines[line_num + 1 : line_num + 3], self._schemes)
+        if line_info and stream_link:
+            info = self._build_stream_info(line_info, stream_link, self._enforce_schema)
+            if self._keep_raw:
+                end = self._lines.index(stream_link, line_num + 1, line_num + 3)
+                info._raw = raw_entry(self._lines[line_num : end + 1], info)
+
             if self._check_live:
-                info["status"] = status
-                info["live"] = status == "GOOD"
+                # links and local files are probed once all the lines are parsed
+                info.status = "BAD"
+                info.live = False
+                unchecked.append(len(self._streams_info))
             self._streams_info.append(info)
 
+    def _iter_lines(self, path: str, type="m3u"):
+        """Yields the non-empty lines of a local file or URL without reading the whole content into memory."""
+        with self._open_text(path, type, action="streaming") as fp:
+            for line in fp:
+                line = line.strip("\n\r")
+                if line != "":
+                    yield line
+
+    def iter_m3u(self, data_source: str, schemes=['http', 'https'], enforce_schema=True):
+        """
+        Lazily parses a local M3U file or URL, yielding one stream information at a time.
+
+        Unlike `parse_m3u`, the content is read line by line and nothing is stored on the parser,
+        so arbitrarily large playlists can be processed with constant memory. Liveness is not checked.
+
+        Args:
+            - `data_source` (str): The file path or URL of the M3U file to be parsed.
+            - `schemes` (list, optional): A list of allowed URL schemes. Default is `["http", "https"]`.
+            - `enforce_schema` (bool, optional): Indicates whether to enforce a specific schema for parsed data. Default is `True`.
+
+        Raises:
+            - `UrlReadException`: Raised when there is an issue reading content from a URL.
+            - `FileNotFoundError`: Raised if the file does not exist or is not accessible.
+
+        Yields:
+            - `dict`: Stream information in the same shape as the items of `get_list()`.
+        """
+        schemes = set(schemes)
+        window = deque(maxlen=3)
+
+        def parse_window():
+            line_info = window[0]
+            if line_info and "#EXTINF" in line_info:
+                stream_link, _ = self._find_stream_link(list(window)[1:], schemes)
+                if stream_link:
+                    return self._build_stream_info(line_info, stream_link, enforce_schema)
+            return None
+
+        for line in self._iter_lines(data_source, "m3u"):
+            window.append(line)
+            if len(window) == 3:
+                info = parse_window()
+                if info is not None:
+                    yield info.to_dict()
+        if len(window) == 3:
+            window.popleft()
+        while window:
+            info = parse_window()
+            if info is not None:
+                yield info.to_dict()
+            window.popleft()
+
     @staticmethod
     def _get_m3u_content(streams_info: list) -> str:
         """Save the streams information list to m3u file.
@@ -259,28 +742,9 @@ class M3uParser:
 
         :rtype: None
         """
-        if len(streams_info) == 0:
-            return ""
-        content = ["#EXTM3U"]
-        for stream_info in streams_info:
-            line = "#EXTINF:-1"
-            if stream_info.get("tvg") != None:
-                for key, value in stream_info["tvg"].items():
-                    if value != None:
-                        line += ' tvg-{}="{}"'.format(key, value)
-            if stream_info.get("logo") != None:
-                line += ' tvg-logo="{}"'.format(stream_info["logo"])
-            if stream_info.get("country") != None and stream_info["country"].get("code") != None:
-                line += ' tvg-country="{}"'.format(stream_info["country"]["code"])
-            if stream_info.get("language") != None and stream_info["language"].get("name") != None:
-                line += ' tvg-language="{}"'.format(stream_info["language"]["name"])
-            if stream_info.get("category") != None:
-                line += ' group-title="{}"'.format(stream_info["category"])
-            if stream_info.get("name") != None:
-                line += ',' + stream_info['name']
-            content.append(line)
-            content.append(stream_info["url"])
-        return "\n".join(content)
+        content = io.StringIO()
+        write_m3u(streams_info, content)
+        return content.getvalue()
 
     def parse_m3u(
         self,
@@ -289,6 +753,7 @@ class M3uParser:
         status_checker=dict(),
         check_live=True,
         enforce_schema=True,
+        keep_raw=False,
     ):
         """
         Parses the content of a local M3U file or URL.
@@ -304,6 +769,9 @@ class M3uParser:
             - `enforce_schema` (bool, optional): Indicates whether to enforce a specific schema for parsed data.
                 If enforced, non-existing fields in a stream are filled with None/null.
                 If not enforced, non-existing fields are ignored. Default is `True`.
+            - `keep_raw` (bool, optional): Keeps the original lines of every entry, so that saving to M3U writes
+                unmodified streams verbatim, with the attributes and directives (e.g. `#EXTVLCOPT`) the parser
+                doesn't extract. Default is `False`.
 
         Raises:
             - `NoContentToParseException`: Raised if there is no content to parse in the M3U file.
@@ -322,18 +790,51 @@ class M3uParser:
 
             parse_m3u("https://example.com/np.m3u", schemes=['http', 'https', 'ftp'], status_checker={"ftp": ftp_checker}, check_live=True, enforce_schema=True)
         """
-        content = ""
+        return self._run(self.aparse_m3u(data_source, schemes, status_checker, check_live, enforce_schema, keep_raw))
+
+    async def aparse_m3u(
+        self,
+        data_source: str,
+        schemes=['http', 'https'],
+        status_checker=dict(),
+        check_live=True,
+        enforce_schema=True,
+        keep_raw=False,
+    ):
+        """
+        Coroutine version of `parse_m3u`, running on the event loop of the caller.
+
+        The content is read in the default executor and liveness checks share one HTTP session,
+        so parsing overlaps with the other tasks of the loop.
+
+        Args:
+            - `data_source`, `schemes`, `status_checker`, `check_live`, `enforce_schema`, `keep_raw`: Same as in `parse_m3u`.
+
+        Returns:
+            - `M3uParser`: The instance of the M3uParser class.
+
+        Example::
+
+            parser = await M3uParser().aparse_m3u("https://iptv-org.github.io/iptv/countries/np.m3u")
+        """
         self._check_live = check_live
         self._enforce_schema = enforce_schema
         self._status_checker = status_checker
         self._schemes = set(schemes)
+        self._keep_raw = keep_raw
 
-        content = self._read_content(data_source, "m3u")
+        if self._memory_limit is not None:
+            await self._parse_spilled(data_source)
+            return self
+        with self._stats.phase("fetch"):
+            content = await self._in_thread(self._read_content, data_source, "m3u")
 
         # splitting contents into lines to parse them
-        self._lines = [line.strip("\n\r") for line in content.split("\n") if line.strip("\n\r") != ""]
+        with self._stats.phase("split"):
+            self._lines = [line.strip("\n\r") for line in content.split("\n") if line.strip("\n\r") != ""]
+        self._stats.count("lines", len(self._lines))
         if len(self._lines) > 0:
-            self._parse_lines()
+            await self._parse_lines()
         else:
             raise NoContentToParseException("No content to parse.")
         return self
@@ -379,45 +880,68 @@ class M3uParser:
             parse_json("https://example.com/np.json", schemes=['http', 'https', 'ftp'], status_checker={"ftp": ftp_checker}, check_live=True, enforce_schema=True)
 
         """
-        content = ""
+        return self._run(self.aparse_json(data_source, schemes, status_checker, check_live, enforce_schema))
+
+    async def aparse_json(
+        self,
+        data_source: str,
+        schemes=['http', 'https'],
+        status_checker=dict(),
+        check_live=True,
+        enforce_schema=True,
+    ):
+        """
+        Coroutine version of `parse_json`, running on the event loop of the caller.
+
+        Args:
+            - `data_source`, `schemes`, `status_checker`, `check_live`, `enforce_schema`: Same as in `parse_json`.
+
+        Returns:
+            - `M3uParser`: The instance of the M3uParser class.
+        """
         self._check_live = check_live
         self._enforce_schema = enforce_schema
         self._status_checker = status_checker
         self._schemes = set(schemes)
 
-        content = self._read_content(data_source, "json")
-
-        streams_info = json.loads(content)
-        if streams_info and type(streams_info) == list and len(streams_info) > 0:
-            self._streams_info = [
-                {
-                    "name": stream_info.get("name"),
-                    "logo": stream_info.get("logo"),
-                    "url": stream_info.get("url"),
-                    "category": stream_info.get("category"),
-                    "tvg": {
-                        "id": stream_info.get("tvg", {}).get("id"),
-                        "name": stream_info.get("tvg", {}).get("name"),
-                        "url": stream_info.get("tvg", {}).get("url"),
-                        "chno": stream_info.get("tvg", {}).get("chno"),
-                    },
-                    "country": {
-                        "code": stream_info.get("country", {}).get("code"),
-                        "name": stream_info.get("country", {}).get("name"),
-                    },
-                    "language": {
-                        "code": stream_info.get("language", {}).get("code"),
-                        "name": stream_info.get("language", {}).get("name"),
-                    },
-                    "status": stream_info.get("status") or "BAD",
-                    "live": stream_info.get("status") == "GOOD",
-                }
-                for stream_info in streams_info
-                if type(stream_info) == dict and stream_info.get("url")
-            ]
-        self._check_streams_status()
+        # json and csv sources are decoded while they are read, so reading and parsing are timed together
+        with self._stats.phase("fetch"):
+            self._streams_info = await self._in_thread(self._load_json, data_source)
+        self._stats.count("entries", len(self._streams_info))
+        await self._check_streams_status()
         return self
 
+    def _load_json(self, data_source: str):
+        # stream objects are decoded and normalized one at a time, never holding the whole document
+        objects = iter_json_array(self._iter_chunks(data_source, "json"))
+        return self._new_streams(JsonLoader().load(objects))
+
+    def iter_json(self, data_source: str):
+        """
+        Lazily parses a local JSON file or JSON URL, yielding one stream information at a time.
+
+        The JSON array is decoded incrementally, so memory use doesn't depend on the size of the document.
+        Streams are normalized the same way as in `parse_json`, liveness is not checked and nothing is stored
+        on the parser.
+
+        Args:
+            - `data_source` (str): The file path or URL of the JSON file containing streams information.
+
+        Raises:
+            - `UrlReadException`: Raised when there is an issue reading content from a URL.
+            - `FileNotFoundError`: Raised if the file does not exist or is not accessible.
+
+        Yields:
+            - `dict`: The stream information of every stream with a url.
+
+        Example::
+
+            for stream in parser.iter_json("https://example.com/huge.json"):
+                print(stream["name"])
+        """
+        for stream_info in JsonLoader().load(iter_json_array(self._iter_chunks(data_source, "json"))):
+            yield stream_info.to_dict()
+
     def parse_csv(
         self,
         data_source: str,
@@ -458,39 +982,376 @@ class M3uParser:
 
             parse_csv("https://example.com/np.csv", schemes=['http', 'https', 'ftp'], status_checker={"ftp": ftp_checker}, check_live=True, enforce_schema=True)
         """
-        content = ""
+        return self._run(self.aparse_csv(data_source, schemes, status_checker, check_live, enforce_schema))
+
+    async def aparse_csv(
+        self,
+        data_source: str,
+        schemes=['http', 'https'],
+        status_checker=dict(),
+        check_live=True,
+        enforce_schema=True,
+    ):
+        """
+        Coroutine version of `parse_csv`, running on the event loop of the caller.
+
+        Args:
+            - `data_source`, `schemes`, `status_checker`, `check_live`, `enforce_schema`: Same as in `parse_csv`.
+
+        Returns:
+            - `M3uParser`: The instance of the M3uParser class.
+        """
         self._check_live = check_live
         self._enforce_schema = enforce_schema
         self._status_checker = status_checker
         self._schemes = set(schemes)
 
-        content = self._read_content(data_source, "csv")
-
-        reader = csv.DictReader(content.splitlines(), delimiter=",")
-        get_value = lambda row, key: row.get(key) or None
-        self._streams_info = [
-            {
-                "name": get_value(row, "name"),
-                "logo": get_value(row, "logo"),
-                "url": get_value(row, "url"),
-                "category": get_value(row, "category"),
-                "tvg": {
-                    "id": get_value(row, "tvg_id"),
-                    "name": get_value(row, "tvg_name"),
-                    "url": get_value(row, "tvg_url"),
-                    "chno": get_value(row, "tvg_chno"),
-                },
-                "country": {"code": get_value(row, "country_code"), "name": get_value(row, "country_name")},
-                "language": {"code": get_value(row, "language_code"), "name": get_value(row, "language_name")},
-                "status": get_value(row, "status") or "BAD",
-                "live": get_value(row, "status") == "GOOD",
-            }
-            for row in reader
-            if get_value(row, "url")
-        ]
-        self._check_streams_status()
+        # json and csv sources are decoded while they are read, so reading and parsing are timed together
+        with self._stats.phase("fetch"):
+            self._streams_info = await self._in_thread(self._load_csv, data_source)
+        self._stats.count("entries", len(self._streams_info))
+        await self._check_streams_status()
+        return self
+
+    def _load_csv(self, data_source: str):
+        # rows are read from the open file or response one at a time, with the columns mapped once from the header
+        with self._open_text(data_source, "csv", newline="") as fp:
+            reader = csv.reader(fp, delimiter=",")
+            header = next(reader, [])
+            return self._new_streams(CsvLoader(header).load(reader))
+
+    def check_streams(self, status_checker: dict = None):
+        """
+        Check the liveness of the current streams again, updating their status.
+
+        Args:
+            - `status_checker` (dict, optional): A dictionary mapping URL schemes to custom status checker functions.
+                Defaults to the status checkers passed when parsing.
+
+        Returns:
+            - `M3uParser`: The instance of the M3uParser class.
+        """
+        return self._run(self.acheck_streams(status_checker))
+
+    async def acheck_streams(self, status_checker: dict = None):
+        """
+        Coroutine version of `check_streams`, running on the event loop of the caller.
+
+        Args:
+            - `status_checker` (dict, optional): Same as in `check_streams`.
+
+        Returns:
+            - `M3uParser`: The instance of the M3uParser class.
+
+        Example::
+
+            await parser.aparse_m3u("https://iptv-org.github.io/iptv/countries/np.m3u", check_live=False)
+            await parser.filter_by("category", "News").acheck_streams()
+        """
+        if status_checker is not None:
+            self._status_checker = status_checker
+        # the streams are checked whether or not they were checked when parsing
+        check_live, self._check_live = self._check_live, True
+        try:
+            await self._check_urls()
+        finally:
+            self._check_live = check_live
         return self
 
+    def parse_many(
+        self,
+        sources: Iterable[str],
+        schemes=['http', 'https'],
+        status_checker=dict(),
+        check_live=True,
+        enforce_schema=True,
+        remove_duplicates=True,
+        format: str = None,
+        max_concurrency: int = 16,
+        processes: int = None,
+    ):
+        """
+        Parses many local files or URLs concurrently and merges their streams information.
+
+        Every stream is tagged with its `source`. The liveness of the merged streams is checked once at the end,
+        sharing one HTTP session and probing every distinct URL once. A source which fails to be read or parsed
+        doesn't stop the others, its error is available from `get_source_errors`.
+
+        Args:
+            - `sources` (Iterable[str]): The file paths or URLs of the playlists.
+            - `schemes`, `status_checker`, `check_live`, `enforce_schema`: Same as in `parse_m3u`.
+            - `remove_duplicates` (bool, optional): Whether to keep only the first stream with the same name and url
+                across the sources. Defaults to True.
+            - `format` (str, optional): Format of every source (m3u/json/csv). Defaults to the extension of each source,
+                m3u if it is neither json nor csv.
+            - `max_concurrency` (int, optional): Maximum number of sources read at the same time. Defaults to 16.
+            - `processes` (int, optional): Number of worker processes to parse the sources in, for CPU bound batches.
+                Defaults to parsing in threads of this process.
+
+        Returns:
+            - `M3uParser`: The instance of the M3uParser class.
+
+        Example::
+
+            parser.parse_many(["https://iptv-org.github.io/iptv/countries/np.m3u", "streams.json.gz"])
+            print(parser.get_source_errors())
+        """
+        return self._run(
+            self.aparse_many(
+                sources,
+                schemes,
+                status_checker,
+                check_live,
+                enforce_schema,
+                remove_duplicates,
+                format,
+                max_concurrency,
+                processes,
+            )
+        )
+
+    async def aparse_many(
+        self,
+        sources: Iterable[str],
+        schemes=['http', 'https'],
+        status_checker=dict(),
+        check_live=True,
+        enforce_schema=True,
+        remove_duplicates=True,
+        format: str = None,
+        max_concurrency: int = 16,
+        processes: int = None,
+    ):
+        """
+        Coroutine version of `parse_many`, running on the event loop of the caller.
+
+        Args:
+            - `sources`, `schemes`, `status_checker`, `check_live`, `enforce_schema`, `remove_duplicates`, `format`,
+              `max_concurrency`, `processes`: Same as in `parse_many`.
+
+        Returns:
+            - `M3uParser`: The instance of the M3uParser class.
+        """
+        self._check_live = check_live
+        self._enforce_schema = enforce_schema
+        self._status_checker = status_checker
+        self._schemes = set(schemes)
+        self._source_errors = {}
+        sources = list(sources)
+        options = {"useragent": self._headers["User-Agent"], "timeout": self._timeout}
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        if processes:
+            from concurrent.futures import ProcessPoolExecutor
+
+            executor = ProcessPoolExecutor(processes)
+        else:
+            executor = None
+
+        async def load(source):
+            source_format = format or _source_format(source)
+            async with semaphore:
+                try:
+                    if executor is not None:
+                        return await asyncio.get_running_loop().run_in_executor(
+                            executor, _parse_source, options, source, source_format, list(schemes), enforce_schema
+                        )
+                    parser = M3uParser(**options)
+                    await getattr(parser, f"aparse_{source_format}")(
+                        source, schemes, check_live=False, enforce_schema=enforce_schema
+                    )
+                    return parser._streams_info
+                except Exception as error:
+                    logger.warning("Failed to parse %s: %s" % (source, error))
+                    self._source_errors[source] = error
+                    return ()
+
+        try:
+            results = await asyncio.gather(*(load(source) for source in sources))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        streams_info = self._new_streams()
+        seen_entries = set()
+        for source, source_streams in zip(sources, results):
+            for stream_info in source_streams:
+                if remove_duplicates:
+                    unique_key = ((stream_info.get("name") or "").lower(), (stream_info.get("url") or "").lower())
+                    if unique_key in seen_entries:
+                        continue
+                    seen_entries.add(unique_key)
+                stream_info["source"] = source
+                streams_info.append(stream_info)
+        self._streams_info = streams_info
+        self._source, self._source_fingerprint = None, None
+        await self._check_streams_status()
+        return self
+
+    def get_source_errors(self):
+        """
+        Get the errors of the sources which failed to be read or parsed by the last `parse_many`.
+
+        Returns:
+            - `dict`: The exception raised for every failed source, by source.
+        """
+        return dict(self._source_errors)
+
+    def refresh(
+        self,
+        data_source: str = None,
+        previous: Union["M3uParser", str] = None,
+        max_age: float = None,
+        check_live=True,
+        status_checker: dict = None,
+    ):
+        """
+        Parses a source again and diffs it against a previous result, only checking the streams which changed.
+
+        Entries are identified by their url and tvg id. Unchanged entries keep the status of their previous check,
+        so only added and changed entries, and entries checked more than `max_age` seconds ago, are probed.
+        The parser holds the refreshed streams information afterwards.
+
+        Args:
+            - `data_source` (str, optional): The file path or URL to parse. Defaults to the source of the previous result.
+            - `previous` (Union[M3uParser, str], optional): The previous result, as a parser or the path of a snapshot
+                saved with `save_snapshot`. Defaults to the streams last parsed by this parser.
+            - `max_age` (float, optional): Age in seconds after which the status of unchanged entries is checked again.
+                Defaults to never.
+            - `check_live` (bool, optional): Whether to check the status of the added, changed and stale entries.
+                Defaults to True.
+            - `status_checker` (dict, optional): A dictionary mapping URL schemes to custom status checker functions.
+                Defaults to the status checkers of the previous result.
+
+        Raises:
+            - `ParamNotPassedException`: Raised if no source is passed and the previous result has none.
+
+        Returns:
+            - `dict`: The diff, with the `added`, `removed` and `changed` streams information, the streams whose
+              `status_changed` when checked again, and the number of `unchanged` and `rechecked` entries.
+
+        Example::
+
+            parser.parse_m3u("https://iptv-org.github.io/iptv/countries/np.m3u")
+            diff = parser.refresh(max_age=24 * 60 * 60)
+            print(len(diff["added"]), len(diff["removed"]), len(diff["changed"]))
+        """
+        return self._run(self.arefresh(data_source, previous, max_age, check_live, status_checker))
+
+    async def arefresh(
+        self,
+        data_source: str = None,
+        previous: Union["M3uParser", str] = None,
+        max_age: float = None,
+        check_live=True,
+        status_checker: dict = None,
+    ):
+        """
+        Coroutine version of `refresh`, running on the event loop of the caller.
+
+        Args:
+            - `data_source`, `previous`, `max_age`, `check_live`, `status_checker`: Same as in `refresh`.
+
+        Returns:
+            - `dict`: Same as in `refresh`.
+        """
+        if isinstance(previous, str):
+            previous = await self._in_thread(self.load_snapshot, previous)
+        previous = self if previous is None else previous
+        data_source = previous._source if data_source is None else data_source
+        if data_source is None:
+            raise ParamNotPassedException("Param data_source is not passed.")
+        source_format = _source_format(data_source)
+        schemes = previous._schemes or {"http", "https"}
+        # the refreshed source is parsed into the same storage as this parser's, recording the same stats
+        parser = M3uParser(**self._parser_options())
+        # raw lines are kept if the previous result kept them, e.g. when refreshing into a new parser
+        keep_raw = self._keep_raw or previous._keep_raw
+        options = {"keep_raw": keep_raw} if source_format == "m3u" else {}
+        parse = getattr(parser, f"aparse_{source_format}")
+        await parse(data_source, schemes, check_live=False, enforce_schema=previous._enforce_schema, **options)
+
+        previous_streams = dict(zip(_entry_ids(previous._streams_info_backup), previous._streams_info_backup))
+        streams_info, refreshed = parser._streams_info, self._new_streams()
+        stale_before = None if max_age is None else time.time() - max_age
+        added, changed, recheck, previous_status = [], [], [], {}
+        # the streams are read once, in order, and the updated records appended, whatever their storage
+        for index, (entry_id, stream_info) in enumerate(zip(_entry_ids(streams_info), streams_info)):
+            previous_info = previous_streams.pop(entry_id, None)
+            if previous_info is None:
+                added.append(index)
+                recheck.append(index)
+            elif m3u_key(previous_info) != m3u_key(stream_info):
+                previous_status[index] = previous_info.get("status")
+                changed.append(index)
+                recheck.append(index)
+            else:
+                previous_status[index] = previous_info.get("status")
+                # unchanged entries keep the result of their previous check
+                checked_at = getattr(previous_info, "_checked_at", None)
+                for key in ("status", "live", "check_tier", "check_error"):
+                    if key in previous_info:
+                        stream_info[key] = previous_info[key]
+                if checked_at is not None:
+                    stream_info._checked_at = checked_at
+                if checked_at is None or stale_before is not None and checked_at < stale_before:
+                    recheck.append(index)
+            refreshed.append(stream_info)
+
+        self._streams_info = refreshed
+        # latencies of streams no longer listed are dropped, those checked again are measured again
+        urls = {stream_info["url"] for stream_info in streams_info}
+        self._probe_latency = {url: latency for url, latency in previous._probe_latency.items() if url in urls}
+        self._check_live = check_live
+        self._schemes = set(schemes)
+        self._enforce_schema = previous._enforce_schema
+        self._keep_raw = keep_raw
+        self._status_checker = previous._status_checker if status_checker is None else status_checker
+        self._source, self._source_fingerprint = parser._source, parser._source_fingerprint
+        if check_live and recheck:
+            await self._check_urls(recheck)
+        else:
+            recheck = []
+        self._streams_info_backup = self._streams_info.copy()
+        logger.info("Refreshed %d streams, checked %d of them again." % (len(self._streams_info), len(recheck)))
+
+        checked_again = [index for index in recheck if index in previous_status]
+        return {
+            "added": [to_dict(stream_info) for stream_info in self._take(added)],
+            "removed": [to_dict(stream_info) for stream_info in previous_streams.values()],
+            "changed": [to_dict(stream_info) for stream_info in self._take(changed)],
+            "status_changed": [
+                to_dict(stream_info)
+                for index, stream_info in zip(checked_again, self._take(checked_again))
+                if stream_info.get("status") != previous_status[index]
+            ],
+            "unchanged": len(self._streams_info) - len(added) - len(changed),
+            "rechecked": len(recheck),
+        }
+
+    def _split_key(self, key: str, key_splitter: str, nested_key: bool):
+        key_0, key_1 = [key, ""]
+        if nested_key:
+            try:
+                key_0, key_1 = key.split(key_splitter)
+            except ValueError:
+                raise NestedKeyException("Nested key must be in the format <key><key_splitter><nested_key>.")
+            if self._streams_info and (
+                key_0 not in self._streams_info[0] or key_1 not in self._streams_info[0][key_0]
+            ):
+                raise KeyNotFoundException(f"Nested key '{key}' is not present in the streams.")
+        elif self._streams_info and key not in self._streams_info[0]:
+            raise KeyNotFoundException(f"Key '{key}' is not present in the streams.")
+        return key_0, key_1
+
+    def _value_getter(self, key: Union[str, Callable], key_splitter: str, nested_key: bool):
+        """Returns a function reading the value of a (nested) key from a stream information."""
+        if callable(key):
+            return key
+        key_0, key_1 = self._split_key(key, key_splitter, nested_key)
+        if nested_key:
+            return lambda stream_info: (stream_info.get(key_0) or {}).get(key_1)
+        return lambda stream_info: stream_info.get(key_0)
+
     def filter_by(
         self,
         key: str,
@@ -519,26 +1380,17 @@ class M3uParser:
         Returns:
             - `M3uParser`: The instance of the M3uParser class.
         """
-        key_0, key_1 = [key, ""]
-        if nested_key:
-            try:
-                key_0, key_1 = key.split(key_splitter)
-            except ValueError:
-                raise NestedKeyException("Nested key must be in the format <key><key_splitter><nested_key>.")
-            if self._streams_info and (
-                key_0 not in self._streams_info[0] or key_1 not in self._streams_info[0][key_0]
-            ):
-                raise KeyNotFoundException(f"Nested key '{key}' is not present in the streams.")
-        elif self._streams_info and key not in self._streams_info[0]:
-            raise KeyNotFoundException(f"Key '{key}' is not present in the streams.")
+        key_0, key_1 = self._split_key(key, key_splitter, nested_key)
         if not isinstance(filters, list):
             filters = [filters]
         any_or_all = any if retrieve else all
         not_operator = lambda x: x if retrieve else not x
 
-        def check_filter(stream_info, fltr):
-            value = stream_info.get(key_0, {}).get(key_1) if nested_key else stream_info.get(key)
-            logger.info(f"Filter: {fltr}, Value: {value}")
+        debug = logger.isEnabledFor(logging.DEBUG)
+
+        def check_filter(value, fltr):
+            if debug:
+                logger.debug("Filter: %s, Value: %s", fltr, value)
             # Case 1: Both filter and value are None, return True
             if fltr is None and value is None:
                 return True
@@ -560,12 +1412,21 @@ class M3uParser:
             # Case 5: Invalid filter type, return False
             return False
 
-        self._streams_info = list(
-            filter(
-                lambda stream_info: any_or_all(not_operator(check_filter(stream_info, fltr)) for fltr in filters),
-                self._streams_info,
-            )
-        )
+        matches = lambda value: any_or_all(not_operator(check_filter(value, fltr)) for fltr in filters)
+        with self._stats.phase("filter"):
+            if isinstance(self._streams_info, SpilledStreams):
+                # spilled streams are filtered as they are read, without extracting the values of every stream first
+                value = self._value_getter(key, key_splitter, nested_key)
+                self._streams_info = self._streams_info.filter(lambda stream_info: matches(value(stream_info)))
+                return self
+            values, decoder = self._encoded_values(key_0, key_1 if nested_key else "")
+            if decoder is None:
+                keep = [index for index, value in enumerate(values) if matches(value)]
+            else:
+                # evaluate the filters once per distinct value, then keep the rows by their code
+                allowed = {code for code in set(values) if matches(decoder[code])}
+                keep = [index for index, code in enumerate(values) if code in allowed]
+            self._streams_info = self._take(keep)
         return self
 
     def reset_operations(self):
@@ -641,24 +1502,98 @@ class M3uParser:
         """
         return self.filter_by("category", categories)
 
+    def _sort_keys(self, keys, key_splitter, asc, nested_key, nulls, collation):
+        """Returns the (key, nested key, function making a value comparable, descending) of every sort key."""
+        keys = keys if isinstance(keys, list) else [keys]
+        count = len(keys)
+        asc, nested_key, nulls, collation = (
+            option if isinstance(option, list) else [option] * count for option in (asc, nested_key, nulls, collation)
+        )
+        if not all(len(option) == count for option in (asc, nested_key, nulls, collation)):
+            raise ValueError("Options passed as lists must have the same length as the sort keys.")
+        sort_keys = []
+        for key, ascending, nested, null_placement, collate in zip(keys, asc, nested_key, nulls, collation):
+            if null_placement not in (None, "first", "last"):
+                raise ValueError("Null placement must be either 'first' or 'last'.")
+            if collate not in collations:
+                raise ValueError(f"Collation must be one of {list(collations)}.")
+            key_0, key_1 = self._split_key(key, key_splitter, nested)
+            reverse = not ascending
+            # None sorts before values unless nulls are explicitly placed otherwise
+            nulls_first = null_placement == "first" if null_placement else ascending
+            none_low = nulls_first != reverse
+            transform = collations[collate]
+            sort_key = lambda value, none_low=none_low, transform=transform: (
+                (not none_low, None) if value is None else (none_low, transform(value) if transform else value)
+            )
+            sort_keys.append((key_0, key_1 if nested else "", sort_key, reverse))
+        return sort_keys
+
+    def _sort_columns(self, keys, key_splitter, asc, nested_key, nulls, collation):
+        """Extracts every sort key once into a list of comparable values per key."""
+        columns = []
+        for key_0, key_1, sort_key, reverse in self._sort_keys(keys, key_splitter, asc, nested_key, nulls, collation):
+            values, decoder = self._encoded_values(key_0, key_1)
+            if decoder is None:
+                columns.append(([sort_key(value) for value in values], reverse))
+            else:
+                decoded_keys = [sort_key(value) for value in decoder]
+                columns.append(([decoded_keys[code] for code in values], reverse))
+        return columns
+
+    def _record_sort_key(self, keys, key_splitter, asc, nested_key, nulls, collation):
+        """Returns a function computing the composite sort key of a stream, and whether it sorts in reverse.
+
+        Like `top_k`, keys sorted in the other direction than the first one are wrapped in `Descending`.
+        """
+        sort_keys = self._sort_keys(keys, key_splitter, asc, nested_key, nulls, collation)
+        reverse = sort_keys[0][3]
+        getters = [
+            (
+                (
+                    (lambda stream_info, key_0=key_0, key_1=key_1: (stream_info.get(key_0) or {}).get(key_1))
+                    if key_1
+                    else (lambda stream_info, key_0=key_0: stream_info.get(key_0))
+                ),
+                sort_key,
+                descending != reverse,
+            )
+            for key_0, key_1, sort_key, descending in sort_keys
+        ]
+
+        def record_key(stream_info):
+            return tuple(
+                Descending(sort_key(getter(stream_info))) if wrapped else sort_key(getter(stream_info))
+                for getter, sort_key, wrapped in getters
+            )
+
+        return record_key, reverse
+
     def sort_by(
         self,
-        key: str,
+        key: Union[str, list[str]],
         key_splitter: str = "-",
-        asc: bool = True,
-        nested_key: bool = False,
+        asc: Union[bool, list[bool]] = True,
+        nested_key: Union[bool, list[bool]] = False,
+        nulls: Union[str, list[str], None] = None,
+        collation: Union[str, list[str], None] = None,
     ):
         """
-        Sorts the internal streams information list based on a specific key.
+        Sorts the internal streams information list based on one or more keys.
 
-        Sorts the streams information list based on the provided key in ascending or descending order,
-        according to the specified configuration options.
+        Sorts the streams information list based on the provided key(s) in ascending or descending order,
+        according to the specified configuration options. Every key is extracted only once per sort.
 
         Args:
-            - `key` (str): The key to sort by. It can be a nested key separated by a splitter if 'nested_key' is True in config.
+            - `key` (Union[str, list[str]]): The key or list of keys to sort by. It can be a nested key separated by a splitter if 'nested_key' is True in config.
             - `key_splitter` (str, optional): A string used to split nested keys (default is `"-"`).
-            - `asc` (bool, optional): Indicates whether to sort in ascending (True) or descending (False) order (default is `True`).
-            - `nested_key` (bool, optional): Indicates whether the sort key is nested or not (default is `False`).
+            - `asc` (Union[bool, list[bool]], optional): Indicates whether to sort in ascending (True) or descending (False) order,
+                either for all keys or per key (default is `True`).
+            - `nested_key` (Union[bool, list[bool]], optional): Indicates whether the sort key is nested or not, either for all keys or per key (default is `False`).
+            - `nulls` (Union[str, list[str], None], optional): Places None values `"first"` or `"last"`, either for all keys or per key.
+                By default None values come first in ascending and last in descending order.
+            - `collation` (Union[str, list[str], None], optional): Use `"natural"` to order embedded numbers numerically (e.g. channel numbers)
+                or `"locale"` to order strings according to the current locale, either for all keys or per key (default is `None`).
 
         Raises:
             - `NestedKeyException`: Raised if 'nested_key' is True but the key is not in the correct format.
@@ -667,28 +1602,70 @@ class M3uParser:
         Returns:
             - `M3uParser`: The instance of the M3uParser class.
         """
-        key_0, key_1 = [key, ""]
-        if nested_key:
-            try:
-                key_0, key_1 = key.split(key_splitter)
-            except ValueError:
-                raise NestedKeyException("Nested key must be in the format <key><key_splitter><nested_key>.")
-            if self._streams_info and (
-                key_0 not in self._streams_info[0] or key_1 not in self._streams_info[0][key_0]
-            ):
-                raise KeyNotFoundException(f"Nested key '{key}' is not present in the streams.")
-        elif self._streams_info and key not in self._streams_info[0]:
-            raise KeyNotFoundException(f"Key '{key}' is not present in the streams.")
+        if isinstance(self._streams_info, SpilledStreams):
+            record_key, reverse = self._record_sort_key(key, key_splitter, asc, nested_key, nulls, collation)
+            self._streams_info = self._streams_info.sorted(record_key, reverse)
+            return self
+        columns = self._sort_columns(key, key_splitter, asc, nested_key, nulls, collation)
+        order = list(range(len(self._streams_info)))
+        # sorting is stable, so sorting by the least significant key first yields the multi-key order
+        for column, reverse in reversed(columns):
+            order.sort(key=column.__getitem__, reverse=reverse)
+        self._streams_info = self._take(order)
+        return self
 
-        self._streams_info = sorted(
-            self._streams_info,
-            key=lambda stream_info: (
-                (stream_info[key_0][key_1] is not None, stream_info[key_0][key_1])
-                if nested_key
-                else (stream_info[key] is not None, stream_info[key])
-            ),
-            reverse=not asc,
-        )
+    def top_k(
+        self,
+        n: int,
+        by: Union[str, list[str]],
+        key_splitter: str = "-",
+        asc: Union[bool, list[bool]] = True,
+        nested_key: Union[bool, list[bool]] = False,
+        nulls: Union[str, list[str], None] = None,
+        collation: Union[str, list[str], None] = None,
+    ):
+        """
+        Keeps only the first `n` streams according to the given sort key(s).
+
+        Produces the same result as `sort_by` followed by keeping the first `n` streams, but uses a heap
+        so that the whole list is never sorted.
+
+        Args:
+            - `n` (int): Number of streams to keep.
+            - `by` (Union[str, list[str]]): The key or list of keys to order by.
+            - `key_splitter`, `asc`, `nested_key`, `nulls`, `collation`: Same as in `sort_by`.
+
+        Raises:
+            - `NestedKeyException`: Raised if 'nested_key' is True but the key is not in the correct format.
+            - `KeyNotFoundException`: Raised if Key is not found.
+
+        Returns:
+            - `M3uParser`: The instance of the M3uParser class.
+        """
+        if isinstance(self._streams_info, SpilledStreams):
+            # the streams are read once, only keeping the first `n` in a heap
+            record_key, reverse = self._record_sort_key(by, key_splitter, asc, nested_key, nulls, collation)
+            select = heapq.nlargest if reverse else heapq.nsmallest
+            self._streams_info = self._new_streams(select(n, self._streams_info, key=record_key))
+            return self
+        columns = self._sort_columns(by, key_splitter, asc, nested_key, nulls, collation)
+        indices = range(len(self._streams_info))
+        if all(reverse == columns[0][1] for _, reverse in columns):
+            select = heapq.nlargest if columns[0][1] else heapq.nsmallest
+            if len(columns) == 1:
+                sort_key = columns[0][0].__getitem__
+            else:
+                sort_key = lambda index: tuple(column[index] for column, _ in columns)
+            order = select(n, indices, key=sort_key)
+        else:
+            order = heapq.nsmallest(
+                n,
+                indices,
+                key=lambda index: tuple(
+                    Descending(column[index]) if reverse else column[index] for column, reverse in columns
+                ),
+            )
+        self._streams_info = self._take(order)
         return self
 
     def remove_duplicates(self, name: str = None, url: str = None):
@@ -709,23 +1686,18 @@ class M3uParser:
         if name is not None and url is None:
             raise ParamNotPassedException(f"Param url is not passed.")
 
-        filtered_streams = []
         seen_entries = set()
 
         name_pattern = re.compile(name, re.IGNORECASE) if name else None
+        both_none = name is None and url is None
 
-        for stream_info in self._streams_info:
-            stream_name = stream_info.get("name")
-            stream_url = stream_info.get("url")
-
-            both_none = name is None and url is None
-
+        def is_kept(stream_name, stream_url):
             if (
                 (stream_name is not None and name_pattern is not None and re.search(name_pattern, stream_name))
                 and (stream_url is not None and stream_url.lower() == url.lower())
             ) or both_none:
                 is_found = False
-                unique_key = (stream_name.lower(), stream_url.lower())
+                unique_key = ((stream_name or "").lower(), stream_url.lower())
 
                 if both_none:
                     is_found = unique_key in seen_entries
@@ -737,11 +1709,30 @@ class M3uParser:
 
                 if not is_found:
                     seen_entries.add(unique_key)
-                    filtered_streams.append(stream_info)
+                    return True
+                return False
+            return True
+
+        if isinstance(self._streams_info, SpilledStreams):
+            if both_none:
+                # every entry is a candidate, so the seen entries are hash partitioned on disk
+                unique_key = lambda stream_info: (
+                    (stream_info.get("name") or "").lower(),
+                    stream_info.get("url").lower(),
+                )
+                self._streams_info = self._streams_info.distinct(unique_key)
             else:
-                filtered_streams.append(stream_info)
+                self._streams_info = self._streams_info.filter(
+                    lambda stream_info: is_kept(stream_info.get("name"), stream_info.get("url"))
+                )
+            return self
 
-        self._streams_info = filtered_streams
+        keep = [
+            index
+            for index, (stream_name, stream_url) in enumerate(zip(self._values("name"), self._values("url")))
+            if is_kept(stream_name, stream_url)
+        ]
+        self._streams_info = self._take(keep)
 
         return self
 
@@ -758,38 +1749,278 @@ class M3uParser:
         Returns:
             - `str`: JSON string representation of the internal streams information list.
         """
-        return json.dumps(self._streams_info, indent=indent)
+        return json.dumps(self.get_list(), indent=indent)
 
     def get_list(self):
         """
         Get the parsed streams information list.
 
-        Returns the internal streams information list that has been parsed, filtered, and processed
-        based on various operations performed on the original data source.
+        Returns the streams information that has been parsed, filtered, and processed based on various
+        operations performed on the original data source. The dictionaries are built from the stored records
+        on every call, so modifying them does not modify the parser, and each call takes time proportional
+        to the number of streams.
 
         Returns:
             - `list`: Parsed streams information list containing dictionaries of stream details.
         """
-        return self._streams_info
+        return [stream_info.to_dict() for stream_info in self._streams_info]
 
     def get_random_stream(self, random_shuffle: bool = True):
         """
         Return a random stream information.
 
-        Retrieves a randomly selected stream information from the internal streams information list.
-        Optionally, shuffles the list before selecting to provide a truly random choice.
+        Retrieves a randomly selected stream information from the internal streams information list
+        in constant time, without reordering the list.
 
         Args:
-            - `random_shuffle` (bool, optional): Whether to shuffle the streams information list before selecting. Defaults to `True`.
+            - `random_shuffle` (bool, optional): Kept for backward compatibility, selection no longer shuffles the streams information list.
 
         Returns:
             - `dict or None`: A randomly selected stream information dictionary, or None if no streams are available.
         """
         if not len(self._streams_info):
             raise NoStreamsException("No streams information so could not get any random stream.")
-        if random_shuffle:
-            random.shuffle(self._streams_info)
-        return random.choice(self._streams_info)
+        return random.choice(self._streams_info).to_dict()
+
+    def _weight_getter(self, weighted_by: Union[str, Callable], key_splitter: str, nested_key: bool):
+        if callable(weighted_by):
+            return weighted_by
+        get_value = self._value_getter(weighted_by, key_splitter, nested_key)
+
+        def weight(stream_info):
+            value = get_value(stream_info) or 0
+            if not isinstance(value, (int, float)):
+                raise ValueError(
+                    f"Key '{weighted_by}' has the non-numeric value {value!r}, weight by a callable instead."
+                )
+            return value
+
+        return weight
+
+    def sample(
+        self,
+        k: int = 1,
+        weighted_by: Union[str, Callable, None] = None,
+        seed=None,
+        replace: bool = False,
+        source=None,
+        key_splitter: str = "-",
+        nested_key: bool = False,
+    ):
+        """
+        Return randomly selected streams information without modifying the parser.
+
+        Samples from the internal streams information list or, if `source` is given, from any iterable of streams
+        such as `iter_m3u()` using reservoir sampling, so that huge playlists never have to be fully loaded.
+        Weighted draws from the internal list use an alias table which is built once and reused until the streams
+        or their statuses change.
+
+        Args:
+            - `k` (int, optional): Number of streams to select. Defaults to `1`.
+            - `weighted_by` (Union[str, Callable, None], optional): A key with numeric values or a callable returning
+                the non-negative weight of a stream information, e.g. to weight by status. Defaults to `None` (uniform).
+            - `seed` (optional): Seed for a reproducible selection. Defaults to `None`.
+            - `replace` (bool, optional): Whether the same stream can be selected more than once. Defaults to `False`.
+            - `source` (Iterable, optional): Iterable of streams information to sample from instead of the internal list.
+            - `key_splitter` (str, optional): A string used to split a nested `weighted_by` key (default is `"-"`).
+            - `nested_key` (bool, optional): Indicates whether the `weighted_by` key is nested or not (default is `False`).
+
+        Raises:
+            - `NoStreamsException`: Raised if there are no streams to select from.
+            - `ValueError`: Raised if a weight is negative or the `weighted_by` key has non-numeric values.
+
+        Returns:
+            - `list`: The selected streams information.
+
+        Example::
+
+            parser.sample(5, weighted_by=lambda stream: 10 if stream["status"] == "GOOD" else 1, seed=42)
+            parser.sample(10, source=parser.iter_m3u("https://example.com/huge.m3u"))
+        """
+        rng = random.Random(seed)
+        weight = None if weighted_by is None else self._weight_getter(weighted_by, key_splitter, nested_key)
+        if source is not None:
+            streams = reservoir_sample(source, k, weight, rng)
+            if not streams:
+                raise NoStreamsException("No streams information so could not get any random stream.")
+            return [to_dict(stream_info) for stream_info in streams]
+
+        if not len(self._streams_info):
+            raise NoStreamsException("No streams information so could not get any random stream.")
+        if weighted_by is None:
+            if replace:
+                streams = rng.choices(self._streams_info, k=k)
+            else:
+                streams = rng.sample(self._streams_info, min(k, len(self._streams_info)))
+            return [stream_info.to_dict() for stream_info in streams]
+
+        if replace or k == 1:
+            # the table is dropped whenever the streams are replaced or checked, see `_streams_info`
+            cache_key = (weighted_by, key_splitter, nested_key)
+            if self._alias_table is None or self._alias_table[0] != cache_key:
+                table = AliasTable([weight(stream_info) for stream_info in self._streams_info])
+                self._alias_table = (cache_key, table)
+            table = self._alias_table[1]
+            return [self._streams_info[table.draw(rng)].to_dict() for _ in range(k)]
+        return [stream_info.to_dict() for stream_info in reservoir_sample(self._streams_info, k, weight, rng)]
+
+    def aggregate(
+        self,
+        by: Union[str, Callable, list[Union[str, Callable]]],
+        metrics: list[str] = ["count"],
+        key_splitter: str = "-",
+        nested_key: Union[bool, list[bool]] = False,
+        source=None,
+    ):
+        """
+        Group streams and compute metrics for every group in a single pass.
+
+        Args:
+            - `by` (Union[str, Callable, list]): Key or list of keys to group by. Keys can be nested keys separated by
+                `key_splitter` like in `filter_by`, or callables returning the group value of a stream information
+                which are reported under their `__name__`.
+            - `metrics` (list[str], optional): Metrics to compute per group. Supported metrics are `"count"`, `"good"`, `"bad"`,
+                `"good_ratio"` and the latency metrics `"mean_latency"`, `"min_latency"`, `"max_latency"` and `"p<N>_latency"`
+                (e.g. `"p50_latency"`) in seconds, which are available for streams checked by this parser. Defaults to `["count"]`.
+            - `key_splitter` (str, optional): A string used to split nested keys (default is `"-"`).
+            - `nested_key` (Union[bool, list[bool]], optional): Indicates whether the keys are nested or not, for all keys or per key (default is `False`).
+            - `source` (Iterable, optional): Iterable of streams information to aggregate instead of the internal list, e.g. `iter_m3u()`.
+
+        Raises:
+            - `NestedKeyException`: Raised if 'nested_key' is True but a key is not in the correct format.
+            - `KeyNotFoundException`: Raised if a key is missing in the streams.
+            - `ValueError`: Raised if a metric is not supported.
+
+        Returns:
+            - `list`: One dictionary per group holding the group values and the metrics.
+
+        Example::
+
+            parser.aggregate(by=["category", "country-code"], metrics=["count", "good_ratio", "p50_latency"], nested_key=[False, True])
+            # [{"category": "News", "country-code": "NP", "count": 3, "good_ratio": 0.66, "p50_latency": 0.21}, ...]
+        """
+        keys = by if isinstance(by, list) else [by]
+        nested_keys = nested_key if isinstance(nested_key, list) else [nested_key] * len(keys)
+        if len(nested_keys) != len(keys):
+            raise ValueError("Options passed as lists must have the same length as the group keys.")
+        names = [getattr(key, "__name__", "group") if callable(key) else key for key in keys]
+
+        latency_metrics = {}
+        for metric in metrics:
+            if metric in ("count", "good", "bad", "good_ratio"):
+                continue
+            statistic = metric[: -len("_latency")] if metric.endswith("_latency") else ""
+            if statistic in ("mean", "min", "max"):
+                latency_metrics[metric] = statistic
+            elif statistic[:1] == "p" and statistic[1:].replace(".", "", 1).isdigit() and float(statistic[1:]) <= 100:
+                latency_metrics[metric] = float(statistic[1:])
+            else:
+                raise ValueError(f"Unsupported metric '{metric}'.")
+
+        if source is None:
+            # group on the dictionary codes of columnar streams, decoding only the group keys
+            columns = []
+            for key, nested in zip(keys, nested_keys):
+                if callable(key):
+                    columns.append(([key(stream_info) for stream_info in self._streams_info], None))
+                else:
+                    columns.append(self._encoded_values(*self._split_key(key, key_splitter, nested)))
+            decoders = [decoder for _, decoder in columns]
+            rows = zip(
+                zip(*(values for values, _ in columns)),
+                self._values("status"),
+                self._values("url") if latency_metrics else repeat(None),
+            )
+        else:
+            getters = [self._value_getter(key, key_splitter, nested) for key, nested in zip(keys, nested_keys)]
+            decoders = [None] * len(keys)
+            rows = (
+                (
+                    tuple(get_value(stream_info) for get_value in getters),
+                    stream_info.get("status"),
+                    stream_info.get("url"),
+                )
+                for stream_info in source
+            )
+
+        # group key -> [count, checked, good, latencies]
+        groups = {}
+        for group_key, status, url in rows:
+            group = groups.get(group_key)
+            if group is None:
+                group = groups[group_key] = [0, 0, 0, []]
+            group[0] += 1
+            if status is not None:
+                group[1] += 1
+                group[2] += status == "GOOD"
+            if latency_metrics:
+                latency = self._probe_latency.get(url)
+                if latency is not None:
+                    group[3].append(latency)
+
+        result = []
+        for group_key, (count, checked, good, latencies) in groups.items():
+            group_key = [value if decoder is None else decoder[value] for value, decoder in zip(group_key, decoders)]
+            row = dict(zip(names, group_key))
+            if latencies:
+                latencies.sort()
+            for metric in metrics:
+                if metric == "count":
+                    row[metric] = count
+                elif metric == "good":
+                    row[metric] = good
+                elif metric == "bad":
+                    row[metric] = checked - good
+                elif metric == "good_ratio":
+                    row[metric] = good / checked if checked else None
+                elif not latencies:
+                    row[metric] = None
+                elif latency_metrics[metric] == "mean":
+                    row[metric] = sum(latencies) / len(latencies)
+                elif latency_metrics[metric] == "min":
+                    row[metric] = latencies[0]
+                elif latency_metrics[metric] == "max":
+                    row[metric] = latencies[-1]
+                else:
+                    # nearest-rank percentile
+                    rank = math.ceil(latency_metrics[metric] / 100 * len(latencies))
+                    row[metric] = latencies[max(rank - 1, 0)]
+            result.append(row)
+        return result
+
+    def search(self, query: str, limit: int = 10, fuzzy: bool = True, fields=default_search_fields):
+        """
+        Search streams by name, tvg name and category.
+
+        Uses a token and trigram index which is built once per parse on the first search. Results are restricted
+        to the streams left after filtering, without rebuilding the index.
+        Query tokens match indexed tokens exactly, by prefix, by substring or, if `fuzzy` is enabled, with a few typos.
+
+        Args:
+            - `query` (str): The search query.
+            - `limit` (int, optional): Maximum number of results. Defaults to `10`.
+            - `fuzzy` (bool, optional): Whether to match tokens with typos. Defaults to `True`.
+            - `fields` (tuple, optional): `(key, nested_key, weight)` triples of the fields to index.
+                Defaults to name, tvg name and category.
+
+        Returns:
+            - `list`: Matching streams information, best match first.
+
+        Example::
+
+            parser.search("bbc new", limit=5)
+        """
+        indexed = self._streams_info_backup
+        if self._search_index is None or self._search_index[:2] != (id(indexed), fields):
+            docs = {row_id: doc for doc, row_id in enumerate(self._row_ids(indexed))}
+            self._search_index = (id(indexed), fields, SearchIndex(indexed, fields), docs, indexed)
+        index, docs = self._search_index[2:4]
+        # only the docs left after filtering are searched, updated whenever the streams list changes
+        if self._search_alive is None or self._search_alive[:2] != (id(self._streams_info), len(self._streams_info)):
+            alive = {docs[row_id] for row_id in self._row_ids(self._streams_info) if row_id in docs}
+            self._search_alive = (id(self._streams_info), len(self._streams_info), alive, self._streams_info)
+        alive = self._search_alive[2]
+        return [indexed[doc].to_dict() for doc, _ in index.search(query, limit, fuzzy, alive)]
 
     def to_file(self, filename: str, format: str = "json"):
         """
@@ -797,6 +2028,8 @@ class M3uParser:
 
         Saves the internal streams information list as a CSV, JSON, or M3U file with the specified filename and format.
         The format is determined by the file extension or the optional 'format' parameter.
+        Filenames ending with .gz/.bz2/.xz/.zst are compressed as they are written, e.g. `streams.m3u.gz`.
+        Streams are written one at a time, see `m3u_parser.writers.write_streams` to write any iterable of streams.
 
         Args:
             - `filename` (str): Name of the file to save the streams information to.
@@ -805,6 +2038,9 @@ class M3uParser:
         Returns:
             - `str`: The filename after saving the streams information to the specified file in the specified format.
         """
+        # the format is read from the extension before the compression one, e.g. streams.json.gz
+        compression = filename[len(strip_compression(filename)) :]
+        filename = strip_compression(filename)
         format = filename.split(".")[-1] if len(filename.split(".")) > 1 else format
 
         def with_extension(name, ext):
@@ -814,30 +2050,197 @@ class M3uParser:
             else:
                 return name + ".%s" % ext
 
-        filename = with_extension(filename, format)
+        filename = with_extension(filename, format) + compression
         if len(self._streams_info) == 0:
             raise NoStreamsException("Either parsing is not done or no stream info was found after parsing.")
         logger.info("Saving to file: %s" % filename)
-        if format == "json":
-            data = json.dumps(self._streams_info, indent=4)
-            with open(filename, mode="w", encoding="utf-8") as fp:
-                fp.write(data)
+        if format in ("json", "m3u") or format == "csv" and self._enforce_schema:
+            with self._stats.phase("export"):
+                write_streams(self._streams_info, filename, format)
             logger.info("Saved to file: %s" % filename)
-
         elif format == "csv":
-            if self._enforce_schema:
-                ndict_to_csv(self._streams_info, filename)
-                logger.info("Saved to file: %s" % filename)
-            else:
-                raise SavingNotSupportedException(
-                    "Saving to csv file not supported if the schema was not forced (enforce_schema)."
-                )
-
-        elif format == "m3u":
-            content = self._get_m3u_content(self._streams_info)
-            with open(filename, mode="w", encoding="utf-8") as fp:
-                fp.write(content)
-            logger.info("Saved to file: %s" % filename)
+            raise SavingNotSupportedException(
+                "Saving to csv file not supported if the schema was not forced (enforce_schema)."
+            )
         else:
             raise UnrecognizedFormatException("Unrecognised format.")
         return filename
+
+    def to_sqlite(self, store: Union[str, SqliteStore], source: str = None):
+        """
+        Bulk insert the streams information into a SQLite store.
+
+        Streams are inserted with batched `executemany` calls in a single transaction. The store can then be
+        queried with indexed SQL, see `m3u_parser.sqlite_store.SqliteStore`.
+
+        Args:
+            - `store` (Union[str, SqliteStore]): The store, or the path of the database to open it from.
+            - `source` (str, optional): Source to tag the streams with. Defaults to the parsed path or URL.
+
+        Returns:
+            - `SqliteStore`: The store the streams were inserted into.
+
+        Example::
+
+            store = parser.parse_m3u("https://iptv-org.github.io/iptv/countries/np.m3u").to_sqlite("streams.db")
+            news = store.query().filter_by("category", "^News$").sort_by("name").get_list()
+        """
+        store = SqliteStore(store) if isinstance(store, str) else store
+        count = store.insert(self._streams_info, source=self._source if source is None else source)
+        logger.info("Inserted %d streams into %s" % (count, store.path))
+        return store
+
+    def get_stats(self):
+        """
+        Get the performance records of the parser.
+
+        Phases (fetch, split, extract, enrich, validate, liveness, filter, export) are timed cumulatively,
+        along with counters (lines, entries, probes, probe_cache_hits, probe_timeouts, bytes_read) and
+        the probe_latency_seconds histogram. Nothing is recorded unless the parser was created with `stats`.
+
+        Returns:
+            - `Stats`: The records, see `m3u_parser.stats.Stats.to_dict` and `to_prometheus`.
+
+        Example::
+
+            parser = M3uParser(stats=True).parse_m3u("https://iptv-org.github.io/iptv/countries/np.m3u")
+            print(parser.get_stats().to_prometheus())
+        """
+        return self._stats
+
+    def get_source_info(self):
+        """
+        Get the source of the parsed streams information and the fingerprint of its content.
+
+        Returns:
+            - `dict`: The `source` path or URL, the `fingerprint` (SHA-256 of the content) and `saved_at`,
+              the time the snapshot the parser was loaded from was saved (None if not loaded from a snapshot).
+        """
+        return {"source": self._source, "fingerprint": self._source_fingerprint, "saved_at": self._saved_at}
+
+    def save_snapshot(self, path: str):
+        """
+        Save the parsed streams information to a binary snapshot, to be reloaded with `M3uParser.load_snapshot`.
+
+        The snapshot keeps the current and the original streams information, the liveness results with the time
+        of every check, the probe latencies and the fingerprint of the parsed source, so a playlist which took
+        minutes to check can be reloaded in milliseconds. An existing snapshot is replaced atomically.
+
+        Args:
+            - `path` (str): Path of the snapshot file.
+
+        Raises:
+            - `SnapshotException`: Raised if a stream has values which are not JSON serializable.
+
+        Returns:
+            - `str`: The path of the snapshot.
+
+        Example::
+
+            parser.parse_m3u("https://iptv-org.github.io/iptv/countries/np.m3u", check_live=True)
+            parser.save_snapshot("np.snapshot")
+        """
+        current, backup = self._streams_info, self._streams_info_backup
+        if isinstance(current, ColumnarView) and isinstance(backup, ColumnarView) and current.store is backup.store:
+            store, backup_rows, current_rows = current.store, backup.rows, current.rows
+        else:
+            store, backup_rows, current_rows, rows = ColumnarStore(), array("I"), array("I"), {}
+            for stream_info in backup:
+                rows[id(stream_info)] = store.append(stream_info)
+                backup_rows.append(rows[id(stream_info)])
+            for stream_info in current:
+                row = rows.get(id(stream_info))
+                current_rows.append(store.append(stream_info) if row is None else row)
+        latencies = (self._probe_latency.get(url) for url in store.columns["url"].values)
+        meta = {
+            "source": self._source,
+            "fingerprint": self._source_fingerprint,
+            "saved_at": time.time(),
+            "columnar": self._columnar,
+            "enforce_schema": self._enforce_schema,
+            "check_live": self._check_live,
+            "schemes": sorted(self._schemes),
+        }
+        logger.info("Saving snapshot: %s" % path)
+        write_snapshot(path, store, {"backup": backup_rows, "current": current_rows}, meta, {"latency": latencies})
+        return path
+
+    @classmethod
+    def load_snapshot(cls, path: str, verify: bool = True, columnar: bool = None, **kwargs):
+        """
+        Load a parser from a snapshot saved by `M3uParser.save_snapshot`.
+
+        The snapshot is memory mapped and values are only decoded when read, so loading is nearly instant whatever
+        the size of the playlist. Columnar parsers use the mapped columns in place, other parsers build the records.
+
+        Args:
+            - `path` (str): Path of the snapshot file.
+            - `verify` (bool, optional): Whether to check the checksums of the snapshot. Defaults to True.
+            - `columnar` (bool, optional): Whether to store the streams in columns. Defaults to the storage of the saved parser.
+            - `**kwargs`: Other arguments of `M3uParser`, like `useragent` and `timeout`.
+
+        Raises:
+            - `FileNotFoundError`: Raised if the file doesn't exist.
+            - `SnapshotException`: Raised if the file is not a snapshot, is corrupted or was written by a newer version.
+
+        Returns:
+            - `M3uParser`: A parser with the streams information of the snapshot.
+
+        Example::
+
+            parser = M3uParser.load_snapshot("np.snapshot")
+            print(parser.get_source_info())
+        """
+        snapshot = read_snapshot(path, verify)
+        meta = snapshot.meta
+        parser = cls(columnar=meta.get("columnar", False) if columnar is None else columnar, **kwargs)
+        store, row_sets = snapshot.store, {}
+        for name in ("backup", "current"):
+            rows = to_array(snapshot.row_sets.get(name, ()))
+            if rows and max(rows) >= len(store):
+                raise SnapshotException(f"Corrupted snapshot: row {max(rows)} of {name} streams doesn't exist.")
+            row_sets[name] = rows
+        if parser._columnar:
+            parser._streams_info_backup = ColumnarView(store, row_sets["backup"])
+            parser._streams_info = ColumnarView(store, row_sets["current"])
+        else:
+            records = [store.row(row) for row in range(len(store))]
+            parser._streams_info_backup = [records[row] for row in row_sets["backup"]]
+            parser._streams_info = [records[row] for row in row_sets["current"]]
+        urls = store.columns["url"].values
+        for row, latency in enumerate(snapshot.float_columns.get("latency", ())):
+            if latency is not None:
+                parser._probe_latency[urls[row]] = latency
+        parser._source = meta.get("source")
+        parser._source_fingerprint = meta.get("fingerprint")
+        parser._enforce_schema = meta.get("enforce_schema", True)
+        parser._check_live = meta.get("check_live", False)
+        parser._schemes = set(meta.get("schemes", ()))
+        parser._saved_at = meta.get("saved_at")
+        logger.info("Loaded snapshot: %s" % path)
+        return parser
+
+
+def _entry_ids(streams_info):
+    """Yields the identity of every entry: its url, its tvg id and how many entries had the same url and tvg id before."""
+    occurrences = {}
+    for stream_info in streams_info:
+        tvg = stream_info.get("tvg") or {}
+        entry_id = (stream_info.get("url"), tvg.get("id"))
+        occurrence = occurrences.get(entry_id, 0)
+        occurrences[entry_id] = occurrence + 1
+        yield entry_id + (occurrence,)
+
+
+def _source_format(source: str) -> str:
+    """Returns the format of a source from its extension, m3u if it is neither json nor csv."""
+    path = urllib.parse.urlparse(source).path if is_valid_url(source) else source
+    extension = strip_compression(path).rsplit(".", 1)[-1].lower()
+    return extension if extension in ("json", "csv") else "m3u"
+
+
+def _parse_source(options: dict, source: str, format: str, schemes: list, enforce_schema: bool):
+    """Parses a source without checking the liveness of its streams, in a worker process of `parse_many`."""
+    parser = M3uParser(**options)
+    getattr(parser, f"parse_{format}")(source, schemes, check_live=False, enforce_schema=enforce_schema)
+    return list(parser._streams_info)
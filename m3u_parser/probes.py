@@ -0,0 +1,210 @@
+import asyncio
+import base64
+import ipaddress
+import os
+import socket
+import struct
+import time
+from functools import lru_cache
+from urllib.parse import unquote, urlsplit
+
+# default ports of the streaming protocols
+rtsp_port = 554
+rtmp_port = 1935
+# default ports of the schemes whose hosts are connected to before probing their streams, see `endpoint`
+tcp_ports = {"http": 80, "https": 443, "rtsp": rtsp_port, "rtmp": rtmp_port}
+# bytes read from the start of a HTTP stream by the deep probe, and at most from a HLS playlist
+media_head_size = 4096
+playlist_size_limit = 65536
+# HLS playlists followed by the deep probe: a master playlist, then a media playlist
+max_playlist_depth = 2
+# size of the C1/S1 messages of the RTMP handshake
+rtmp_handshake_size = 1536
+
+
+def endpoint(url: str):
+    """Returns the (host, port, tls) endpoint of a stream served over TCP, or None, e.g. for udp streams and files."""
+    parts = urlsplit(url)
+    default_port = tcp_ports.get(parts.scheme.lower())
+    if default_port is None or not parts.hostname:
+        return None
+    return parts.hostname, parts.port or default_port, parts.scheme.lower() == "https"
+
+
+@lru_cache(maxsize=None)
+def _tls_context():
+    import ssl
+
+    return ssl.create_default_context()
+
+
+async def connect(host: str, port: int, tls: bool = False):
+    """
+    Opens then closes a TCP connection, with a TLS handshake if asked, and returns why it failed or None.
+
+    Reasons are `dns` (the host is not resolved), `refused`, `tls` (the handshake or certificate failed)
+    and `unreachable` (any other network error). Timeouts are left to the caller.
+    """
+    import ssl
+
+    try:
+        _, writer = await asyncio.open_connection(
+            host, port, ssl=_tls_context() if tls else None, server_hostname=host if tls else None
+        )
+    except socket.gaierror:
+        return "dns"
+    except ConnectionRefusedError:
+        return "refused"
+    except ssl.SSLError:
+        return "tls"
+    except OSError:
+        return "unreachable"
+    writer.close()
+    return None
+
+
+async def _open(url: str, default_port: int):
+    parts = urlsplit(url)
+    return await asyncio.open_connection(parts.hostname, parts.port or default_port)
+
+
+async def _rtsp_request(reader, writer, method: str, url: str, cseq: int, headers: dict) -> int:
+    """Sends an RTSP request and returns the status code of its response, whose body is read and discarded."""
+    lines = [f"{method} {url} RTSP/1.0", f"CSeq: {cseq}"]
+    lines.extend(f"{name}: {value}" for name, value in headers.items())
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("utf-8"))
+    await writer.drain()
+    head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+    version, status = head[0].split(" ", 2)[:2]
+    if not version.startswith("RTSP/"):
+        raise ValueError(f"Not an RTSP response: {head[0]!r}")
+    for line in head[1:]:
+        name, _, value = line.partition(":")
+        if name.strip().lower() == "content-length":
+            await reader.readexactly(int(value))
+    return int(status)
+
+
+async def probe_rtsp(url: str, headers: dict) -> bool:
+    """
+    Checks an RTSP stream with an `OPTIONS` then a `DESCRIBE` request, live if both are answered with 200.
+
+    Credentials of the URL are sent with basic authentication, servers requiring digest authentication
+    answer 401 and the stream is not live.
+    """
+    parts = urlsplit(url)
+    request_headers = {"User-Agent": headers.get("User-Agent", "m3u-parser")}
+    if parts.username is not None:
+        credentials = f"{unquote(parts.username)}:{unquote(parts.password or '')}"
+        request_headers["Authorization"] = "Basic " + base64.b64encode(credentials.encode("utf-8")).decode("ascii")
+        # the credentials are not part of the request URL
+        url = parts._replace(netloc=parts.netloc.rpartition("@")[2]).geturl()
+    reader, writer = await _open(url, rtsp_port)
+    try:
+        if await _rtsp_request(reader, writer, "OPTIONS", url, 1, request_headers) != 200:
+            return False
+        describe_headers = dict(request_headers, Accept="application/sdp")
+        return await _rtsp_request(reader, writer, "DESCRIBE", url, 2, describe_headers) == 200
+    finally:
+        writer.close()
+
+
+async def probe_rtmp(url: str, headers: dict) -> bool:
+    """Checks an RTMP server with the first half of the handshake, live if it answers C0/C1 with a version 3 S0/S1."""
+    reader, writer = await _open(url, rtmp_port)
+    try:
+        # C1 is the time, four zero bytes and random bytes
+        c1 = struct.pack(">II", int(time.monotonic() * 1000) & 0xFFFFFFFF, 0) + os.urandom(rtmp_handshake_size - 8)
+        writer.write(b"\x03" + c1)
+        await writer.drain()
+        response = await reader.readexactly(1 + rtmp_handshake_size)
+        if response[0] != 3:
+            return False
+        # C2 echoes S1, completing the handshake before closing
+        writer.write(response[1:])
+        await writer.drain()
+        return True
+    finally:
+        writer.close()
+
+
+class _Datagrams(asyncio.DatagramProtocol):
+    def __init__(self, received: asyncio.Future):
+        self.received = received
+
+    def datagram_received(self, data, address):
+        if not self.received.done():
+            self.received.set_result(address)
+
+
+def _datagram_socket(host: str, port: int) -> socket.socket:
+    """Returns a UDP socket bound to the port, member of the group of a multicast host."""
+    address = ipaddress.ip_address(host) if host else None
+    family = socket.AF_INET6 if address is not None and address.version == 6 else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_DGRAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if address is not None and address.is_multicast:
+            # any local address, so that the datagrams sent to the group are received
+            sock.bind(("", port))
+            if family == socket.AF_INET:
+                membership = struct.pack("4s4s", address.packed, socket.inet_aton("0.0.0.0"))
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+            else:
+                membership = struct.pack("16sI", address.packed, 0)
+                sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_JOIN_GROUP, membership)
+        else:
+            sock.bind((host or "", port))
+        sock.setblocking(False)
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
+
+async def probe_udp(url: str, headers: dict) -> bool:
+    """
+    Checks a UDP (or RTP over UDP) stream, live if a datagram is received on its port, e.g. `udp://@239.0.0.1:1234`.
+
+    Multicast groups are joined, other hosts are the local address to listen on.
+    """
+    parts = urlsplit(url)
+    if parts.port is None:
+        raise ValueError(f"No port to listen on: {url}")
+    loop = asyncio.get_running_loop()
+    received = loop.create_future()
+    sock = _datagram_socket(parts.hostname, parts.port)
+    transport, _ = await loop.create_datagram_endpoint(lambda: _Datagrams(received), sock=sock)
+    try:
+        await received
+        return True
+    finally:
+        transport.close()
+
+
+def file_path(url: str) -> str:
+    """Returns the local path of a `file://` URL, or the path itself."""
+    if url.lower().startswith("file://"):
+        from urllib.request import url2pathname
+
+        return url2pathname(urlsplit(url).path)
+    return url
+
+
+async def probe_file(url: str, headers: dict) -> bool:
+    """Checks a local file or `file://` URL, live if it exists."""
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, os.stat, file_path(url))
+    except OSError:
+        return False
+    return True
+
+
+# built-in probes of the schemes other than HTTP, used unless a status checker is given for the scheme
+probes = {
+    "rtsp": probe_rtsp,
+    "rtmp": probe_rtmp,
+    "udp": probe_udp,
+    "rtp": probe_udp,
+    "file": probe_file,
+}
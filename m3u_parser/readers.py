@@ -0,0 +1,161 @@
+import hashlib
+import io
+import json
+from typing import Iterable
+
+from .records import Stream, Tvg, country, intern, language
+
+
+class HashingReader(io.RawIOBase):
+    """Raw binary stream computing the SHA-256 of the bytes read through it, to fingerprint a source while reading."""
+
+    def __init__(self, raw):
+        self._raw = raw
+        self.hash = hashlib.sha256()
+        self.size = 0
+        self.eof = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._raw.read(len(buffer))
+        if not data:
+            self.eof = True
+            return 0
+        buffer[: len(data)] = data
+        self.hash.update(data)
+        self.size += len(data)
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._raw.close()
+        super().close()
+
+
+_decoder = json.JSONDecoder()
+_whitespace = " \t\n\r"
+
+
+def iter_json_array(chunks: Iterable[str]):
+    """
+    Incrementally decodes a JSON document read in chunks, yielding the items of its top level array one at a time.
+
+    Only the item being decoded and the unread part of the current chunk are kept in memory.
+    Documents which are not arrays are decoded and yield nothing.
+
+    Args:
+        - `chunks` (Iterable[str]): Text of the JSON document, in chunks of any size.
+
+    Raises:
+        - `json.JSONDecodeError`: Raised if the document is not valid JSON.
+
+    Example::
+
+        with open("streams.json", encoding="utf-8") as fp:
+            for stream_info in iter_json_array(iter(lambda: fp.read(65536), "")):
+                print(stream_info["url"])
+    """
+    chunks = iter(chunks)
+    buffer, position, eof = "", 0, False
+
+    def fill() -> bool:
+        """Appends the next chunk to the unread part of the buffer, returns False at the end of the document."""
+        nonlocal buffer, position, eof
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+            return False
+        buffer = buffer[position:] + chunk
+        position = 0
+        return True
+
+    def skip_whitespace():
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in _whitespace:
+                position += 1
+            if position < len(buffer) or not fill():
+                return
+
+    skip_whitespace()
+    if position == len(buffer):
+        json.loads(buffer)  # raises the error of an empty document
+    if buffer[position] != "[":
+        while fill():
+            pass
+        json.loads(buffer[position:])
+        return
+    position += 1
+    expect_item = True
+    while True:
+        skip_whitespace()
+        if position == len(buffer):
+            raise json.JSONDecodeError("Unterminated array", buffer, position)
+        if buffer[position] == "]":
+            # trailing content after the array is an error, like in json.loads
+            position += 1
+            skip_whitespace()
+            if position < len(buffer):
+                raise json.JSONDecodeError("Extra data", buffer, position)
+            return
+        if not expect_item:
+            if buffer[position] != ",":
+                raise json.JSONDecodeError("Expecting ',' delimiter", buffer, position)
+            position += 1
+            expect_item = True
+            continue
+        while True:
+            try:
+                item, end = _decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # the item continues in the next chunk
+                if not eof and fill():
+                    continue
+                raise
+            # a number ending with the buffer may continue in the next chunk
+            if end == len(buffer) and not eof and fill():
+                continue
+            break
+        position = end
+        expect_item = False
+        yield item
+
+
+class JsonLoader:
+    """Builds stream records from the stream information objects of a JSON export, as `M3uParser.parse_json` does.
+
+    Every nested object is looked up once, missing fields are read as None and the status is `"BAD"` unless
+    the object says `"GOOD"`.
+    """
+
+    __slots__ = ()
+
+    def __call__(self, stream_info) -> Stream:
+        """Returns the stream record of an object, or None if it is not an object with a url."""
+        return next(self.load([stream_info]), None)
+
+    def load(self, objects: Iterable):
+        """Yields the stream records of the objects which have a url."""
+        empty = {}
+        for stream_info in objects:
+            if type(stream_info) != dict:
+                continue
+            get = stream_info.get
+            url = get("url")
+            if not url:
+                continue
+            tvg, country_info, language_info = get("tvg", empty), get("country", empty), get("language", empty)
+            status = get("status")
+            yield Stream(
+                get("name"),
+                intern(get("logo")),
+                url,
+                intern(get("category")),
+                Tvg(tvg.get("id"), tvg.get("name"), tvg.get("url"), tvg.get("chno")),
+                country(country_info.get("code"), country_info.get("name")),
+                language(language_info.get("code"), language_info.get("name")),
+                status or "BAD",
+                status == "GOOD",
+            )
@@ -0,0 +1,257 @@
+import sys
+from collections.abc import Mapping, MutableMapping
+from functools import lru_cache
+
+_UNSET = object()
+
+
+def intern(value):
+    """Interns repeated string values so that equal values share a single object."""
+    return sys.intern(value) if type(value) is str else value
+
+
+class Record(MutableMapping):
+    """Base class of the compact stream records.
+
+    Every field is stored in a slot, unset slots being fields that are not part of the stream
+    (when the schema is not enforced). Records behave like the dictionaries they replace.
+    """
+
+    __slots__ = ()
+    _fields = ()
+
+    def __init__(self, *values, **fields):
+        for field, value in zip(self._fields, values):
+            if value is not _UNSET:
+                object.__setattr__(self, field, value)
+        for field, value in fields.items():
+            self[field] = value
+
+    def __getitem__(self, key):
+        if key in self._fields:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self._fields:
+            raise KeyError(key)
+        object.__setattr__(self, key, value)
+
+    def __delitem__(self, key):
+        if key not in self._fields:
+            raise KeyError(key)
+        try:
+            object.__delattr__(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self._fields and hasattr(self, key)
+
+    def __iter__(self):
+        return (field for field in self._fields if hasattr(self, field))
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def get(self, key, default=None):
+        if key in self._fields:
+            return getattr(self, key, default)
+        return default
+
+    def to_dict(self) -> dict:
+        data = {}
+        for field in self._fields:
+            value = getattr(self, field, _UNSET)
+            if value is not _UNSET:
+                data[field] = value.to_dict() if isinstance(value, Record) else value
+        return data
+
+
+class FrozenRecord(Record):
+    """Record which cannot be modified, so that a single instance can be shared between streams."""
+
+    __slots__ = ()
+
+    def __setitem__(self, key, value):
+        raise TypeError(f"'{type(self).__name__}' does not support item assignment")
+
+    __delitem__ = __setitem__
+
+    def __hash__(self):
+        return hash(tuple(getattr(self, field, _UNSET) for field in self._fields))
+
+
+class Tvg(Record):
+    __slots__ = _fields = ("id", "name", "url", "chno")
+
+    def __init__(self, id=_UNSET, name=_UNSET, url=_UNSET, chno=_UNSET):
+        if id is not _UNSET:
+            self.id = id
+        if name is not _UNSET:
+            self.name = name
+        if url is not _UNSET:
+            self.url = url
+        if chno is not _UNSET:
+            self.chno = chno
+
+
+class Country(FrozenRecord):
+    __slots__ = _fields = ("code", "name")
+
+
+class Language(FrozenRecord):
+    __slots__ = _fields = ("code", "name")
+
+
+@lru_cache(maxsize=4096)
+def _shared_country(code, name) -> Country:
+    return Country(intern(code), intern(name))
+
+
+@lru_cache(maxsize=4096)
+def _shared_language(code, name) -> Language:
+    return Language(intern(code), intern(name))
+
+
+def country(code, name) -> Country:
+    """Returns a country record, shared between all streams with the same country."""
+    try:
+        return _shared_country(code, name)
+    except TypeError:
+        return Country(code, name)
+
+
+def language(code, name) -> Language:
+    """Returns a language record, shared between all streams with the same language."""
+    try:
+        return _shared_language(code, name)
+    except TypeError:
+        return Language(code, name)
+
+
+class Stream(Record):
+    """Compact record of a stream information.
+
+    Keys other than the schema fields, like the source of the stream, are kept in a dictionary
+    which is only allocated when needed. Hidden fields, like the time of the last liveness check
+    or the raw lines of the entry in the source playlist, are not part of the stream information dictionary.
+    """
+
+    _fields = ("name", "logo", "url", "category", "tvg", "country", "language", "status", "live")
+    _hidden = ("_extra", "_checked_at", "_raw")
+    __slots__ = _fields + _hidden
+
+    def __init__(
+        self,
+        name=_UNSET,
+        logo=_UNSET,
+        url=_UNSET,
+        category=_UNSET,
+        tvg=_UNSET,
+        country=_UNSET,
+        language=_UNSET,
+        status=_UNSET,
+        live=_UNSET,
+    ):
+        # assigned one by one, as unset fields must stay unset slots
+        if name is not _UNSET:
+            self.name = name
+        if logo is not _UNSET:
+            self.logo = logo
+        if url is not _UNSET:
+            self.url = url
+        if category is not _UNSET:
+            self.category = category
+        if tvg is not _UNSET:
+            self.tvg = tvg
+        if country is not _UNSET:
+            self.country = country
+        if language is not _UNSET:
+            self.language = language
+        if status is not _UNSET:
+            self.status = status
+        if live is not _UNSET:
+            self.live = live
+
+    def __getitem__(self, key):
+        try:
+            return Record.__getitem__(self, key)
+        except KeyError:
+            extra = getattr(self, "_extra", None)
+            if extra is None:
+                raise
+            return extra[key]
+
+    def __setitem__(self, key, value):
+        if key in self._fields:
+            object.__setattr__(self, key, value)
+            return
+        extra = getattr(self, "_extra", None)
+        if extra is None:
+            extra = {}
+            object.__setattr__(self, "_extra", extra)
+        extra[key] = value
+
+    def __delitem__(self, key):
+        if key in self._fields:
+            Record.__delitem__(self, key)
+        else:
+            extra = getattr(self, "_extra", None)
+            if extra is None:
+                raise KeyError(key)
+            del extra[key]
+
+    def __contains__(self, key):
+        if key in self._fields:
+            return hasattr(self, key)
+        extra = getattr(self, "_extra", None)
+        return extra is not None and key in extra
+
+    def __iter__(self):
+        yield from Record.__iter__(self)
+        extra = getattr(self, "_extra", None)
+        if extra:
+            yield from extra
+
+    def get(self, key, default=None):
+        if key in self._fields:
+            return getattr(self, key, default)
+        extra = getattr(self, "_extra", None)
+        return extra.get(key, default) if extra else default
+
+    def to_dict(self) -> dict:
+        data = Record.to_dict(self)
+        extra = getattr(self, "_extra", None)
+        if extra:
+            data.update(extra)
+        return data
+
+
+def to_record(stream_info: Mapping) -> Stream:
+    """Converts a stream information dictionary into a record."""
+    if isinstance(stream_info, Stream):
+        return stream_info
+    stream = Stream()
+    for key, value in stream_info.items():
+        if key == "tvg" and isinstance(value, Mapping) and set(value) <= set(Tvg._fields):
+            value = Tvg(**value)
+        elif key == "country" and isinstance(value, Mapping) and set(value) == {"code", "name"}:
+            value = country(value["code"], value["name"])
+        elif key == "language" and isinstance(value, Mapping) and set(value) == {"code", "name"}:
+            value = language(value["code"], value["name"])
+        elif key in ("logo", "category"):
+            value = intern(value)
+        stream[key] = value
+    return stream
+
+
+def to_dict(stream_info: Mapping) -> dict:
+    """Converts a record into the stream information dictionary shape."""
+    return stream_info.to_dict() if isinstance(stream_info, Record) else stream_info
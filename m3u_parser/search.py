@@ -0,0 +1,142 @@
+import heapq
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+
+_token_re = re.compile(r"\w+")
+
+# default fields to index as (key, nested key, weight)
+default_search_fields = (("name", "", 1.0), ("tvg", "name", 0.8), ("category", "", 0.5))
+
+
+def normalize(text: str) -> str:
+    """Lowercases the text and strips accents so that "Télé" matches "tele"."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+def tokenize(text) -> list:
+    return _token_re.findall(normalize(str(text))) if text else []
+
+
+def trigrams(token: str) -> set:
+    return {token[index : index + 3] for index in range(len(token) - 2)}
+
+
+def edit_distance(first: str, second: str, max_distance: int) -> int:
+    """Levenshtein distance between two strings, or `max_distance + 1` once it is known to be larger."""
+    if abs(len(first) - len(second)) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(second) + 1))
+    for row, first_char in enumerate(first, 1):
+        current = [row]
+        for column, second_char in enumerate(second, 1):
+            current.append(
+                min(previous[column] + 1, current[column - 1] + 1, previous[column - 1] + (first_char != second_char))
+            )
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+class SearchIndex:
+    """Inverted token index plus trigram index over the names of streams.
+
+    Documents are identified by their position in the indexed list. Queries support exact, prefix,
+    substring and typo-tolerant token matches; every query token has to match for a document to be returned.
+
+    Example::
+
+        index = SearchIndex(parser.get_list())
+        index.search("bbc new", limit=5)
+        # [(12, 1.8), (40, 1.3)]
+    """
+
+    _exact_score = 1.0
+    _prefix_score = 0.8
+    _substring_score = 0.6
+    _fuzzy_score = 0.5
+
+    def __init__(self, streams_info: list, fields=default_search_fields):
+        self._fields = fields
+        self._token_ids = {}
+        self._tokens = []
+        self._postings = []
+        self._trigrams = defaultdict(set)
+        for doc, stream_info in enumerate(streams_info):
+            self._add(doc, stream_info)
+        self._sorted_tokens = sorted(self._token_ids)
+
+    def _add(self, doc: int, stream_info: dict):
+        for key_0, key_1, weight in self._fields:
+            value = stream_info.get(key_0)
+            if key_1:
+                value = value.get(key_1) if value else None
+            for token in tokenize(value):
+                token_id = self._token_ids.get(token)
+                if token_id is None:
+                    token_id = self._token_ids[token] = len(self._tokens)
+                    self._tokens.append(token)
+                    self._postings.append({})
+                    for trigram in trigrams(token):
+                        self._trigrams[trigram].add(token_id)
+                postings = self._postings[token_id]
+                if postings.get(doc, 0) < weight:
+                    postings[doc] = weight
+
+    def _matching_tokens(self, query_token: str, fuzzy: bool) -> dict:
+        """Returns the indexed token ids matching a query token along with the match score."""
+        matches = {}
+        # Prefix matches, which include the exact match
+        position = bisect_left(self._sorted_tokens, query_token)
+        while position < len(self._sorted_tokens) and self._sorted_tokens[position].startswith(query_token):
+            token = self._sorted_tokens[position]
+            matches[self._token_ids[token]] = self._exact_score if token == query_token else self._prefix_score
+            position += 1
+        query_trigrams = trigrams(query_token)
+        if not query_trigrams:
+            return matches
+        # Substring matches have every trigram of the query token
+        candidates = set.intersection(*(self._trigrams.get(trigram, set()) for trigram in query_trigrams))
+        for token_id in candidates:
+            if token_id not in matches and query_token in self._tokens[token_id]:
+                matches[token_id] = self._substring_score
+        if fuzzy:
+            max_distance = 1 if len(query_token) <= 5 else 2
+            # every edit destroys at most three trigrams of the query token
+            min_shared = len(query_trigrams) - 3 * max_distance
+            shared = defaultdict(int)
+            for trigram in query_trigrams:
+                for token_id in self._trigrams.get(trigram, ()):
+                    shared[token_id] += 1
+            for token_id, count in shared.items():
+                if token_id in matches or count < min_shared:
+                    continue
+                distance = edit_distance(query_token, self._tokens[token_id], max_distance)
+                if distance <= max_distance:
+                    matches[token_id] = self._fuzzy_score / distance
+        return matches
+
+    def search(self, query: str, limit: int = 10, fuzzy: bool = True, docs=None) -> list:
+        """Returns up to `limit` `(doc, score)` pairs ranked by score, optionally restricted to the given docs."""
+        scores = None
+        for query_token in tokenize(query):
+            token_scores = {}
+            for token_id, match_score in self._matching_tokens(query_token, fuzzy).items():
+                for doc, weight in self._postings[token_id].items():
+                    score = match_score * weight
+                    if token_scores.get(doc, 0) < score:
+                        token_scores[doc] = score
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {doc: score + token_scores[doc] for doc, score in scores.items() if doc in token_scores}
+            if not scores:
+                return []
+        if not scores:
+            return []
+        if docs is not None:
+            scores = {doc: score for doc, score in scores.items() if doc in docs}
+        return heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
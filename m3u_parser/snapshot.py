@@ -0,0 +1,366 @@
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from collections.abc import Mapping, Sequence
+
+from .columnar import ColumnarStore, DictionaryColumn, PlainColumn
+from .exceptions import SnapshotException
+from .records import _UNSET, Record, Stream, Tvg, country, language
+
+# File layout, every integer being little endian:
+#
+#   header          magic, format version, minimum reader version, flags, section count, crc32 of header and table
+#   section table   (tag, offset, length, crc32) of every section
+#   sections        aligned to 8 bytes, the first one being the JSON metadata describing all the others
+#
+# Sections are value tables (VTAB), uint32 codes and row numbers (CODE, ROWS) and float64 columns (FLT8).
+# Readers refuse snapshots whose minimum reader version is newer than theirs and ignore unknown metadata keys,
+# so that later versions can add columns and sections without breaking older readers.
+
+magic = b"M3US"
+format_version = 1
+min_reader_version = 1
+
+_header = struct.Struct("<4sHHIII")
+_section = struct.Struct("<4sQQI")
+_value_table_header = struct.Struct("<QI")
+_alignment = 8
+
+# kinds of the values stored in value tables
+KIND_UNSET, KIND_NONE, KIND_FALSE, KIND_TRUE, KIND_STR, KIND_JSON, KIND_MAPPING = range(7)
+_constants = {KIND_UNSET: _UNSET, KIND_NONE: None, KIND_FALSE: False, KIND_TRUE: True}
+
+# hidden fields stored as float64 columns, NaN standing for None
+float_fields = ("_checked_at",)
+
+_little_endian = sys.byteorder == "little"
+
+
+def _padding(size: int) -> bytes:
+    return bytes(-size % _alignment)
+
+
+def _to_bytes(values: array) -> bytes:
+    if not _little_endian:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _cast(buffer: memoryview, typecode: str):
+    """Returns the buffer as a sequence of numbers, without copying it on little endian machines."""
+    if _little_endian:
+        return buffer.cast(typecode)
+    values = array(typecode, bytes(buffer))
+    values.byteswap()
+    return values
+
+
+def to_array(values, typecode: str = "I") -> array:
+    """Copies numbers returned by `_cast` into a writable array."""
+    if isinstance(values, memoryview):
+        copy = array(typecode)
+        copy.frombytes(values.cast("B"))
+        return copy
+    return array(typecode, values)
+
+
+def _encode_value(value):
+    if value is _UNSET:
+        return KIND_UNSET, b""
+    if value is None:
+        return KIND_NONE, b""
+    if value is False:
+        return KIND_FALSE, b""
+    if value is True:
+        return KIND_TRUE, b""
+    if value.__class__ is str:
+        return KIND_STR, value.encode("utf-8", "surrogatepass")
+    try:
+        if isinstance(value, Mapping):
+            return KIND_MAPPING, json.dumps(value.to_dict() if isinstance(value, Record) else dict(value)).encode()
+        return KIND_JSON, json.dumps(value).encode()
+    except (TypeError, ValueError):
+        raise SnapshotException(f"Cannot save {value!r} in a snapshot, values must be JSON serializable.")
+
+
+def value_table(values) -> bytes:
+    """Encodes values as their kinds, the offsets of their encoded bytes and the bytes themselves."""
+    kinds = bytearray()
+    parts = []
+    ends = []
+    size = 0
+    for value in values:
+        kind, data = _encode_value(value)
+        kinds.append(kind)
+        parts.append(data)
+        size += len(data)
+        ends.append(size)
+    offsets = array("I" if size < 1 << 32 else "Q", [0])
+    offsets.extend(ends)
+    head = _value_table_header.pack(len(kinds), offsets.itemsize)
+    return b"".join([head, kinds, _padding(len(head) + len(kinds)), _to_bytes(offsets), *parts])
+
+
+def _mapping_factory(field: str):
+    """Returns the function rebuilding the records of the nested mappings of a field."""
+    if field == "tvg":
+        return lambda value: Tvg(**value) if set(value) <= set(Tvg._fields) else value
+    if field in ("country", "language"):
+        shared = country if field == "country" else language
+        return lambda value: shared(value["code"], value["name"]) if set(value) == {"code", "name"} else value
+    return lambda value: value
+
+
+class LazyValues(Sequence):
+    """Value table of a snapshot, decoding values from the mapped file only when they are read."""
+
+    __slots__ = ("_kinds", "_offsets", "_blob", "_mapping")
+
+    def __init__(self, buffer: memoryview, field: str = ""):
+        count, itemsize = _value_table_header.unpack_from(buffer, 0)
+        start = _value_table_header.size + count
+        start += -start % _alignment
+        end = start + (count + 1) * itemsize
+        if itemsize not in (4, 8) or end > len(buffer):
+            raise SnapshotException("Corrupted value table.")
+        self._kinds = buffer[_value_table_header.size : _value_table_header.size + count]
+        self._offsets = _cast(buffer[start:end], "I" if itemsize == 4 else "Q")
+        self._blob = buffer[end:]
+        if self._offsets[0] != 0 or self._offsets[-1] != len(self._blob):
+            raise SnapshotException("Corrupted value table.")
+        self._mapping = _mapping_factory(field)
+
+    def __len__(self):
+        return len(self._kinds)
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += len(self._kinds)
+        kind = self._kinds[index]
+        if kind in _constants:
+            return _constants[kind]
+        data = self._blob[self._offsets[index] : self._offsets[index + 1]]
+        if kind == KIND_STR:
+            return str(data, "utf-8", "surrogatepass")
+        if kind == KIND_JSON:
+            return json.loads(bytes(data))
+        if kind == KIND_MAPPING:
+            return self._mapping(json.loads(bytes(data)))
+        raise SnapshotException(f"Unknown value kind {kind}.")
+
+
+class FloatValues(Sequence):
+    """Float64 column of a snapshot, NaN being read as None."""
+
+    __slots__ = ("_values",)
+
+    def __init__(self, values):
+        self._values = values
+
+    def __len__(self):
+        return len(self._values)
+
+    def __getitem__(self, index: int):
+        value = self._values[index]
+        return None if value != value else value
+
+
+class Snapshot:
+    """Contents of a snapshot: the columnar store of the streams, named row sets, extra float columns and metadata."""
+
+    __slots__ = ("store", "row_sets", "float_columns", "meta")
+
+    def __init__(self, store: ColumnarStore, row_sets: dict, float_columns: dict, meta: dict):
+        self.store = store
+        self.row_sets = row_sets
+        self.float_columns = float_columns
+        self.meta = meta
+
+
+def _floats(values) -> bytes:
+    return _to_bytes(array("d", (math.nan if value is None else value for value in values)))
+
+
+def write_snapshot(path, store: ColumnarStore, row_sets: dict, meta: dict, float_columns: dict = None):
+    """
+    Writes a columnar store to a snapshot file.
+
+    The file is written next to the destination and then renamed, so an existing snapshot is replaced atomically.
+
+    Args:
+        - `path` (str): Path of the snapshot file.
+        - `store` (ColumnarStore): Store of the streams information.
+        - `row_sets` (dict): Named lists of row numbers of the store, like the current and the original streams.
+        - `meta` (dict): JSON serializable metadata.
+        - `float_columns` (dict, optional): Named per row float columns, None being allowed. Defaults to None.
+
+    Raises:
+        - `SnapshotException`: Raised if a value is not JSON serializable.
+    """
+    sections = []
+
+    def add(tag: bytes, data: bytes) -> int:
+        sections.append((tag, data))
+        return len(sections)
+
+    columns = []
+    for field, column in store.columns.items():
+        if isinstance(column, DictionaryColumn):
+            values = add(b"VTAB", value_table(column.values))
+            codes = column.codes if isinstance(column.codes, array) else array("I", column.codes)
+            codes = add(b"CODE", _to_bytes(codes))
+            columns.append({"field": field, "type": "dictionary", "values": values, "codes": codes})
+        elif field in float_fields:
+            columns.append({"field": field, "type": "float", "values": add(b"FLT8", _floats(column.values))})
+        else:
+            columns.append({"field": field, "type": "plain", "values": add(b"VTAB", value_table(column.values))})
+    meta = dict(
+        meta,
+        row_count=len(store),
+        columns=columns,
+        row_sets={name: add(b"ROWS", _to_bytes(array("I", rows))) for name, rows in row_sets.items()},
+        float_columns={name: add(b"FLT8", _floats(values)) for name, values in (float_columns or {}).items()},
+    )
+    try:
+        sections.insert(0, (b"META", json.dumps(meta).encode()))
+    except (TypeError, ValueError):
+        raise SnapshotException("Cannot save the metadata in a snapshot, values must be JSON serializable.")
+
+    table = bytearray()
+    offset = _header.size + len(_padding(_header.size)) + len(sections) * _section.size
+    for tag, data in sections:
+        offset += len(_padding(offset))
+        table += _section.pack(tag, offset, len(data), zlib.crc32(data))
+        offset += len(data)
+    header = _header.pack(magic, format_version, min_reader_version, 0, len(sections), 0)
+    header = _header.pack(
+        magic, format_version, min_reader_version, 0, len(sections), zlib.crc32(table, zlib.crc32(header))
+    )
+
+    temp_path = f"{os.fspath(path)}.tmp"
+    try:
+        with open(temp_path, "wb") as fp:
+            fp.write(header + _padding(len(header)) + table)
+            position = len(header) + len(_padding(len(header))) + len(table)
+            for _, data in sections:
+                fp.write(_padding(position))
+                position += len(_padding(position))
+                fp.write(data)
+                position += len(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        # a failed write, e.g. a full disk, leaves neither a partial snapshot nor its temporary file
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _read(buffer: memoryview, verify: bool) -> Snapshot:
+    if len(buffer) < _header.size:
+        raise SnapshotException("Truncated snapshot.")
+    file_magic, version, min_version, _, count, table_crc = _header.unpack_from(buffer, 0)
+    if file_magic != magic:
+        raise SnapshotException("Not a snapshot file.")
+    if min_version > format_version:
+        raise SnapshotException(
+            f"Snapshot format version {version} needs a reader of version {min_version}, "
+            f"this one reads version {format_version}."
+        )
+    table_start = _header.size + len(_padding(_header.size))
+    table_end = table_start + count * _section.size
+    if table_end > len(buffer):
+        raise SnapshotException("Truncated snapshot.")
+    header = _header.pack(file_magic, version, min_version, 0, count, 0)
+    if zlib.crc32(buffer[table_start:table_end], zlib.crc32(header)) != table_crc:
+        raise SnapshotException("Corrupted snapshot header.")
+
+    sections = []
+    for position in range(table_start, table_end, _section.size):
+        tag, offset, length, crc = _section.unpack_from(buffer, position)
+        if offset + length > len(buffer):
+            raise SnapshotException("Truncated snapshot.")
+        data = buffer[offset : offset + length]
+        if verify and zlib.crc32(data) != crc:
+            raise SnapshotException(f"Corrupted snapshot section {tag!r}.")
+        sections.append((tag, data))
+
+    def section(index, tag: bytes) -> memoryview:
+        section_tag, data = sections[index]
+        if section_tag != tag:
+            raise SnapshotException(f"Expected a section {tag!r}, found {section_tag!r}.")
+        return data
+
+    meta = json.loads(bytes(section(0, b"META")))
+    row_count = meta["row_count"]
+    columns = {}
+    for description in meta["columns"]:
+        field, column_type = description["field"], description["type"]
+        if column_type == "dictionary":
+            values = list(LazyValues(section(description["values"], b"VTAB"), field))
+            column = DictionaryColumn(values, _cast(section(description["codes"], b"CODE"), "I"))
+        elif column_type == "float":
+            column = PlainColumn(FloatValues(_cast(section(description["values"], b"FLT8"), "d")))
+        elif column_type == "plain":
+            column = PlainColumn(LazyValues(section(description["values"], b"VTAB"), field))
+        else:
+            # written by a newer version
+            continue
+        if len(column) != row_count:
+            raise SnapshotException(f"Column {field} has {len(column)} rows instead of {row_count}.")
+        columns[field] = column
+    store = ColumnarStore()
+    for field, column in store.columns.items():
+        if field in columns:
+            store.columns[field] = columns[field]
+        elif isinstance(column, DictionaryColumn):
+            # fields added after the snapshot was written
+            store.columns[field] = DictionaryColumn([_UNSET], array("I", bytes(4 * row_count)))
+        else:
+            store.columns[field] = PlainColumn([None if field in Stream._hidden else _UNSET] * row_count)
+    store._column_items = tuple(store.columns.items())
+
+    row_sets = {name: _cast(section(index, b"ROWS"), "I") for name, index in meta["row_sets"].items()}
+    float_columns = {
+        name: FloatValues(_cast(section(index, b"FLT8"), "d")) for name, index in meta["float_columns"].items()
+    }
+    return Snapshot(store, row_sets, float_columns, meta)
+
+
+def read_snapshot(path, verify: bool = True) -> Snapshot:
+    """
+    Reads a snapshot file written by `write_snapshot`.
+
+    The file is memory mapped: codes, row numbers and float columns are used in place and the other values are
+    only decoded when read, so loading takes about the same time whatever the number of streams.
+
+    Args:
+        - `path` (str): Path of the snapshot file.
+        - `verify` (bool, optional): Whether to check the checksums of all the sections. Without it, corrupted values
+          can raise errors when they are read instead of when the snapshot is loaded. Defaults to True.
+
+    Raises:
+        - `FileNotFoundError`: Raised if the file doesn't exist.
+        - `SnapshotException`: Raised if the file is not a snapshot, is corrupted or needs a newer reader.
+
+    Returns:
+        - `Snapshot`: The store, row sets, float columns and metadata of the snapshot.
+    """
+    with open(path, "rb") as fp:
+        try:
+            mapped = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise SnapshotException("Empty snapshot file.")
+    try:
+        return _read(memoryview(mapped), verify)
+    except SnapshotException:
+        raise
+    except (struct.error, ValueError, TypeError, KeyError, IndexError, OverflowError, AttributeError) as error:
+        raise SnapshotException(f"Corrupted snapshot: {error}") from error
@@ -0,0 +1,320 @@
+import hashlib
+import heapq
+import itertools
+import os
+import pickle
+import sys
+import tempfile
+import weakref
+from array import array
+from collections.abc import Sequence
+from math import ceil
+from typing import Callable, Iterable
+
+# most runs merged at once by the external sort, bounding the batches held in memory while merging
+merge_fan_in = 16
+# estimated bytes of a record besides its strings: the record, its tvg record and their slots
+record_overhead = 320
+# estimated bytes of an entry of the deduplication hash partitions: its digest and its set slot
+partition_entry_size = 100
+
+
+def record_size(stream_info) -> int:
+    """Estimates the memory used by a stream record, counting its own strings but not the shared country/language."""
+    size = record_overhead
+    for key in ("name", "logo", "url", "category"):
+        value = stream_info.get(key)
+        if value.__class__ is str:
+            size += sys.getsizeof(value)
+    raw = getattr(stream_info, "_raw", None)
+    if raw is not None:
+        size += sys.getsizeof(raw[0])
+    return size
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class Segment:
+    """Temporary file holding pickled batches of rows and records, removed once no store references it."""
+
+    __slots__ = ("path", "batches", "count", "__weakref__")
+
+    def __init__(self, directory: str = None):
+        descriptor, self.path = tempfile.mkstemp(prefix="m3u_parser-", suffix=".spill", dir=directory)
+        os.close(descriptor)
+        weakref.finalize(self, _remove, self.path)
+        # (offset, count) of every batch
+        self.batches = []
+        self.count = 0
+
+    def write(self, batches: Iterable):
+        with open(self.path, "ab") as fp:
+            for rows, records in batches:
+                self.batches.append((fp.tell(), len(records)))
+                self.count += len(records)
+                pickle.dump((rows, records), fp, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def read(self):
+        """Yields the (rows, records) batches of the segment."""
+        with open(self.path, "rb") as fp:
+            for _ in self.batches:
+                yield pickle.load(fp)
+
+    def read_batch(self, batch: int):
+        with open(self.path, "rb") as fp:
+            fp.seek(self.batches[batch][0])
+            return pickle.load(fp)
+
+
+class SpilledStreams(Sequence):
+    """Ordered streams records used by the parser in place of a list when a memory limit is set.
+
+    Records are kept in memory until their estimated size passes the limit, then written to a temporary segment
+    file in batches, so the records held in memory stay under the limit whatever the number of streams.
+    Iterating reads the segments back one batch at a time. Filtering, sorting (an external merge sort) and
+    deduplication (hash partitioned) stream over the segments into new stores. Copies share the segments,
+    which are immutable and removed once no store references them.
+
+    Args:
+        - `memory_limit` (int): Bytes of records held in memory before they are spilled to disk.
+        - `directory` (str, optional): Directory of the segment files. Defaults to the temporary directory.
+    """
+
+    def __init__(self, memory_limit: int, directory: str = None, rows=None):
+        self.memory_limit = max(1, memory_limit)
+        self.directory = directory
+        # row numbers identify the records across copies, filters and sorts, like the rows of a columnar view
+        self._rows = itertools.count() if rows is None else rows
+        self._segments = []
+        self._count = 0
+        self._tail_rows = array("Q")
+        self._tail = []
+        self._tail_size = 0
+
+    def _derive(self):
+        """Returns a new empty store with the same options, numbering its new records after these."""
+        return SpilledStreams(self.memory_limit, self.directory, self._rows)
+
+    @property
+    def batch_size(self) -> int:
+        """Estimated bytes of a batch on disk, a batch of every run being held in memory while merging."""
+        return max(1, self.memory_limit // (2 * merge_fan_in))
+
+    def __len__(self):
+        return self._count + len(self._tail)
+
+    def _add(self, row: int, stream_info):
+        self._tail_rows.append(row)
+        self._tail.append(stream_info)
+        self._tail_size += record_size(stream_info)
+        if self._tail_size > self.memory_limit:
+            self.spill()
+
+    def spill(self):
+        """Writes the records held in memory to a new segment."""
+        if not self._tail:
+            return
+        segment = Segment(self.directory)
+        segment.write(self._tail_batches())
+        self._segments.append(segment)
+        self._count += segment.count
+        self._tail_rows, self._tail, self._tail_size = array("Q"), [], 0
+
+    def _tail_batches(self):
+        start, size, limit = 0, 0, self.batch_size
+        for position, stream_info in enumerate(self._tail):
+            size += record_size(stream_info)
+            if size >= limit:
+                yield self._tail_rows[start : position + 1], self._tail[start : position + 1]
+                start, size = position + 1, 0
+        if start < len(self._tail):
+            yield self._tail_rows[start:], self._tail[start:]
+
+    def batches(self):
+        """Yields the (rows, records) batches of the store, in order."""
+        for segment in self._segments:
+            yield from segment.read()
+        if self._tail:
+            yield self._tail_rows, self._tail
+
+    def _items(self):
+        for rows, records in self.batches():
+            yield from zip(rows, records)
+
+    def __iter__(self):
+        for _, records in self.batches():
+            yield from records
+
+    @property
+    def rows(self):
+        for rows, _ in self.batches():
+            yield from rows
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.take(range(*index.indices(len(self))))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("index out of range")
+        for segment in self._segments:
+            if index < segment.count:
+                for batch, (_, count) in enumerate(segment.batches):
+                    if index < count:
+                        return segment.read_batch(batch)[1][index]
+                    index -= count
+            index -= segment.count
+        return self._tail[index]
+
+    def append(self, stream_info):
+        self._add(next(self._rows), stream_info)
+
+    def extend(self, streams_info):
+        for stream_info in streams_info:
+            self._add(next(self._rows), stream_info)
+
+    def clear(self):
+        self._segments, self._count = [], 0
+        self._tail_rows, self._tail, self._tail_size = array("Q"), [], 0
+
+    def copy(self):
+        copy = self._derive()
+        copy._segments, copy._count = list(self._segments), self._count
+        copy._tail_rows, copy._tail, copy._tail_size = array("Q", self._tail_rows), list(self._tail), self._tail_size
+        return copy
+
+    def take(self, indices):
+        """Returns a store of the records at the given positions of this store."""
+        indices = list(indices)
+        taken = self._derive()
+        if all(previous < index for previous, index in zip(indices, indices[1:])):
+            wanted = iter(indices)
+            position = next(wanted, None)
+            for index, (row, stream_info) in enumerate(self._items()):
+                if position is None:
+                    break
+                if index == position:
+                    taken._add(row, stream_info)
+                    position = next(wanted, None)
+            return taken
+        # positions in any order are gathered first, e.g. a few streams sampled or searched
+        wanted = set(indices)
+        items = {index: item for index, item in enumerate(self._items()) if index in wanted}
+        for index in indices:
+            taken._add(*items[index])
+        return taken
+
+    def filter(self, predicate: Callable):
+        """Returns a store of the records for which the predicate is true, in the same order."""
+        filtered = self._derive()
+        for row, stream_info in self._items():
+            if predicate(stream_info):
+                filtered._add(row, stream_info)
+        return filtered
+
+    def sorted(self, key: Callable, reverse: bool = False):
+        """
+        Returns a store of the records sorted by the key, with an external merge sort if they don't fit in memory.
+
+        Sorted runs of records fitting in the memory limit are spilled, then merged `merge_fan_in` at a time.
+        Like `list.sort`, the sort is stable.
+        """
+        item_key = lambda item: key(item[1])
+        runs, chunk, size = [], [], 0
+        for item in self._items():
+            chunk.append(item)
+            size += record_size(item[1])
+            if size > self.memory_limit:
+                runs.append(self._sorted_run(chunk, item_key, reverse))
+                chunk, size = [], 0
+        if not runs:
+            chunk.sort(key=item_key, reverse=reverse)
+            result = self._derive()
+            for item in chunk:
+                result._add(*item)
+            return result
+        if chunk:
+            runs.append(self._sorted_run(chunk, item_key, reverse))
+        while len(runs) > 1:
+            # runs are merged in order, which keeps the merge stable
+            merged = []
+            for start in range(0, len(runs), merge_fan_in):
+                group = runs[start : start + merge_fan_in]
+                merged_run = self._derive()
+                for item in heapq.merge(*(run._items() for run in group), key=item_key, reverse=reverse):
+                    merged_run._add(*item)
+                merged.append(merged_run)
+            runs = merged
+        return runs[0]
+
+    def _sorted_run(self, chunk: list, item_key: Callable, reverse: bool):
+        chunk.sort(key=item_key, reverse=reverse)
+        run = self._derive()
+        for item in chunk:
+            run._add(*item)
+        run.spill()
+        return run
+
+    def distinct(self, key: Callable):
+        """
+        Returns a store of the first record of every key, in the same order.
+
+        Digests of the keys are written to hash partitions small enough to be deduplicated in memory one at a time,
+        marking the positions of the first records in a bitmap, then the records are filtered with the bitmap.
+        """
+        count = len(self)
+        bitmap = bytearray((count + 7) // 8)
+        partitions = max(1, ceil(count * partition_entry_size / max(1, self.memory_limit // 2)))
+        if partitions == 1:
+            seen = set()
+            for position, stream_info in enumerate(self):
+                unique_key = key(stream_info)
+                if unique_key not in seen:
+                    seen.add(unique_key)
+                    bitmap[position >> 3] |= 1 << (position & 7)
+        else:
+            self._mark_partitioned(key, bitmap, partitions)
+        distinct = self._derive()
+        for position, (row, stream_info) in enumerate(self._items()):
+            if bitmap[position >> 3] & (1 << (position & 7)):
+                distinct._add(row, stream_info)
+        return distinct
+
+    def _mark_partitioned(self, key: Callable, bitmap: bytearray, partitions: int):
+        # every partition entry is the 8 bytes position and the 16 bytes digest of a record
+        entry_size = 24
+        flush_size = max(entry_size, self.memory_limit // (4 * partitions))
+        segments = [Segment(self.directory) for _ in range(partitions)]
+        buffers = [bytearray() for _ in range(partitions)]
+
+        def flush(partition):
+            with open(segments[partition].path, "ab") as fp:
+                fp.write(buffers[partition])
+            buffers[partition].clear()
+
+        for position, stream_info in enumerate(self):
+            digest = hashlib.blake2b(repr(key(stream_info)).encode("utf-8", "surrogatepass"), digest_size=16).digest()
+            partition = int.from_bytes(digest[:8], "little") % partitions
+            buffer = buffers[partition]
+            buffer += position.to_bytes(8, "little")
+            buffer += digest
+            if len(buffer) >= flush_size:
+                flush(partition)
+        for partition in range(partitions):
+            flush(partition)
+            seen = set()
+            with open(segments[partition].path, "rb") as fp:
+                # positions were written in increasing order, so the first of every digest is the first record
+                for entry in iter(lambda: fp.read(entry_size * 4096), b""):
+                    for start in range(0, len(entry), entry_size):
+                        digest = entry[start + 8 : start + entry_size]
+                        if digest not in seen:
+                            seen.add(digest)
+                            position = int.from_bytes(entry[start : start + 8], "little")
+                            bitmap[position >> 3] |= 1 << (position & 7)
+            _remove(segments[partition].path)
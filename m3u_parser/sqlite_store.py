@@ -0,0 +1,356 @@
+import json
+import re
+import sqlite3
+from functools import lru_cache
+from itertools import islice
+from typing import Iterable, Union
+
+from .csv_plan import column_name, schema_paths
+from .exceptions import KeyNotFoundException, NestedKeyException
+from .helper import locale_key, natural_key
+
+# schema columns followed by the source of the streams, the time of their last liveness check and other keys as JSON
+columns = tuple(column_name(key_0, key_1) for key_0, key_1 in schema_paths) + ("source", "checked_at", "extra")
+# text affinity lets LIKE prefixes use the NOCASE indexes, channel numbers keep their type
+column_types = dict.fromkeys(columns, "TEXT")
+column_types.update(tvg_chno="", live="INTEGER", checked_at="REAL")
+schema_keys = {key_0 for key_0, _ in schema_paths}
+indexed_columns = ("name", "url", "category", "tvg_id", "country_code", "language_code", "status", "source")
+
+_regex_meta = re.compile(r"[.^$*+?{}\[\]\\|()]")
+
+
+@lru_cache(maxsize=256)
+def _compile(pattern: str):
+    return re.compile(pattern, flags=re.IGNORECASE)
+
+
+def _regexp(pattern: str, value) -> bool:
+    return value is not None and _compile(pattern).search(str(value)) is not None
+
+
+def _comparator(key):
+    def compare(left: str, right: str) -> int:
+        left, right = key(left), key(right)
+        return (left > right) - (left < right)
+
+    return compare
+
+
+def _row(stream_info, source) -> tuple:
+    get = stream_info.get
+    tvg, country, language = get("tvg") or {}, get("country") or {}, get("language") or {}
+    live = get("live")
+    extra = {key: stream_info[key] for key in stream_info if key not in schema_keys and key != "source"}
+    return (
+        get("name"),
+        get("logo"),
+        get("url"),
+        get("category"),
+        tvg.get("id"),
+        tvg.get("name"),
+        tvg.get("url"),
+        tvg.get("chno"),
+        country.get("code"),
+        country.get("name"),
+        language.get("code"),
+        language.get("name"),
+        get("status"),
+        None if live is None else int(live),
+        get("source") if source is None else source,
+        getattr(stream_info, "_checked_at", None),
+        json.dumps(extra) if extra else None,
+    )
+
+
+def _stream_info(row: tuple) -> dict:
+    """Builds the stream information dictionary of a row, in the shape of a parser with the schema enforced."""
+    name, logo, url, category, tvg_id, tvg_name, tvg_url, tvg_chno = row[:8]
+    country_code, country_name, language_code, language_name, status, live, source, _, extra = row[8:]
+    stream_info = {
+        "name": name,
+        "logo": logo,
+        "url": url,
+        "category": category,
+        "tvg": {"id": tvg_id, "name": tvg_name, "url": tvg_url, "chno": tvg_chno},
+        "country": {"code": country_code, "name": country_name},
+        "language": {"code": language_code, "name": language_name},
+    }
+    if status is not None:
+        stream_info["status"] = status
+        stream_info["live"] = bool(live)
+    if source is not None:
+        stream_info["source"] = source
+    if extra:
+        stream_info.update(json.loads(extra))
+    return stream_info
+
+
+class SqliteStore:
+    """
+    Stores streams information in a SQLite database, for catalogues larger than memory.
+
+    Streams are bulk inserted with batched `executemany` calls in a single transaction, and queried with
+    `StreamQuery`, which translates filtering, sorting, deduplication and pagination into indexed SQL.
+    Streams are read back in the shape of a parser with the schema enforced.
+
+    Args:
+        - `path` (str, optional): Path of the database file. Defaults to `":memory:"`.
+
+    Example::
+
+        store = SqliteStore("streams.db")
+        store.insert(parser.iter_m3u("https://example.com/huge.m3u"), source="huge")
+        for stream in store.query().filter_by("category", "^News$").sort_by("name").page(1, size=50):
+            print(stream["name"])
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.create_function("REGEXP", 2, _regexp, deterministic=True)
+        self.connection.create_collation("natural", _comparator(natural_key))
+        self.connection.create_collation("locale", _comparator(locale_key))
+        if path != ":memory:":
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+        definitions = ", ".join(f"{column} {column_types[column]}".strip() for column in columns)
+        self.connection.execute(f"CREATE TABLE IF NOT EXISTS streams (id INTEGER PRIMARY KEY, {definitions})")
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM streams").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+    def insert(self, streams_info: Iterable, source: str = None, batch_size: int = 10000) -> int:
+        """
+        Insert streams information in batches, all in a single transaction.
+
+        Indexes are created after the first insertion, so that bulk loading an empty store doesn't maintain them.
+
+        Args:
+            - `streams_info` (Iterable): Streams information, like the list of `M3uParser.get_list()`
+              or the generator of `M3uParser.iter_m3u()`.
+            - `source` (str, optional): Source to tag the streams with, instead of their own `"source"` key.
+            - `batch_size` (int, optional): Number of streams inserted per `executemany` call. Defaults to `10000`.
+
+        Returns:
+            - `int`: The number of streams inserted.
+        """
+        statement = f"INSERT INTO streams ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        rows = (_row(stream_info, source) for stream_info in streams_info)
+        count = 0
+        with self.connection:
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                self.connection.executemany(statement, batch)
+                count += len(batch)
+            for column in indexed_columns:
+                self.connection.execute(
+                    f"CREATE INDEX IF NOT EXISTS streams_{column} ON streams ({column} COLLATE NOCASE)"
+                )
+        return count
+
+    def query(self) -> "StreamQuery":
+        """Returns a query over all the streams of the store."""
+        return StreamQuery(self)
+
+
+class StreamQuery:
+    """
+    Query over the streams of a `SqliteStore`, built with the same operations as `M3uParser`.
+
+    Operations are chained and only run against the database when the query is iterated, one page of
+    rows being fetched from the cursor at a time.
+    """
+
+    def __init__(self, store: SqliteStore):
+        self._store = store
+        self._where = []
+        self._params = []
+        self._order = []
+        self._limit = None
+
+    @staticmethod
+    def _column(key: str, key_splitter: str, nested_key: bool) -> str:
+        if nested_key:
+            try:
+                key_0, key_1 = key.split(key_splitter)
+            except ValueError:
+                raise NestedKeyException("Nested key must be in the format <key><key_splitter><nested_key>.")
+            column = column_name(key_0, key_1)
+            if column not in columns:
+                raise KeyNotFoundException(f"Nested key '{key}' is not present in the streams.")
+            return column
+        if key in ("tvg", "country", "language", "extra", "checked_at"):
+            raise KeyNotFoundException(f"Key '{key}' can only be queried as a nested key.")
+        if key in columns:
+            return key
+        if not re.fullmatch(r"\w+", key):
+            raise KeyNotFoundException(f"Key '{key}' is not present in the streams.")
+        # keys outside of the schema are read from the JSON of the other keys
+        return f"json_extract(extra, '$.{key}')"
+
+    @staticmethod
+    def _condition(column: str, fltr) -> tuple:
+        """Translates a filter of `M3uParser.filter_by` into a SQL condition, using indexes where possible."""
+        if fltr is None:
+            return f"{column} IS NULL", []
+        if isinstance(fltr, bool):
+            return f"{column} = ?", [int(fltr)]
+        if not isinstance(fltr, str):
+            return "0", []
+        if column == "live":
+            return "REGEXP(?, CASE live WHEN 1 THEN 'True' WHEN 0 THEN 'False' END)", [fltr]
+        anchored = fltr.startswith("^")
+        literal = fltr[1:] if anchored else fltr
+        exact = literal.endswith("$") and not literal.endswith("\\$")
+        literal = literal[:-1] if exact else literal
+        # NOCASE and LIKE only fold ASCII letters, the same as re.IGNORECASE for ASCII patterns
+        if literal and literal.isascii() and not _regex_meta.search(literal):
+            escaped = literal.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            if anchored and exact:
+                return f"{column} = ? COLLATE NOCASE", [literal]
+            pattern = ("" if anchored else "%") + escaped + ("" if exact else "%")
+            return f"{column} LIKE ? ESCAPE '\\'", [pattern]
+        return f"REGEXP(?, {column})", [fltr]
+
+    def filter_by(
+        self,
+        key: str,
+        filters: Union[str, list[Union[str, None, bool]], None, bool],
+        key_splitter: str = "-",
+        retrieve: bool = True,
+        nested_key: bool = False,
+    ):
+        """
+        Filter the streams with the same semantics as `M3uParser.filter_by`.
+
+        Filters are case insensitive regular expressions. Literal filters anchored with `^` and `$` use the
+        indexes, other literals use `LIKE` and the remaining patterns a `REGEXP` function.
+
+        Args:
+            - `key`, `filters`, `key_splitter`, `retrieve`, `nested_key`: Same as in `M3uParser.filter_by`.
+
+        Raises:
+            - `NestedKeyException`: Raised if 'nested_key' is True but the key is not in the correct format.
+            - `KeyNotFoundException`: Raised if the key is not a column of the store.
+
+        Returns:
+            - `StreamQuery`: The query.
+        """
+        column = self._column(key, key_splitter, nested_key)
+        conditions = []
+        for fltr in filters if isinstance(filters, list) else [filters]:
+            condition, params = self._condition(column, fltr)
+            conditions.append(f"COALESCE({condition}, 0)" if retrieve else f"NOT COALESCE({condition}, 0)")
+            self._params.extend(params)
+        self._where.append(
+            "(" + (" OR " if retrieve else " AND ").join(conditions or ["0" if retrieve else "1"]) + ")"
+        )
+        return self
+
+    def sort_by(
+        self,
+        key: Union[str, list[str]],
+        key_splitter: str = "-",
+        asc: Union[bool, list[bool]] = True,
+        nested_key: Union[bool, list[bool]] = False,
+        nulls: Union[str, list[str], None] = None,
+        collation: Union[str, list[str], None] = None,
+    ):
+        """
+        Sort the streams with the same options as `M3uParser.sort_by`, ties keeping the insertion order.
+
+        Returns:
+            - `StreamQuery`: The query.
+        """
+        keys = key if isinstance(key, list) else [key]
+        count = len(keys)
+        asc, nested_key, nulls, collation = (
+            option if isinstance(option, list) else [option] * count for option in (asc, nested_key, nulls, collation)
+        )
+        if not all(len(option) == count for option in (asc, nested_key, nulls, collation)):
+            raise ValueError("Options passed as lists must have the same length as the sort keys.")
+        order = []
+        for key, ascending, nested, null_placement, collate in zip(keys, asc, nested_key, nulls, collation):
+            if null_placement not in (None, "first", "last"):
+                raise ValueError("Null placement must be either 'first' or 'last'.")
+            if collate not in (None, "natural", "locale"):
+                raise ValueError("Collation must be one of [None, 'natural', 'locale'].")
+            column = self._column(key, key_splitter, nested)
+            nulls_first = null_placement == "first" if null_placement else ascending
+            order.append(f"{column} IS NULL {'DESC' if nulls_first else 'ASC'}")
+            order.append(f"{column}{f' COLLATE {collate}' if collate else ''} {'ASC' if ascending else 'DESC'}")
+        # sorting again keeps the previous order between equal keys, like the stable sort of the parser
+        self._order = order + self._order
+        return self
+
+    def remove_duplicates(self):
+        """
+        Remove the streams with the same name and url (case insensitive) as a previous one.
+
+        Like `M3uParser.remove_duplicates`, the first stream in the order of the previous `sort_by` calls is kept,
+        or the first inserted if the query is not sorted.
+
+        Returns:
+            - `StreamQuery`: The query.
+        """
+        where = " AND ".join(self._where) or "1"
+        window = f"PARTITION BY name COLLATE NOCASE, url COLLATE NOCASE ORDER BY {', '.join(self._order + ['id'])}"
+        ranked = f"SELECT id, ROW_NUMBER() OVER ({window}) AS position FROM streams WHERE {where}"
+        self._where.append(f"(id IN (SELECT id FROM ({ranked}) WHERE position = 1))")
+        self._params.extend(self._params)
+        return self
+
+    def page(self, number: int = 1, size: int = 100):
+        """
+        Restrict the query to a page of streams.
+
+        Args:
+            - `number` (int, optional): Page number, starting at 1. Defaults to `1`.
+            - `size` (int, optional): Number of streams per page. Defaults to `100`.
+
+        Returns:
+            - `StreamQuery`: The query.
+        """
+        if number < 1 or size < 1:
+            raise ValueError("Page number and size must be positive.")
+        self._limit = (size, (number - 1) * size)
+        return self
+
+    def _sql(self, select: str) -> tuple:
+        sql = f"SELECT {select} FROM streams"
+        if self._where:
+            sql += " WHERE " + " AND ".join(self._where)
+        params = list(self._params)
+        return sql, params
+
+    def count(self) -> int:
+        """Returns the number of streams matching the query, ignoring pagination."""
+        sql, params = self._sql("COUNT(*)")
+        return self._store.connection.execute(sql, params).fetchone()[0]
+
+    def cursor(self) -> sqlite3.Cursor:
+        """Runs the query and returns the cursor of its rows, with the columns of `m3u_parser.sqlite_store.columns`."""
+        sql, params = self._sql(", ".join(columns))
+        sql += " ORDER BY " + ", ".join(self._order + ["id"])
+        if self._limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params.extend(self._limit)
+        return self._store.connection.execute(sql, params)
+
+    def __iter__(self):
+        cursor = self.cursor()
+        while True:
+            rows = cursor.fetchmany(1000)
+            if not rows:
+                return
+            yield from map(_stream_info, rows)
+
+    def get_list(self) -> list:
+        """Returns the streams information matching the query."""
+        return list(self)
@@ -0,0 +1,208 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from typing import Callable
+
+# upper bounds of the probe latency histogram buckets, in seconds
+default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Cumulative histogram of observed values, with the count and sum of the observations."""
+
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets=default_buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def to_dict(self) -> dict:
+        cumulative, total = {}, 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            cumulative[bound] = total
+        return {"buckets": cumulative, "count": self.count, "sum": self.sum}
+
+
+class Stats:
+    """Records where a parser spends its time.
+
+    Phases (fetch, split, extract, enrich, validate, liveness, filter, export) are timed cumulatively with
+    the number of times they ran, counters count lines, entries, probes, connects, cache hits, timeouts and bytes read,
+    and histograms keep the distribution of the probe latencies. Hooks are called with every record,
+    e.g. to forward them to another metrics library.
+
+    Args:
+        - `hooks` (list, optional): Functions called with the kind ("phase", "counter" or "histogram"),
+            the name and the value of every record.
+        - `buckets` (tuple, optional): Upper bounds of the histogram buckets in seconds.
+
+    Example::
+
+        parser = M3uParser(stats=True).parse_m3u("https://iptv-org.github.io/iptv/countries/np.m3u")
+        print(parser.get_stats().to_dict()["phases"]["liveness"])
+        print(parser.get_stats().to_prometheus())
+    """
+
+    enabled = True
+
+    def __init__(self, hooks: list = None, buckets=default_buckets):
+        self.hooks = list(hooks or [])
+        self.buckets = tuple(buckets)
+        self.reset()
+
+    def reset(self):
+        """Clears every record."""
+        self.timings = {}
+        self.counters = {}
+        self.histograms = {}
+
+    def add_hook(self, hook: Callable):
+        """Registers a function called with the kind, the name and the value of every record."""
+        self.hooks.append(hook)
+
+    @contextmanager
+    def phase(self, name: str):
+        """Times the block as a run of the phase."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.time(name, time.perf_counter() - started)
+
+    def time(self, name: str, seconds: float):
+        """Records a run of the phase which took the given seconds."""
+        timing = self.timings.get(name)
+        if timing is None:
+            timing = self.timings[name] = [0, 0.0]
+        timing[0] += 1
+        timing[1] += seconds
+        for hook in self.hooks:
+            hook("phase", name, seconds)
+
+    def count(self, name: str, value: int = 1):
+        """Increments the counter."""
+        self.counters[name] = self.counters.get(name, 0) + value
+        for hook in self.hooks:
+            hook("counter", name, value)
+
+    def observe(self, name: str, value: float):
+        """Adds an observation to the histogram."""
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(self.buckets)
+        histogram.observe(value)
+        for hook in self.hooks:
+            hook("histogram", name, value)
+
+    def merge(self, records: dict):
+        """
+        Adds records returned by `to_dict`, e.g. by the stats of a worker process, to these stats.
+
+        Args:
+            - `records` (dict): The records to add, in the shape returned by `to_dict`.
+        """
+        for name, timing in records.get("phases", {}).items():
+            current = self.timings.get(name)
+            if current is None:
+                current = self.timings[name] = [0, 0.0]
+            current[0] += timing["count"]
+            current[1] += timing["seconds"]
+            for hook in self.hooks:
+                hook("phase", name, timing["seconds"])
+        for name, value in records.get("counters", {}).items():
+            self.count(name, value)
+        for name, data in records.get("histograms", {}).items():
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(self.buckets)
+            previous = 0
+            for index, cumulative in enumerate(data["buckets"].values()):
+                histogram.counts[index] += cumulative - previous
+                previous = cumulative
+            histogram.count += data["count"]
+            histogram.sum += data["sum"]
+
+    def to_dict(self) -> dict:
+        """
+        Returns the records.
+
+        Returns:
+            - `dict`: The `phases` with their `count` and total `seconds`, the `counters` and the `histograms`
+              with their cumulative `buckets`, `count` and `sum`.
+        """
+        return {
+            "phases": {name: {"count": count, "seconds": seconds} for name, (count, seconds) in self.timings.items()},
+            "counters": dict(self.counters),
+            "histograms": {name: histogram.to_dict() for name, histogram in self.histograms.items()},
+        }
+
+    def to_prometheus(self, prefix: str = "m3u_parser") -> str:
+        """
+        Returns the records in the Prometheus text exposition format.
+
+        Args:
+            - `prefix` (str, optional): Prefix of the metric names. Defaults to `"m3u_parser"`.
+
+        Returns:
+            - `str`: The metrics, phases as a summary labelled by phase, counters as counters and histograms as histograms.
+        """
+        lines = []
+        if self.timings:
+            name = f"{prefix}_phase_seconds"
+            lines += [f"# HELP {name} Time spent in each phase.", f"# TYPE {name} summary"]
+            for phase, (count, seconds) in self.timings.items():
+                lines.append(f'{name}_sum{{phase="{phase}"}} {seconds!r}')
+                lines.append(f'{name}_count{{phase="{phase}"}} {count}')
+        for counter, value in self.counters.items():
+            name = f"{prefix}_{counter}_total"
+            lines += [f"# TYPE {name} counter", f"{name} {value}"]
+        for histogram_name, histogram in self.histograms.items():
+            name = f"{prefix}_{histogram_name}"
+            lines.append(f"# TYPE {name} histogram")
+            for bound, count in histogram.to_dict()["buckets"].items():
+                bound = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{name}_bucket{{le="{bound}"}} {count}')
+            lines += [f"{name}_sum {histogram.sum!r}", f"{name}_count {histogram.count}"]
+        return "\n".join(lines) + "\n"
+
+
+class NullStats:
+    """Stats which record nothing, used when instrumentation is disabled so that recording costs next to nothing."""
+
+    enabled = False
+    _null_phase = nullcontext()
+
+    def phase(self, name: str):
+        return self._null_phase
+
+    def time(self, name: str, seconds: float):
+        pass
+
+    def count(self, name: str, value: int = 1):
+        pass
+
+    def observe(self, name: str, value: float):
+        pass
+
+    def reset(self):
+        pass
+
+    def merge(self, records: dict):
+        pass
+
+    def to_dict(self) -> dict:
+        return {"phases": {}, "counters": {}, "histograms": {}}
+
+    def to_prometheus(self, prefix: str = "m3u_parser") -> str:
+        return ""
+
+
+null_stats = NullStats()
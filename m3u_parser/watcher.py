@@ -0,0 +1,270 @@
+import asyncio
+import heapq
+import inspect
+import logging
+import math
+import os
+import shutil
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from typing import Callable
+
+from .exceptions import UrlReadException
+from .helper import is_valid_url
+from .m3u_parser import M3uParser
+
+logger = logging.getLogger("m3u_parser")
+
+
+class PlaylistWatcher:
+    """Keeps the streams information of a playlist up to date in a long-running process.
+
+    URL sources are polled with conditional requests (ETag/Last-Modified) and local files are polled by
+    modification time and size, so unmodified sources are neither downloaded nor parsed again. Modified sources
+    are refreshed incrementally against the current result (see `M3uParser.refresh`), into a new parser which
+    replaces the current one in a single assignment: readers holding `parser` always see a consistent playlist.
+    The status of the streams is checked again on a rolling schedule, the least recently checked streams
+    a few at a time, instead of all at once.
+
+    Args:
+        - `data_source` (str): The file path or URL of the playlist (m3u/json/csv, optionally compressed).
+        - `interval` (float, optional): Seconds between two polls of the source. Defaults to 60.
+        - `recheck_interval` (float, optional): Seconds within which every stream is checked again,
+            None to only check added and changed streams. Defaults to None.
+        - `tick` (float, optional): Seconds between two steps of the watch loop. Defaults to 1.
+        - `schemes` (list, optional): A list of allowed URL schemes. Default is `["http", "https"]`.
+        - `status_checker` (dict, optional): A dictionary mapping URL schemes to custom status checker functions.
+        - `check_live` (bool, optional): Whether to check the status of the streams. Defaults to True.
+        - `parser_options`: Arguments of the `M3uParser` instances holding the streams, like `timeout` or `columnar`.
+
+    Example::
+
+        async def on_change(diff):
+            print(len(diff["added"]), len(diff["removed"]), len(diff["status_changed"]))
+
+        async with PlaylistWatcher("https://iptv-org.github.io/iptv/countries/np.m3u", recheck_interval=3600) as watcher:
+            watcher.subscribe(on_change)
+            ...
+            streams = watcher.parser.get_list()
+    """
+
+    def __init__(
+        self,
+        data_source: str,
+        interval: float = 60.0,
+        recheck_interval: float = None,
+        tick: float = 1.0,
+        schemes=['http', 'https'],
+        status_checker: dict = None,
+        check_live=True,
+        **parser_options,
+    ):
+        self._data_source = data_source
+        self._is_url = is_valid_url(data_source)
+        self._interval = interval
+        self._recheck_interval = recheck_interval
+        self._tick = tick
+        self._status_checker = {} if status_checker is None else status_checker
+        self._check_live = check_live
+        self._parser_options = parser_options
+        self._parser = M3uParser(**parser_options)
+        self._parser._schemes = set(schemes)
+        self._subscribers = []
+        self._validators = {}
+        self._signature = None
+        self._last_poll = None
+        self._task = None
+
+    @property
+    def parser(self) -> M3uParser:
+        """
+        The parser holding the current streams information. It is replaced, not modified, when the source changes,
+        while rolling checks update the statuses of its streams in place, a whole batch at a time.
+        """
+        return self._parser
+
+    def subscribe(self, callback: Callable):
+        """
+        Registers a function or coroutine function called with the diff of every change.
+
+        The diff has the shape returned by `M3uParser.refresh`. Rolling checks publish diffs with
+        the `status_changed` streams only.
+
+        Args:
+            - `callback` (Callable): The function to call with the diff.
+
+        Returns:
+            - `Callable`: The callback, so that it can be used as a decorator.
+        """
+        self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback: Callable):
+        """Removes a callback registered with `subscribe`."""
+        self._subscribers.remove(callback)
+
+    async def _publish(self, diff: dict):
+        for callback in list(self._subscribers):
+            try:
+                result = callback(diff)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:
+                logger.exception("Subscriber %r failed." % callback)
+
+    def _fetch(self):
+        """Downloads the source to a temporary file unless it is not modified, returns the file and its validators."""
+        request = urllib.request.Request(self._data_source, headers=dict(self._parser._headers))
+        if "etag" in self._validators:
+            request.add_header("If-None-Match", self._validators["etag"])
+        if "last_modified" in self._validators:
+            request.add_header("If-Modified-Since", self._validators["last_modified"])
+        try:
+            response = urllib.request.urlopen(request, timeout=self._parser._timeout)
+        except urllib.error.HTTPError as error:
+            if error.code == 304:
+                return None, None
+            raise UrlReadException("Cannot read anything from the url.")
+        except OSError:
+            raise UrlReadException("Cannot read anything from the url.")
+        with response:
+            validators = {}
+            if response.getheader("ETag"):
+                validators["etag"] = response.getheader("ETag")
+            if response.getheader("Last-Modified"):
+                validators["last_modified"] = response.getheader("Last-Modified")
+            # the name of the file keeps the extensions telling the format and compression of the source
+            name = os.path.basename(urllib.parse.urlparse(self._data_source).path)
+            descriptor, path = tempfile.mkstemp(suffix=f"-{name}")
+            with open(descriptor, "wb") as fp:
+                shutil.copyfileobj(response, fp)
+        return path, validators
+
+    async def poll(self):
+        """
+        Polls the source once, applying and publishing its changes.
+
+        Raises:
+            - `UrlReadException`: Raised when there is an issue reading content from a URL.
+            - `FileNotFoundError`: Raised if the file does not exist or is not accessible.
+
+        Returns:
+            - `dict`: The diff of the change, or None if the source was not modified.
+        """
+        loop = asyncio.get_running_loop()
+        self._last_poll = time.monotonic()
+        if self._is_url:
+            path, validators = await loop.run_in_executor(None, self._fetch)
+            if path is None:
+                return None
+        else:
+            stat = os.stat(self._data_source)
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if signature == self._signature:
+                return None
+            path, validators = self._data_source, None
+        try:
+            parser = M3uParser(**self._parser_options)
+            diff = await parser.arefresh(
+                path, self._parser, check_live=self._check_live, status_checker=self._status_checker
+            )
+        finally:
+            if path != self._data_source:
+                os.remove(path)
+        parser._source = self._data_source
+        # readers either see the previous or the refreshed playlist, never a partially refreshed one
+        self._parser = parser
+        if self._is_url:
+            self._validators = validators
+        else:
+            self._signature = signature
+        if diff["added"] or diff["removed"] or diff["changed"] or diff["status_changed"]:
+            await self._publish(diff)
+        return diff
+
+    async def recheck(self, count: int = None):
+        """
+        Checks the status of the least recently checked streams again, publishing the streams whose status changed.
+
+        Args:
+            - `count` (int, optional): Number of streams to check. Defaults to the share of the streams
+                due in a tick of the rolling schedule.
+
+        Returns:
+            - `dict`: The diff with the `status_changed` streams, or None if the parser was replaced while checking.
+        """
+        parser = self._parser
+        streams_info = parser._streams_info
+        if count is None:
+            if not self._recheck_interval:
+                return None
+            count = math.ceil(len(streams_info) * self._tick / self._recheck_interval)
+        checked_at = [getattr(stream_info, "_checked_at", None) or 0.0 for stream_info in streams_info]
+        indices = heapq.nsmallest(count, range(len(checked_at)), key=checked_at.__getitem__)
+        # copies are checked, so that readers never see the statuses of a partially checked batch
+        checker = M3uParser(**parser._parser_options())
+        checker._status_checker = self._status_checker
+        checker._streams_info = parser._take_copies(indices)
+        previous_status = [stream_info.get("status") for stream_info in checker._streams_info]
+        await checker._check_urls()
+        if self._parser is not parser:
+            # the source was refreshed meanwhile, into streams checked already
+            return None
+        parser._write_back(indices, checker._streams_info)
+        parser._probe_latency.update(checker._probe_latency)
+        status_changed = [
+            stream_info.to_dict()
+            for stream_info, status in zip(checker._streams_info, previous_status)
+            if stream_info.get("status") != status
+        ]
+        diff = {
+            "added": [],
+            "removed": [],
+            "changed": [],
+            "status_changed": status_changed,
+            "unchanged": len(parser._streams_info) - len(status_changed),
+            "rechecked": len(indices),
+        }
+        if diff["status_changed"]:
+            await self._publish(diff)
+        return diff
+
+    async def run(self):
+        """Runs the watch loop until cancelled, polling the source every `interval` and checking streams every tick."""
+        if self._last_poll is None:
+            await self.poll()
+        while True:
+            await asyncio.sleep(self._tick)
+            try:
+                if time.monotonic() - self._last_poll >= self._interval:
+                    await self.poll()
+                if self._check_live:
+                    await self.recheck()
+            except Exception as error:
+                logger.warning("Failed to watch %s: %s" % (self._data_source, error))
+
+    async def start(self):
+        """Loads the source and starts the watch loop as a task of the running event loop."""
+        if self._task is None:
+            await self.poll()
+            self._task = asyncio.get_running_loop().create_task(self.run())
+        return self
+
+    async def stop(self):
+        """Stops the watch loop."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
@@ -0,0 +1,206 @@
+import hashlib
+import io
+import json
+from collections.abc import Sized
+from contextlib import contextmanager
+from itertools import chain
+from typing import Iterable, Union
+
+from .compression import compression_of, open_compressed
+from .csv_plan import CsvPlan
+from .exceptions import UnrecognizedFormatException
+from .records import to_dict
+
+# size of the chunks handed to the underlying file object
+buffer_size = 1 << 16
+
+
+class BufferedWriter:
+    """Collects small strings and hands them to the file object in large chunks."""
+
+    __slots__ = ("_fp", "_chunks", "_size")
+
+    def __init__(self, fp):
+        self._fp = fp
+        self._chunks = []
+        self._size = 0
+
+    def write(self, text: str):
+        self._chunks.append(text)
+        self._size += len(text)
+        if self._size >= buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._chunks:
+            self._fp.write("".join(self._chunks))
+            self._chunks.clear()
+            self._size = 0
+
+
+@contextmanager
+def open_output(target, newline=None):
+    """Opens a path for writing text, or passes an already opened file-like object through without closing it.
+
+    Paths ending with a compression extension (.gz/.bz2/.xz/.zst) are compressed as they are written.
+    """
+    if hasattr(target, "write"):
+        yield target
+        return
+    compression = compression_of(target)
+    if compression is None:
+        with open(target, mode="w", encoding="utf-8", newline=newline) as fp:
+            yield fp
+    else:
+        with io.TextIOWrapper(open_compressed(target, compression), encoding="utf-8", newline=newline) as fp:
+            yield fp
+
+
+def m3u_key(stream_info) -> int:
+    """Returns a stable hash of the fields written to an M3U entry, to tell whether a stream was modified."""
+    tvg, country, language = stream_info.get("tvg"), stream_info.get("country"), stream_info.get("language")
+    fields = (
+        stream_info.get("name"),
+        stream_info.get("logo"),
+        stream_info.get("url"),
+        stream_info.get("category"),
+        None if tvg is None else tuple(tvg.items()),
+        None if country is None else country.get("code"),
+        None if language is None else language.get("name"),
+    )
+    digest = hashlib.blake2b(repr(fields).encode("utf-8", errors="surrogatepass"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def raw_entry(lines: list, stream_info) -> tuple:
+    """Returns the raw entry kept on streams parsed with `keep_raw`: its original lines and the hash of its fields."""
+    return "\n".join(lines), m3u_key(stream_info)
+
+
+def m3u_entry(stream_info) -> str:
+    """Returns the #EXTINF line and the url of a stream information.
+
+    Streams parsed with `keep_raw` are written with their original lines, including attributes and
+    directives the parser doesn't extract, unless their fields were modified since.
+    """
+    raw = getattr(stream_info, "_raw", None)
+    if raw is not None and raw[1] == m3u_key(stream_info):
+        return raw[0]
+    parts = ["#EXTINF:-1"]
+    tvg = stream_info.get("tvg")
+    if tvg != None:
+        parts.extend(f' tvg-{key}="{value}"' for key, value in tvg.items() if value != None)
+    logo = stream_info.get("logo")
+    if logo != None:
+        parts.append(f' tvg-logo="{logo}"')
+    country = stream_info.get("country")
+    if country != None and country.get("code") != None:
+        parts.append(f' tvg-country="{country["code"]}"')
+    language = stream_info.get("language")
+    if language != None and language.get("name") != None:
+        parts.append(f' tvg-language="{language["name"]}"')
+    category = stream_info.get("category")
+    if category != None:
+        parts.append(f' group-title="{category}"')
+    name = stream_info.get("name")
+    if name != None:
+        parts.append("," + name)
+    parts.append("\n")
+    parts.append(stream_info["url"])
+    return "".join(parts)
+
+
+def write_m3u(streams_info: Iterable, fp) -> int:
+    """Writes streams information as M3U, one entry at a time. Returns the number of streams written."""
+    writer = BufferedWriter(fp)
+    count = 0
+    for stream_info in streams_info:
+        writer.write(("#EXTM3U\n" if count == 0 else "\n") + m3u_entry(stream_info))
+        count += 1
+    writer.flush()
+    return count
+
+
+def write_json(streams_info: Iterable, fp, indent: Union[int, str, None] = 4) -> int:
+    """Writes streams information as a JSON array, one stream at a time.
+
+    The output is the same as `json.dumps(streams_info, indent=indent)`. Returns the number of streams written.
+    """
+    writer = BufferedWriter(fp)
+    if indent is None:
+        prefix, separator, opening, closing = "", ", ", "[", "]"
+    else:
+        prefix = " " * indent if isinstance(indent, int) else indent
+        separator, opening, closing = ",\n", "[\n", "\n]"
+    count = 0
+    for stream_info in streams_info:
+        encoded = json.dumps(to_dict(stream_info), indent=indent)
+        if prefix:
+            # strings are escaped by json, so every newline separates two lines of the document
+            encoded = prefix + encoded.replace("\n", "\n" + prefix)
+        writer.write((opening if count == 0 else separator) + encoded)
+        count += 1
+    writer.write(closing if count else "[]")
+    writer.flush()
+    return count
+
+
+def write_csv(streams_info: Iterable, fp) -> int:
+    """Writes streams information as CSV with nested keys joined by "_", in batches of rows.
+
+    The columns are planned once, see `CsvPlan.from_streams`: from every stream of a collection like a list,
+    which is read twice, or from the first stream of other iterables, which are read once.
+    Returns the number of streams written.
+    """
+    if isinstance(streams_info, Sized):
+        if not len(streams_info):
+            return 0
+        plan = CsvPlan.from_streams(streams_info)
+    else:
+        iterator = iter(streams_info)
+        first = next(iterator, None)
+        if first is None:
+            return 0
+        plan, streams_info = CsvPlan.from_streams([first]), chain([first], iterator)
+    writer = BufferedWriter(fp)
+    count = plan.write(streams_info, writer)
+    writer.flush()
+    return count
+
+
+writers = {
+    "json": write_json,
+    "csv": write_csv,
+    "m3u": write_m3u,
+}
+
+
+def write_streams(streams_info: Iterable, target, format: str = "json") -> int:
+    """
+    Write streams information to a path or file-like object without building the whole output in memory.
+
+    Accepts any iterable of streams information, like the list returned by `M3uParser.get_list()`
+    or the generator returned by `M3uParser.iter_m3u()`, so output of any size is written with constant memory.
+
+    Args:
+        - `streams_info` (Iterable): Streams information to write.
+        - `target` (str or file-like): Path of the file to write or a file-like object opened for writing text.
+          Paths ending with .gz/.bz2/.xz/.zst are compressed as a stream, zstd using all the CPUs.
+        - `format` (str, optional): Output format (csv/json/m3u). Defaults to `"json"`.
+
+    Raises:
+        - `UnrecognizedFormatException`: Raised if the format is not supported.
+
+    Returns:
+        - `int`: The number of streams written.
+
+    Example::
+
+        parser = M3uParser()
+        write_streams(parser.iter_m3u("https://example.com/huge.m3u"), "huge.json")
+    """
+    write = writers.get(format)
+    if write is None:
+        raise UnrecognizedFormatException("Unrecognised format.")
+    with open_output(target, newline="" if format == "csv" else None) as fp:
+        return write(streams_info, fp)
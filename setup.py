@@ -18,6 +18,7 @@ REQUIRED = ["requests", "asyncio", "aiohttp", "pycountry"]
 
 EXTRAS = {
     # 'fancy feature': ['django'],
+    "zstd": ["zstandard"],
 }
 
 here = os.path.abspath(os.path.dirname(__file__))
@@ -92,6 +93,9 @@ setup(
     install_requires=REQUIRED,
     extras_require=EXTRAS,
     packages=["m3u_parser"],
+    entry_points={
+        "console_scripts": ["m3u-parser=m3u_parser.cli:main"],
+    },
     include_package_data=True,
     license="ISC",
     classifiers=[